@@ -0,0 +1,771 @@
+from bisect import insort
+# insort(list, item, lo) inserts item in a sorted list keeping it sorted
+from math import exp
+# exponential function
+from math import sqrt
+# square root function
+import copy
+from timeit import default_timer as timer
+import numpy as np
+import profilelat
+import rnglat
+
+# The occupancy of a site (catalyst 0/1, htmf -1/0/1, cinnamate -1/0/1,
+# product -1/0/1) is encoded as one small integer, its state code:
+# code = 27 * catalyst + 9 * (htmf + 1) + 3 * (cinna + 1) + (product + 1)
+# The excitation states are not part of the code since they don't
+# change the energy (see Lattice_Cell_Object.e_of_state).
+n_states = 54
+# state_table[code] is (catalyst, htmf, cinna, product) of that code.
+state_table = np.array([(catalyst, htmf, cinna, product)
+                        for catalyst in (0, 1)
+                        for htmf in (-1, 0, 1)
+                        for cinna in (-1, 0, 1)
+                        for product in (-1, 0, 1)], dtype = np.int8)
+# State code of an empty site.
+empty_state = 13
+
+
+def encode_states(catalyst, htmf, cinna, product):
+    """Returns the state code(s) of the given occupancies.
+    Works on numbers or arrays (then returns a uint8 array).
+    Syntax: encode_states(catalyst, htmf, cinna, product)"""
+    code = 27 * catalyst + 9 * (htmf + 1) + 3 * (cinna + 1) + (product + 1)
+    if isinstance(code, np.ndarray):
+        return code.astype(np.uint8)
+    return int(code)
+
+
+def decode_states(codes):
+    """Returns the occupancies of the state code(s) as an array of
+    shape codes.shape + (4,) of catalyst, htmf, cinna, product."""
+    return state_table[codes]
+
+
+def lattice_moves(dimension):
+    """Returns the moves of a lattice of dimension dimension: the
+    changes of the indices of a site to get each of its 2 * dimension
+    neighbours, first one step back along each axis, then one step
+    forward. (For dimension 2 this is the original
+    ((-1, 0), (0, -1), (1, 0), (0, 1)).)"""
+    steps = np.eye(dimension, dtype = int)
+    return tuple(tuple(move) for move in np.concatenate((-steps, steps)))
+
+
+def neighbour_table(size, dimension):
+    """Returns the flat index of the neighbour of each site in the
+    direction of each of lattice_moves(dimension), as an array of shape
+    (size**dimension, 2 * dimension), with periodic boundaries along
+    each axis (stepping off the end of a row comes back at the start of
+    the same row).
+    This is made once per lattice so the moves only have to look up
+    where they go."""
+    shape = (size,) * dimension
+    coords = np.indices(shape).reshape(dimension, -1)
+    n_sites = coords.shape[1]
+    dtype = np.int32 if n_sites < 2**31 else np.intp
+    table = np.empty((n_sites, 2 * dimension), dtype = dtype)
+    for direc, move in enumerate(lattice_moves(dimension)):
+        moved = (coords + np.array(move)[:, np.newaxis]) % size
+        table[:, direc] = np.ravel_multi_index(moved, shape)
+    return table
+
+
+def sample_planes(catalyst, htmf, cinna, product):
+    """Returns the occupation of each site of the planes as an array of
+    'c,h,n,p' strings (see Array_Lattice.sample)."""
+    sample_out = catalyst.astype('a2')
+    for plane in (htmf, cinna, product):
+        sample_out = np.char.add(np.char.add(sample_out, ','),
+                                 plane.astype('a2'))
+    return sample_out.astype('a10')
+
+
+class Array_Lattice:
+    """This class is a drop in replacement for initializelat.Lattice.
+    Instead of holding one Lattice_Cell_Object per site, it keeps the
+    occupancies as compact arrays (planes) that are the same shape as
+    the lattice:
+    catalyst, htmf, cinna and product are int8 planes,
+    catalyst_excitation_state and htmf_excitation_state are float32 planes.
+    The parameters (energies, beta, etc.) are held once for the whole
+    lattice instead of being copied into every site.
+    It has the same over_sites(keyword) contract as Lattice, so
+    runlat.run_react can use either one."""
+
+    def __init__(self, arguments, size = 3, dimension = 2,
+                 move_mode = 'checkerboard', seed = None, replica = 0):
+        """This will create a lattice with edge length
+        size and dimension dimension.
+        arguments are the same seven parameters given to each site
+        of initializelat.Lattice:
+        molecprob, reaction_energy,
+        reaction_favoritism, assoc_stabilization,
+        assoc_favoritism, excit_prob, beta
+        move_mode is how the move sweep is done, 'checkerboard' (default)
+        moves all sites of one sublattice at once, 'serial' walks the
+        sites in order like Lattice does.
+        seed and replica seed the random numbers of this lattice
+        (see rnglat). If seed is None a new one is picked; it is
+        kept as self.seed so the run can be repeated.
+        Other arguments are optional.
+        syntax: Array_Lattice(arguments, size, dimension, move_mode,
+        seed, replica)
+        Returns None."""
+        # input checks (same as initializelat.Lattice):
+        if type(size) != int:
+            raise TypeError("size must be an integer, given %s" % type(size))
+        if size < 1:
+            raise ValueError('size must be greater than 1')
+        if type(dimension) != int:
+            raise TypeError('dimension must be an integer')
+        if dimension < 1:
+            raise ValueError('dimension must be >= 1')
+        if isinstance(arguments, basestring):
+            raise TypeError('arguments must be a list-like, given %s' \
+                            % type(arguments))
+        if len(arguments) != 7:
+            raise ValueError('arguments must be len 7')
+        if move_mode not in ('checkerboard', 'serial'):
+            raise ValueError('move_mode must be checkerboard or serial, ' + \
+                             'given %s' % move_mode)
+        self.dimension = dimension
+        self.size      = size
+        self.move_mode = move_mode
+        self.set_parameters(arguments)
+        # All random numbers for this lattice come from here.
+        self.rng     = rnglat.Random_Stream(seed, replica)
+        self.seed    = self.rng.seed
+        self.replica = replica
+        # Phase times and move and reaction counters (see profilelat),
+        # None unless enable_profile is called.
+        self.profile = None
+        shape = self.lattice_shape()
+        #
+        # Occupancy planes. These are what each Lattice_Cell_Object
+        # kept as catalyst, htmf, cinna, product, and the two
+        # excitation states.
+        #
+        # With molecprob probability sets occupancy for catalyst.
+        self.catalyst = (self.rng.uniform(shape) <
+                         self.molecprob).astype(np.int8)
+        # With molecprob probability sets occupancy for htmf and
+        # cinnamate. If occupied, can be in pm 1 orientation.
+        self.htmf  = ((self.rng.uniform(shape) < self.molecprob) *
+                      self.rng.signs(shape)).astype(np.int8)
+        self.cinna = ((self.rng.uniform(shape) < self.molecprob) *
+                      self.rng.signs(shape)).astype(np.int8)
+        # sets product occupancy to 0, as well as excitation states
+        self.product = np.zeros(shape, dtype = np.int8)
+        # Both excitation states live in one (2,) + shape array so
+        # they can be halved with a single multiply in react.
+        # catalyst_excitation_state and htmf_excitation_state are views.
+        self.excitation = np.zeros((2,) + shape, dtype = np.float32)
+        self.catalyst_excitation_state = self.excitation[0]
+        self.htmf_excitation_state     = self.excitation[1]
+        # Same as in initializelat.Lattice: the list of changes to the
+        # currently referenced site to which it wants to move.
+        self.moves = lattice_moves(dimension)
+        # Flattened views of the planes. The move kernels work on flat
+        # site indices. (These are views, so changing them changes
+        # the planes.)
+        self.flat_planes = [plane.reshape(-1) for plane in
+                            (self.catalyst, self.htmf,
+                             self.cinna, self.product)]
+        self.flat_excitation = self.excitation.reshape(2, -1)
+        # Sublattice classes for the checkerboard move sweep.
+        # Along each axis a site is in class 0 or 1 by the parity of its
+        # coordinate. With an odd size the last slice would be a
+        # neighbour (through the periodic wrap) of the first, which has
+        # the same parity, so it is put in its own class 2.
+        # All sites of one class moving in the same direction along that
+        # axis touch disjoint pairs of sites (source and target), so they
+        # can all be tried at once.
+        # (Each (direction, class) group is independent of the others
+        # while it is being moved, so they could be split over cores.)
+        coord_class = np.arange(size) % 2
+        if size % 2 and size > 1:
+            coord_class[-1] = 2
+        # sublattice_class[axis, site] is the class of site along axis
+        # (of the last dimension axes, which are the lattice's).
+        self.sublattice_class = coord_class[
+            np.indices(shape).reshape(len(shape), -1)[-dimension:]
+            ].astype(np.int8)
+        # Axis of each of the moves, and the neighbour of each site in
+        # each direction.
+        self.move_axis = np.array([np.flatnonzero(move_direc)[0]
+                                   for move_direc in self.moves])
+        self.neighbour_table = self.make_neighbour_table()
+        self.index_occupied()
+        # Direction each site picked in the checkerboard move sweep, and
+        # the number of the sweep it was picked in.
+        self.sweep_count     = 0
+        self.site_direction  = np.zeros(self.catalyst.size, dtype = np.int8)
+        self.direction_sweep = np.zeros(self.catalyst.size, dtype = np.int64)
+
+    def lattice_shape(self):
+        """Returns the shape of the planes, (size,) * dimension."""
+        return (self.size,) * self.dimension
+
+    def make_neighbour_table(self):
+        """Returns the neighbour table of the planes (see
+        neighbour_table)."""
+        return neighbour_table(self.size, self.dimension)
+
+    def set_parameters(self, arguments):
+        """This takes the arguments tuple, checks the values the same
+        way Lattice_Cell_Object.__init__ does, and sets the derived
+        energies once for the whole lattice.
+        Syntax: set_parameters(arguments)
+        Returns None."""
+        molecprob           = float(arguments[0])
+        reaction_energy     = float(arguments[1])
+        reaction_favoritism = float(arguments[2])
+        assoc_stabilization = float(arguments[3])
+        assoc_favoritism    = float(arguments[4])
+        excit_prob          = float(arguments[5])
+        beta                = float(arguments[6])
+        # Check values of inputs
+        if molecprob >= 1:
+            raise ValueError('moleprob must be less than 1')
+        elif molecprob <= 0:
+            raise ValueError('moleprob must be greater than 0')
+        elif reaction_energy <= 0:
+            raise ValueError('reaction energy must be greater than 0')
+        elif assoc_stabilization <= 0:
+            raise ValueError('assoc stabilization must be greater than 0')
+        elif beta <= 0.0:
+            raise ValueError('beta (inv temp) must be greater than 0.0')
+        self.arguments   = tuple(arguments)
+        self.molecprob   = molecprob
+        self.e_react_pos = reaction_energy / reaction_favoritism
+        self.e_react_neg = reaction_energy
+        self.e_assoc_pos = assoc_stabilization * assoc_favoritism
+        self.e_assoc_neg = assoc_stabilization
+        # See Lattice_Cell_Object.__init__ for negative favoritism.
+        if assoc_favoritism < 0.0:
+            self.e_assoc = (self.e_assoc_neg + self.e_assoc_pos) / 2
+        else:
+            self.e_assoc = assoc_stabilization * sqrt(assoc_favoritism)
+        self.excit_prob  = excit_prob
+        self.max_move    = 2 * self.dimension
+        self.beta        = beta
+        # Product repulsion used in e_of_state.
+        self.large_num   = 700 / (2.5 * beta)
+        # Reaction probabilities (before attenuation by the excitation).
+        # These are constant for the whole run, so only computed once.
+        self.p_react_pos = exp(-beta * self.e_react_pos)
+        self.p_react_neg = exp(-beta * self.e_react_neg)
+        self.make_tables()
+
+    def make_tables(self):
+        """Precomputes the lookup tables used by the move sweeps:
+        energy_table[code] is beta * E of each state code.
+        For a site being moved into with code to and the site moving
+        with code fr, trying to swap molecule mol (0 catalyst, 1 htmf,
+        2 cinnamate, 3 product) with orientation flips flip (bit 0 flips
+        what goes to the target, bit 1 what comes back, only used for
+        htmf and cinnamate):
+        move_to_table[to, fr, mol, flip] and
+        move_from_table[to, fr, mol, flip] are the proposed codes and
+        accept_table[to, fr, mol, flip] is the Metropolis probability of
+        accepting it (as check_proposed would).
+        Returns None"""
+        self.energy_table = self.e_of_states(state_table)
+        to, fr, mol, flip = np.indices((n_states, n_states, 4, 4))
+        to_states   = state_table[to]
+        from_states = state_table[fr]
+        can_flip  = (mol == 1) | (mol == 2)
+        flip_to   = np.where(can_flip & (flip & 1 != 0), -1, 1)
+        flip_from = np.where(can_flip & (flip & 2 != 0), -1, 1)
+        swapped = np.arange(4) == mol[..., np.newaxis]
+        proposeto   = np.where(swapped,
+                               from_states * flip_to[..., np.newaxis],
+                               to_states)
+        proposefrom = np.where(swapped,
+                               to_states * flip_from[..., np.newaxis],
+                               from_states)
+        self.move_to_table   = encode_states(proposeto[..., 0],
+                                             proposeto[..., 1],
+                                             proposeto[..., 2],
+                                             proposeto[..., 3])
+        self.move_from_table = encode_states(proposefrom[..., 0],
+                                             proposefrom[..., 1],
+                                             proposefrom[..., 2],
+                                             proposefrom[..., 3])
+        delta_e = (self.energy_table[self.move_to_table] +
+                   self.energy_table[self.move_from_table] -
+                   self.energy_table[to] - self.energy_table[fr])
+        # Same as random() < exp(-delta_e), but without overflowing for
+        # large decreases in energy.
+        self.accept_table = np.exp(-np.maximum(delta_e, 0.0))
+
+    def e_of_state(self, state):
+        """Returns the energy of the input state * beta (inverse
+        temperature), the same as Lattice_Cell_Object.e_of_state,
+        from energy_table. Input should be a
+        list-like object of length 6 of the form:
+        catalyst, catalyst ex. state, htmf, htmf ex. state,
+        cinnamate, product.
+        Returns beta * E (a float)."""
+        return self.energy_table[encode_states(state[0], state[2],
+                                               state[4], state[5])]
+
+    def e_of_states(self, states):
+        """Calculates e_of_state for an integer array of shape (..., 4)
+        of catalyst, htmf, cinnamate, product (no excitation
+        states since they don't contribute). This is used to make
+        energy_table; energy is faster for state codes.
+        Returns an array of beta * E of shape states.shape[:-1]."""
+        occ_prod = states[..., 1] * states[..., 2]
+        occ_sum = (np.abs(states[..., 0]) + np.abs(states[..., 1]) +
+                   np.abs(states[..., 2]))
+        product_repulsion = (np.abs(states[..., 3]) * (occ_sum - 0.5) *
+                             self.large_num)
+        stabil = np.where(occ_prod == -1, self.e_assoc_neg,
+                          np.where(occ_prod == 1, self.e_assoc_pos,
+                                   self.e_assoc)) * occ_sum
+        return self.beta * (product_repulsion - stabil)
+
+    def index_occupied(self):
+        """Builds the index of occupied sites from the planes.
+        The sweeps only look at the sites in this index, so that their
+        cost goes with the number of molecules instead of size**2.
+        It is kept up to date by update_occupied after moves, so this
+        only needs to be called again if the planes are changed from
+        outside of the sweeps.
+        occupied_sites[:n_occupied] are the flat indices of the occupied
+        sites (in no particular order), and site_slot[site] is the
+        position of site in occupied_sites, or -1 if it is empty.
+        Returns None"""
+        n_sites = self.catalyst.size
+        occupied = np.flatnonzero(self.occupied_mask())
+        self.n_occupied     = occupied.size
+        self.occupied_sites = np.zeros(n_sites, dtype = np.intp)
+        self.occupied_sites[:self.n_occupied] = occupied
+        self.site_slot = np.empty(n_sites, dtype = np.intp)
+        self.site_slot.fill(-1)
+        self.site_slot[occupied] = np.arange(self.n_occupied)
+
+    def occupied_mask(self, sites = None):
+        """Returns a flat boolean array that is True where anything is
+        present, for all sites or for the given flat indices sites."""
+        if sites is None:
+            planes = self.flat_planes
+        else:
+            planes = [plane[sites] for plane in self.flat_planes]
+        occupied = planes[0] != 0
+        for plane in planes[1:]:
+            occupied |= plane != 0
+        return occupied
+
+    def occupied(self):
+        """Returns the flat indices of the occupied sites."""
+        return self.occupied_sites[:self.n_occupied]
+
+    def update_occupied(self, sites):
+        """Updates the index of occupied sites after the states of the
+        flat indices sites (all different) might have changed.
+        Returns None"""
+        now = self.occupied_mask(sites)
+        was = self.site_slot[sites] >= 0
+        added   = sites[now & ~was]
+        removed = sites[was & ~now]
+        if not (added.size or removed.size):
+            return
+        free_slots = self.site_slot[removed]
+        self.site_slot[removed] = -1
+        # First put the added sites in the slots that were freed.
+        n_reused = min(added.size, free_slots.size)
+        self.occupied_sites[free_slots[:n_reused]] = added[:n_reused]
+        self.site_slot[added[:n_reused]] = free_slots[:n_reused]
+        if added.size > n_reused:
+            # More added than removed: add the rest at the end.
+            new_n = self.n_occupied + added.size - n_reused
+            self.occupied_sites[self.n_occupied:new_n] = added[n_reused:]
+            self.site_slot[added[n_reused:]] = np.arange(self.n_occupied,
+                                                         new_n)
+        else:
+            # More removed than added: the slots that are still free
+            # below the new end are filled with the occupied sites that
+            # are past the new end.
+            free_slots = free_slots[n_reused:]
+            new_n = self.n_occupied - free_slots.size
+            tail = np.arange(new_n, self.n_occupied)
+            movers = tail[~np.in1d(tail, free_slots)]
+            holes  = free_slots[free_slots < new_n]
+            self.occupied_sites[holes] = self.occupied_sites[movers]
+            self.site_slot[self.occupied_sites[holes]] = holes
+        self.n_occupied = new_n
+
+    def get_state(self):
+        """Returns everything needed to continue this lattice exactly
+        where it is (planes, excitation, occupied index, move
+        bookkeeping and random stream) as a dict of copies, for
+        checkpoints. set_state puts it back."""
+        return {'catalyst':        self.catalyst.copy(),
+                'htmf':            self.htmf.copy(),
+                'cinna':           self.cinna.copy(),
+                'product':         self.product.copy(),
+                'excitation':      self.excitation.copy(),
+                'n_occupied':      self.n_occupied,
+                'occupied_sites':  self.occupied_sites.copy(),
+                'site_slot':       self.site_slot.copy(),
+                'sweep_count':     self.sweep_count,
+                'site_direction':  self.site_direction.copy(),
+                'direction_sweep': self.direction_sweep.copy(),
+                'rng':             self.rng.get_state(),
+                'profile':         copy.deepcopy(self.get_profile())}
+
+    def set_state(self, state):
+        """Sets this lattice to a state from get_state of a lattice with
+        the same arguments, size and dimension.
+        The arrays are copied into the existing ones, so the flat views
+        stay valid.
+        Returns None"""
+        for name in ('catalyst', 'htmf', 'cinna', 'product', 'excitation',
+                     'occupied_sites', 'site_slot', 'site_direction',
+                     'direction_sweep'):
+            getattr(self, name)[...] = state[name]
+        self.n_occupied  = state['n_occupied']
+        self.sweep_count = state['sweep_count']
+        self.rng.set_state(state['rng'])
+        self.seed    = self.rng.seed
+        self.replica = self.rng.replica
+        self.profile = copy.deepcopy(state.get('profile'))
+
+    def get_configuration(self):
+        """Returns copies of the planes and excitation states (what is on
+        the lattice, without the random stream or parameters), for
+        swapping configurations between lattices (see exchangelat)."""
+        return {'catalyst':   self.catalyst.copy(),
+                'htmf':       self.htmf.copy(),
+                'cinna':      self.cinna.copy(),
+                'product':    self.product.copy(),
+                'excitation': self.excitation.copy()}
+
+    def set_configuration(self, configuration):
+        """Puts a configuration from get_configuration of a lattice of
+        the same size and dimension on this lattice, and rebuilds the
+        index of occupied sites.
+        Returns None"""
+        for name in ('catalyst', 'htmf', 'cinna', 'product', 'excitation'):
+            getattr(self, name)[...] = configuration[name]
+        self.index_occupied()
+
+    def state_codes(self):
+        """Returns the state code of each site as a uint8 array the
+        shape of the lattice."""
+        return encode_states(self.catalyst, self.htmf,
+                             self.cinna, self.product)
+
+    def state_histogram(self):
+        """Returns the number of sites in each state code, as an array of
+        length n_states. Only the occupied sites are looked at.
+        Syntax: state_histogram()"""
+        occupied = self.occupied()
+        codes = encode_states(*[plane[occupied] for plane
+                                in self.flat_planes])
+        histogram = np.bincount(codes, minlength = n_states)
+        histogram[empty_state] += self.catalyst.size - self.n_occupied
+        return histogram
+
+    def energy(self, states = None):
+        """Returns beta * E of each state code in the array states
+        (by looking it up in energy_table), for example from
+        state_codes or a saved trajectory.
+        If states is not given, uses the current state of this lattice.
+        Use energy().sum() for the energy of the whole lattice.
+        Syntax: energy(states)
+        Returns an array of floats the same shape as states."""
+        if states is None:
+            states = self.state_codes()
+        return self.energy_table[states]
+
+    def site_state(self, index):
+        """Returns the state of the site at index (a tuple or a flat
+        integer index) in the same order as accept_move uses:
+        [catalyst, catalyst ex. state, htmf, htmf ex. state,
+        cinnamate, product]"""
+        if type(index) == int:
+            index = np.unravel_index(index, self.catalyst.shape)
+        return [int(self.catalyst[index]),
+                float(self.catalyst_excitation_state[index]),
+                int(self.htmf[index]),
+                float(self.htmf_excitation_state[index]),
+                int(self.cinna[index]),
+                int(self.product[index])]
+
+    def set_site_state(self, index, state):
+        """Sets the state of the site at index from a list in the order
+        given by site_state.
+        Returns None"""
+        if type(index) == int:
+            index = np.unravel_index(index, self.catalyst.shape)
+        self.catalyst[index]                  = state[0]
+        self.catalyst_excitation_state[index] = state[1]
+        self.htmf[index]                      = state[2]
+        self.htmf_excitation_state[index]     = state[3]
+        self.cinna[index]                     = state[4]
+        self.product[index]                   = state[5]
+
+    def accept_move(self, c_state, p_state):
+        """Does the Metropolis comparison of Lattice_Cell_Object.accept_move
+        for the state c_state of the site being moved into and the state
+        p_state of the site trying to move, using the lookup tables.
+        Both lists are changed in place to be the states after the move.
+        Returns None"""
+        to = encode_states(c_state[0], c_state[2], c_state[4], c_state[5])
+        fr = encode_states(p_state[0], p_state[2], p_state[4], p_state[5])
+        # Molecules are 0 catalyst, 1 htmf, 2 cinnamate, 3 product.
+        molecule_list = self.rng.permutation(4)
+        for mol in molecule_list:
+            flip = self.rng.integers(4)
+            accepted = (self.rng.uniform() <
+                        self.accept_table[to, fr, mol, flip])
+            if (self.profile is not None and
+                    (state_table[to, mol] or state_table[fr, mol])):
+                self.profile.count_move(mol, accepted)
+            if accepted:
+                to, fr = (self.move_to_table[to, fr, mol, flip],
+                          self.move_from_table[to, fr, mol, flip])
+                # Excitation goes with the excitable molecules
+                if mol < 2:
+                    c_state[2 * mol + 1], p_state[2 * mol + 1] = \
+                        p_state[2 * mol + 1], c_state[2 * mol + 1]
+        c_state[0], c_state[2], c_state[4], c_state[5] = state_table[to]
+        p_state[0], p_state[2], p_state[4], p_state[5] = state_table[fr]
+
+    def over_sites(self, kw):
+        """This function will take a keyword and apply that keyword
+        over all the lattice site. The keyword must belong to this
+        list: (excite, react, move, sample).
+        Syntax over_sites(keyword)
+        Returns None, except if keyword == sample,
+        then it will return the occupation state of each site"""
+        if type(kw) != str:
+            raise TypeError('keyword must be a string')
+        if self.profile is not None:
+            start = timer()
+        result = None
+        if   kw == 'excite':
+            self.excite()
+        elif kw == 'react':
+            self.react()
+        elif kw == 'move':
+            self.move()
+        elif kw == 'sample':
+            result = self.sample()
+        else:
+            raise IOError('keyword not recognized. Given: %s' % kw)
+        if self.profile is not None:
+            self.profile.add_time(kw, timer() - start)
+        return result
+
+    def enable_profile(self):
+        """Starts collecting phase times and move and reaction counts
+        (see profilelat).
+        Returns the Profile (also self.profile)."""
+        self.profile = profilelat.Profile()
+        return self.profile
+
+    def get_profile(self):
+        """Returns the Profile with everything collected so far, or
+        None if profiling is not enabled."""
+        return self.profile
+
+    def excite(self):
+        """Excites each occupied catalyst and htmf with probability
+        excit_prob, as in Lattice_Cell_Object.excite, for all the
+        occupied sites at once.
+        Returns None"""
+        occupied = self.occupied()
+        # One random array for the whole sweep: [0] for the catalyst
+        # and [1] for the htmf.
+        excited = self.rng.uniform((2, occupied.size)) < self.excit_prob
+        excited[0] &= self.flat_planes[0][occupied] != 0
+        excited[1] &= self.flat_planes[1][occupied] != 0
+        self.flat_excitation[0, occupied[excited[0]]] = 1.0
+        self.flat_excitation[1, occupied[excited[1]]] = 1.0
+
+    def react(self):
+        """Reacts fully occupied sites, as in Lattice_Cell_Object.react,
+        for all the occupied sites at once, then halves the excitation
+        states of the sites that had no product (like there, a site with
+        product is left as it is).
+        A reaction leaves the catalyst and product, so it never changes
+        which sites are occupied.
+        Returns None"""
+        occupied = self.occupied()
+        catalyst, htmf, cinna, product = [plane[occupied] for plane in
+                                          self.flat_planes]
+        excitation = self.flat_excitation[:, occupied]
+        # This will be 0 if not fully occupied, otherwise it is the
+        # sign of the product that would be made.
+        occupancy_product = catalyst * htmf * cinna
+        # Probability of each site reacting, attenuated by the excitation
+        # (only one of htmf or catalyst needs to be excited).
+        p_react = np.where(occupancy_product == 1, self.p_react_pos,
+                           np.where(occupancy_product == -1,
+                                    self.p_react_neg, 0.0))
+        p_react *= excitation.max(axis = 0)
+        # If there is already a product here, don't want another reaction
+        # occuring here and replacing it.
+        reacted = ((self.rng.uniform(p_react.shape) < p_react) &
+                   (product == 0))
+        if self.profile is not None:
+            attempted = (occupancy_product != 0) & (product == 0)
+            self.profile.count_reactions(occupancy_product[attempted],
+                                         reacted[attempted])
+        # Create product, and remove reactants and excitation.
+        sites = occupied[reacted]
+        self.flat_planes[3][sites] = occupancy_product[reacted]
+        self.flat_planes[1][sites] = 0
+        self.flat_planes[2][sites] = 0
+        excitation[:, reacted] = 0.0
+        # Reduce the excitation state, except on the sites that already
+        # had product. (Empty sites never have any excitation since it
+        # moves with the molecules.)
+        self.flat_excitation[:, occupied] = np.where(product == 0,
+                                                     excitation * 0.5,
+                                                     excitation)
+
+    def move(self):
+        """Does the move sweep given by move_mode.
+        Returns None"""
+        if self.move_mode == 'checkerboard':
+            self.move_checkerboard()
+        else:
+            self.move_serial()
+
+    def move_serial(self):
+        """Walks the occupied sites in order and lets each one try to
+        move to a random neighbour, as in the move branch of
+        Lattice.over_sites. Like there, a site further along that
+        something was just moved into gets its turn too.
+        Returns None"""
+        pending = sorted(self.occupied())
+        queued  = set(pending)
+        k = 0
+        while k < len(pending):
+            site = int(pending[k])
+            k += 1
+            # Might have been emptied by an earlier move.
+            if self.site_slot[site] < 0:
+                continue
+            direc = self.rng.integers(self.max_move)
+            move_to = int(self.neighbour_table[site, direc])
+            p_state = self.site_state(site)
+            c_state = self.site_state(move_to)
+            self.accept_move(c_state, p_state)
+            self.set_site_state(move_to, c_state)
+            self.set_site_state(site, p_state)
+            self.update_occupied(np.array((move_to, site)))
+            if (move_to > site and move_to not in queued and
+                    self.site_slot[move_to] >= 0):
+                insort(pending, move_to, k)
+                queued.add(move_to)
+
+    def move_checkerboard(self):
+        """Lets every occupied site try to move to a random neighbour
+        (once per sweep, like move_serial), but all the sites in one
+        sublattice moving in one direction are tried at the same time.
+        The sublattices (direction, class) are done in a random order.
+        Returns None"""
+        n_groups = self.max_move * 3
+        self.sweep_count += 1
+        for g in self.rng.permutation(n_groups):
+            direc, s_class = divmod(g, 3)
+            self.move_group(direc, s_class)
+
+    def move_group(self, direc, s_class):
+        """Tries the moves of all the occupied sites in sublattice
+        class s_class that picked direction direc this sweep (one group
+        of move_checkerboard).
+        Returns None"""
+        source = self.group_sources(direc, s_class)
+        if not source.size:
+            return
+        target = self.neighbour_table[source, self.site_direction[source]]
+        self.accept_moves(target, source)
+        self.update_occupied(np.concatenate((target, source)))
+
+    def group_sources(self, direc, s_class):
+        """Returns the flat indices of the occupied sites in sublattice
+        class s_class that picked direction direc this sweep (picking
+        the directions of the sites that have not yet)."""
+        # Whether a site moves depends on it being occupied when its
+        # group comes up (earlier groups might have moved things in
+        # or out), like in move_serial.
+        occupied = self.occupied()
+        self.pick_directions(occupied)
+        return occupied[
+            (self.site_direction[occupied] == direc) &
+            (self.sublattice_class[self.move_axis[direc], occupied] ==
+             s_class)]
+
+    def pick_directions(self, occupied):
+        """Picks the direction of each of the sites occupied that has not
+        picked one yet this sweep. Each site picks the first time it is
+        looked at in a sweep (the same as all sites picking at the
+        start, but only costs anything for occupied sites).
+        Returns None"""
+        new = occupied[self.direction_sweep[occupied] != self.sweep_count]
+        self.site_direction[new]  = self.rng.integers(self.max_move,
+                                                      new.size)
+        self.direction_sweep[new] = self.sweep_count
+
+    def accept_moves(self, target, source):
+        """Vectorized accept_move for many (target, source) pairs of flat
+        site indices. No site may be in more than one pair.
+        Each pair tries to swap each of its molecules (in a random order
+        for each pair) with the same Metropolis test as
+        Lattice_Cell_Object.accept_move and check_proposed, looked up
+        in accept_table.
+        Returns None"""
+        n_pairs = target.size
+        pairs = np.arange(n_pairs)
+        # State codes of the site being moved into (to) and the one
+        # being moved out of (fr), and their excitations as
+        # (n_pairs, 2) arrays of catalyst and htmf excitation.
+        to = encode_states(*[plane[target] for plane in self.flat_planes])
+        fr = encode_states(*[plane[source] for plane in self.flat_planes])
+        to_excit   = self.flat_excitation[:, target].T.copy()
+        from_excit = self.flat_excitation[:, source].T.copy()
+        # Random order of molecules for each pair, orientation flips
+        # for htmf and cinnamate, and the Metropolis random numbers.
+        order = np.argsort(self.rng.uniform((n_pairs, 4)), axis = 1)
+        flips = self.rng.integers(4, (n_pairs, 4))
+        rand  = self.rng.uniform((n_pairs, 4))
+        for k in xrange(4):
+            mol = order[:, k]
+            proposal = (to, fr, mol, flips[:, k])
+            accepted = rand[:, k] < self.accept_table[proposal]
+            if self.profile is not None:
+                self.profile.count_moves(
+                    mol, (state_table[to, mol] != 0) |
+                    (state_table[fr, mol] != 0), accepted)
+            to = np.where(accepted, self.move_to_table[proposal], to)
+            fr = np.where(accepted, self.move_from_table[proposal], fr)
+            # Excitation goes with the excitable molecules (catalyst 0,
+            # htmf 1).
+            swap = accepted & (mol < 2)
+            swap_rows = pairs[swap]
+            swap_mol  = mol[swap]
+            excit = to_excit[swap_rows, swap_mol]
+            to_excit[swap_rows, swap_mol]   = from_excit[swap_rows, swap_mol]
+            from_excit[swap_rows, swap_mol] = excit
+        to_states   = state_table[to]
+        from_states = state_table[fr]
+        for m in xrange(4):
+            self.flat_planes[m][target] = to_states[:, m]
+            self.flat_planes[m][source] = from_states[:, m]
+        self.flat_excitation[:, target] = to_excit.T
+        self.flat_excitation[:, source] = from_excit.T
+
+    def sample(self):
+        """Returns the occupation of each site as an array of strings
+        in the same 'c,h,n,p' format as Lattice.over_sites('sample').
+        (The same 'a10' length as Lattice.sample_templ.)"""
+        return sample_planes(self.catalyst, self.htmf, self.cinna,
+                             self.product)
@@ -0,0 +1,354 @@
+#! /usr/bin/env python
+"""Benchmarks of the sweep throughput of each lattice engine over a
+matrix of lattice size, molecprob and beta, so a change can be checked
+for speed (and slowdowns caught) before a long cluster campaign.
+
+For each case the excite, react and move phases of over_sites are timed
+separately and together (a 'sweep'), and for the engines that
+runlat.run_react can use, a whole run_react run is timed too. Each is
+reported as seconds per sweep, sites per second (lattice sites swept
+per second) and molecules per second (molecules swept per second).
+The results are written as a JSON file, which can be compared with the
+file of an earlier (baseline) run with compare.
+
+Example, from python:
+    results = benchlat.run_benchmarks(sizes = [25, 100],
+                                      file_name = 'bench.json')
+    slower = benchlat.compare(results, benchlat.read_results('base.json'))
+or from the command line:
+    python benchlat.py --sizes 25 100 --out bench.json --baseline base.json
+which exits with status 1 if anything got slower than the baseline by
+more than --tolerance."""
+
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+from time import strftime
+from timeit import default_timer as timer
+import numpy as np
+import arraylat
+import domainlat
+import initializelat as initlat
+import jitlat
+import kmclat
+import latticecellobject
+import observables
+import runlat
+
+# The default matrix of cases.
+default_sizes      = (25, 50, 100, 200, 500, 1000)
+default_molecprobs = (0.01, 0.05, 0.1)
+default_betas      = (0.5, 1.0, 2.0)
+# The other five parameters of the arguments tuple (molecprob and beta
+# are filled in for each case).
+base_arguments = (None, 0.1, 2.0, 0.5, 2.0, 0.05, None)
+# move_prob used by the sites of Legacy_Lattice in place of beta.
+legacy_move_prob = 0.5
+# The phases of a sweep, in the order runlat.run_react does them.
+phases = ('excite', 'react', 'move')
+
+
+class Legacy_Lattice(initlat.Lattice):
+    """Lattice with the original rules of latticecellobject (reaction,
+    association and move probabilities instead of energies).
+    The last of the arguments is move_prob instead of beta."""
+    cell_class = latticecellobject.Lattice_Cell_Object
+
+    def make_sites(self, arguments, shape, stream):
+        """Makes each site with mapable_site, so it checks its own
+        arguments and draws its own occupancy, as the original sites do.
+        (They draw from the random module, so that is seeded from
+        stream.)
+        Returns a numpy array of cell_class objects."""
+        random.seed(stream.integers(2**52))
+        sites = np.empty(shape, dtype = object)
+        for k in xrange(sites.size):
+            sites.flat[k] = self.mapable_site(arguments)
+        return sites
+
+
+def legacy_lattice(arguments, size, dimension, seed = None):
+    """Returns a Legacy_Lattice for arguments, with legacy_move_prob
+    as its move_prob."""
+    return Legacy_Lattice(tuple(arguments[:6]) + (legacy_move_prob,),
+                          size, dimension, seed = seed)
+
+
+def serial_lattice(arguments, size, dimension, seed = None):
+    """Returns an Array_Lattice with the serial move sweep."""
+    return arraylat.Array_Lattice(arguments, size, dimension,
+                                  move_mode = 'serial', seed = seed)
+
+
+# Engines that can be benchmarked, by name. Each is called with
+# (arguments, size, dimension, seed = seed) and returns a lattice.
+engines = {'object':       initlat.Lattice,
+           'legacy':       legacy_lattice,
+           'array':        arraylat.Array_Lattice,
+           'array_serial': serial_lattice,
+           'jit':          jitlat.JIT_Lattice,
+           'kmc':          kmclat.KMC_Lattice,
+           'domain':       domainlat.Domain_Lattice}
+# Engines that do one Python call per site (or per event) and so would
+# take hours on the largest lattices are only run up to this size,
+# unless run_benchmarks is given another max_slow_size.
+slow_engines = ('object', 'legacy', 'array_serial', 'kmc')
+default_max_slow_size = 200
+
+
+def count_molecules(lattice):
+    """Returns the number of molecules (catalyst, htmf, cinnamate and
+    product) on lattice."""
+    histogram = observables.state_histogram(lattice)
+    per_state = (np.abs(observables.catalyst) + np.abs(observables.htmf) +
+                 np.abs(observables.cinna) + np.abs(observables.product))
+    return int(np.dot(histogram, per_state))
+
+
+def time_phases(lattice, min_time = 1.0, max_sweeps = 50):
+    """Does sweeps of lattice (each phase in turn) until they have taken
+    at least min_time seconds, or max_sweeps have been done (but always
+    at least one).
+    Returns the number of sweeps and a dict of the seconds taken by
+    each phase in all of them."""
+    seconds = dict.fromkeys(phases, 0.0)
+    sweeps = 0
+    while sweeps == 0 or (sweeps < max_sweeps and
+                          sum(seconds.values()) < min_time):
+        for phase in phases:
+            start = timer()
+            lattice.over_sites(phase)
+            seconds[phase] += timer() - start
+        sweeps += 1
+    return sweeps, seconds
+
+
+def time_run_react(engine, arguments, size, dimension, steps, seed):
+    """Times a whole runlat.run_react run of steps steps (writing a
+    binary trajectory with only the first and last frames to a
+    temporary directory).
+    Returns the number of sweeps done (steps + 1) and the seconds."""
+    out_dir = tempfile.mkdtemp(prefix = 'benchlat')
+    try:
+        start = timer()
+        runlat.run_react(arguments, steps, size, sample_int = steps,
+                         dimension = dimension, backend = engine,
+                         output_format = 'binary',
+                         file_name = os.path.join(out_dir, 'bench.out'),
+                         verbose = False, seed = seed)
+        seconds = timer() - start
+    finally:
+        shutil.rmtree(out_dir)
+    return steps + 1, seconds
+
+
+def bench_case(engine, size, molecprob, beta, dimension = 2,
+               min_time = 1.0, max_sweeps = 50, seed = 0):
+    """Benchmarks one engine for one lattice size, molecprob and beta.
+    One sweep is done before timing, so one-off costs (compiling the
+    kernels of jit, for example) are not counted.
+    Returns a list of records (dicts), one for each of phases, one for
+    the whole 'sweep' and (for engines runlat can use) one for
+    'run_react'."""
+    arguments = list(base_arguments)
+    arguments[0] = molecprob
+    arguments[6] = beta
+    arguments = tuple(arguments)
+    start = timer()
+    lattice = engines[engine](arguments, size, dimension, seed = seed)
+    init_seconds = timer() - start
+    for phase in phases:
+        lattice.over_sites(phase)
+    n_sites     = size**dimension
+    n_molecules = count_molecules(lattice)
+    compiled    = getattr(lattice, 'compiled', None)
+    sweeps, seconds = time_phases(lattice, min_time, max_sweeps)
+    if hasattr(lattice, 'close'):
+        lattice.close()
+    seconds['sweep'] = sum(seconds.values())
+    timed = [(phase, sweeps, seconds[phase])
+             for phase in phases + ('sweep',)]
+    if engine in runlat.backends:
+        timed.append(('run_react',) +
+                     time_run_react(engine, arguments, size, dimension,
+                                    sweeps, seed))
+    records = []
+    for phase, n_sweeps, phase_seconds in timed:
+        # (Guard against a timer too coarse to see a tiny phase.)
+        rate = n_sweeps / max(phase_seconds, 1e-9)
+        records.append({'engine':               engine,
+                        'size':                 size,
+                        'dimension':            dimension,
+                        'molecprob':            molecprob,
+                        'beta':                 beta,
+                        'phase':                phase,
+                        'compiled':             compiled,
+                        'sweeps':               n_sweeps,
+                        'seconds':              phase_seconds,
+                        'seconds_per_sweep':    1.0 / rate,
+                        'sites_per_second':     n_sites * rate,
+                        'molecules_per_second': n_molecules * rate,
+                        'n_sites':              n_sites,
+                        'n_molecules':          n_molecules,
+                        'init_seconds':         init_seconds})
+    return records
+
+
+def machine_info():
+    """Returns a dict describing where and with what the benchmarks
+    were run (to tell whether two results files can be compared)."""
+    try:
+        numba_version = jitlat.numba.__version__
+    except AttributeError:
+        numba_version = None
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd = os.path.dirname(os.path.abspath(__file__)),
+            stderr = open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'date':      strftime('%Y-%m-%d %H:%M:%S'),
+            'host':      platform.node(),
+            'machine':   platform.machine(),
+            'cpu_count': multiprocessing.cpu_count(),
+            'python':    platform.python_version(),
+            'numpy':     np.__version__,
+            'numba':     numba_version,
+            'commit':    commit}
+
+
+def run_benchmarks(engine_names = None, sizes = default_sizes,
+                   molecprobs = default_molecprobs, betas = default_betas,
+                   dimension = 2, min_time = 1.0, max_sweeps = 50,
+                   max_slow_size = default_max_slow_size, seed = 0,
+                   file_name = None, verbose = True):
+    """Runs bench_case for every engine in engine_names (default all of
+    engines) and every combination of sizes, molecprobs and betas.
+    The engines in slow_engines are skipped for sizes above
+    max_slow_size (None to run them for every size).
+    If file_name is given the results are written to it as JSON (after
+    every case, so a partial run still leaves its results).
+    Syntax: run_benchmarks(engine_names, sizes, molecprobs, betas,
+    dimension, min_time, max_sweeps, max_slow_size, seed, file_name,
+    verbose)
+    Returns the results, a dict with 'machine' (see machine_info) and
+    'records' (see bench_case)."""
+    if engine_names is None:
+        engine_names = sorted(engines.keys())
+    unknown = [name for name in engine_names if name not in engines]
+    if unknown:
+        raise ValueError('unknown engines %s, known are %s' %
+                         (unknown, sorted(engines.keys())))
+    results = {'machine': machine_info(), 'records': []}
+    for engine in engine_names:
+        for size in sizes:
+            if (engine in slow_engines and max_slow_size is not None and
+                    size > max_slow_size):
+                continue
+            for molecprob in molecprobs:
+                for beta in betas:
+                    records = bench_case(engine, size, molecprob, beta,
+                                         dimension, min_time, max_sweeps,
+                                         seed)
+                    results['records'].extend(records)
+                    if verbose:
+                        sweep = records[len(phases)]
+                        print ('%-12s size %5i molecprob %5.3f beta %4.2f:'
+                               ' %10.4g sites/s %10.4g molecules/s' %
+                               (engine, size, molecprob, beta,
+                                sweep['sites_per_second'],
+                                sweep['molecules_per_second']))
+                    if file_name:
+                        write_results(file_name, results)
+    return results
+
+
+def write_results(file_name, results):
+    """Writes results to file_name as JSON, first to a temporary file
+    then renamed, so the file is always complete.
+    Returns None"""
+    with open(file_name + '.tmp', 'w') as out_file:
+        json.dump(results, out_file, indent = 1, sort_keys = True)
+    os.rename(file_name + '.tmp', file_name)
+
+
+def read_results(file_name):
+    """Returns the results written by write_results."""
+    with open(file_name) as in_file:
+        return json.load(in_file)
+
+
+def record_key(record):
+    """Returns what identifies the case and phase of a record."""
+    return (record['engine'], record['size'], record['dimension'],
+            record['molecprob'], record['beta'], record['phase'])
+
+
+def compare(results, baseline, tolerance = 0.1,
+            measure = 'sites_per_second'):
+    """Compares results with baseline (both from run_benchmarks or
+    read_results), for the cases and phases that are in both.
+    Returns the list of the ones that got slower by more than the
+    fraction tolerance, as (key, baseline rate, new rate, new / baseline)
+    tuples (key from record_key)."""
+    base_rates = dict((record_key(record), record[measure])
+                      for record in baseline['records'])
+    slower = []
+    for record in results['records']:
+        key = record_key(record)
+        if key not in base_rates or not base_rates[key]:
+            continue
+        ratio = record[measure] / base_rates[key]
+        if ratio < 1.0 - tolerance:
+            slower.append((key, base_rates[key], record[measure], ratio))
+    return slower
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(
+        description = 'Benchmark the sweep throughput of the lattice ' +
+                      'engines.')
+    parser.add_argument('--engines', dest = 'engine_names', nargs = '+',
+                        default = None, choices = sorted(engines.keys()))
+    parser.add_argument('--sizes', type = int, nargs = '+',
+                        default = list(default_sizes))
+    parser.add_argument('--molecprobs', type = float, nargs = '+',
+                        default = list(default_molecprobs))
+    parser.add_argument('--betas', type = float, nargs = '+',
+                        default = list(default_betas))
+    parser.add_argument('--dimension', type = int, default = 2)
+    parser.add_argument('--min-time', type = float, default = 1.0)
+    parser.add_argument('--max-sweeps', type = int, default = 50)
+    parser.add_argument('--max-slow-size', type = int,
+                        default = default_max_slow_size)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--out', dest = 'file_name',
+                        default = 'bench_' + strftime('%Y%m%d%H%M') +
+                                  '.json')
+    parser.add_argument('--baseline', default = None,
+                        help = 'results file to compare with')
+    parser.add_argument('--tolerance', type = float, default = 0.1,
+                        help = 'fraction slower than the baseline that ' +
+                               'counts as a regression')
+    options = vars(parser.parse_args())
+    baseline  = options.pop('baseline')
+    tolerance = options.pop('tolerance')
+    results = run_benchmarks(**options)
+    print 'results written to %s' % options['file_name']
+    if baseline:
+        slower = compare(results, read_results(baseline), tolerance)
+        for key, base_rate, rate, ratio in slower:
+            print ('slower: %s size %i dimension %i molecprob %g beta %g '
+                   '%s: %.4g -> %.4g sites/s (%.2f)' %
+                   (key + (base_rate, rate, ratio)))
+        if slower:
+            sys.exit(1)
+        print 'no regressions against %s' % baseline
@@ -0,0 +1,230 @@
+#! /usr/bin/env python
+"""A store of finished runlat.run_react results, addressed by a hash of
+everything that decides what a run writes, so a run that has been done
+before is copied from the store instead of being run again.
+
+The key of a run (run_key) is the model_version and the run parameters:
+arguments, steps, size, sample_int, dimension and seed, and also the
+replica, backend and output_format (the engines and formats write
+different files for the same seed), observe_int, observe_names and
+converge (the observables file, and where a converged run stops) and
+profile (whether there is a profile file). For the 'jit' backend it also
+has whether numba is there (jitlat.have_numba), since the compiled
+sweeps and the NumPy ones they fall back to give different runs.
+Runs without a seed can't be repeated, so they are never looked up,
+but they are stored with the seed they picked.
+
+In the store directory, the result of a run with hash h is the output
+file h[:2]/h, with its observables, convergence and profile files
+(h + '.obs', h + '.conv', h + '.prof') if it has them, and h + '.json',
+the key and the file names, which is written last so a result is only
+found once it is complete. Every result stored is also added as one
+line of JSON to index_name (appended in one write, so runs in parallel
+processes can share a store). Files are copied in and out, never
+linked, so writing over an output file can't change the store. (The
+times in a profile that is copied out are those of the run that was
+stored.)
+
+Example:
+    runlat.run_react(arguments, steps = 2000, size = 100, seed = 1234,
+                     cache = 'lattice_cache')
+runs the first time and copies the stored result every time after;
+    python cachelat.py lattice_cache
+lists what is in a store."""
+
+import hashlib
+import json
+import os
+import shutil
+import jitlat
+import observables
+
+# Bumped when a change to the model or the engines changes the result
+# of the same run, so results from before are not used.
+# 2: array and jit react leave the excitation of product sites alone,
+# and the kmc moves are whole move attempts.
+model_version = 2
+# Files of a result, by their ending after the output file name: the
+# output, and its observables, convergence test and profile if the run
+# had them.
+output_suffix   = ''
+observe_suffix  = '.obs'
+converge_suffix = '.conv'
+profile_suffix  = '.prof'
+# Name of the index in the store directory.
+index_name = 'index.jsonl'
+
+
+def run_key(run):
+    """Returns the key (a dict, see the module docstring) of the run
+    described by run, a dict of keyword arguments of runlat.run_react
+    (the run dict of a checkpoint, for example)."""
+    observe_int = run.get('observe_int')
+    observe_names = None
+    if observe_int:
+        observe_names = list(run.get('observe_names') or
+                             observables.default_names)
+    backend = run.get('backend', 'object')
+    compiled = None
+    if backend == 'jit':
+        compiled = jitlat.have_numba
+    return {'model_version': model_version,
+            'arguments':     [float(arg) for arg in run['arguments']],
+            'steps':         run['steps'],
+            'size':          run['size'],
+            'sample_int':    run['sample_int'],
+            'dimension':     run.get('dimension', 2),
+            'seed':          run.get('seed'),
+            'replica':       run.get('replica', 0),
+            'backend':       backend,
+            'compiled':      compiled,
+            'output_format': run.get('output_format', 'text'),
+            'observe_int':   observe_int or None,
+            'observe_names': observe_names,
+            'converge':      run.get('converge'),
+            'profile':       bool(run.get('profile'))}
+
+
+def sweep_replica(arguments, replica):
+    """Returns the rnglat replica for replica number replica of the
+    arguments tuple arguments in a sweep with a result store: a number
+    (below 2**31) made from the arguments themselves, so the same point
+    gets the same random stream (and so the same key) in any sweep it
+    is in, whatever else is in the sweep."""
+    text = json.dumps([[float(arg) for arg in arguments], replica])
+    return int(hashlib.sha1(text).hexdigest()[:8], 16) & 0x7fffffff
+
+
+def key_hash(key):
+    """Returns the hash (40 hex digits) of the key key."""
+    return hashlib.sha1(json.dumps(key, sort_keys = True)).hexdigest()
+
+
+def make_directory(directory):
+    """Makes directory (and the ones it is in) if it isn't there.
+    Returns None"""
+    try:
+        os.makedirs(directory)
+    except OSError:
+        # (It can be there already, or be made by another process first.)
+        if not os.path.isdir(directory):
+            raise
+
+
+def copy_file(source, destination):
+    """Copies source to destination through a temporary file, so
+    destination is either missing or complete.
+    Returns None"""
+    temp_name = '%s.tmp%i' % (destination, os.getpid())
+    shutil.copyfile(source, temp_name)
+    os.rename(temp_name, destination)
+
+
+class Result_Cache:
+    """A store of run results in a directory (see the module
+    docstring)."""
+
+    def __init__(self, directory):
+        """Opens the store in directory, making it if it isn't there.
+        Syntax: Result_Cache(directory)
+        Returns None"""
+        make_directory(directory)
+        self.directory = directory
+
+    def path(self, digest):
+        """Returns the output file name of the result with hash digest."""
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def lookup(self, run):
+        """Returns the entry (the key, hash and files) of the stored
+        result of run (see run_key), or None if there isn't one (or the
+        run has no seed)."""
+        key = run_key(run)
+        if key['seed'] is None:
+            return None
+        entry_name = self.path(key_hash(key)) + '.json'
+        if not os.path.exists(entry_name):
+            return None
+        with open(entry_name) as entry_file:
+            entry = json.load(entry_file)
+        if entry['key'] != key:
+            return None
+        return entry
+
+    def fetch(self, run, file_name):
+        """Copies the stored result of run (if there is one) to file_name
+        and its observables, convergence and profile files.
+        Returns True if it was found."""
+        entry = self.lookup(run)
+        if entry is None:
+            return False
+        stored = self.path(entry['hash'])
+        for suffix in entry['suffixes']:
+            copy_file(stored + suffix, file_name + suffix)
+        return True
+
+    def store(self, run, file_name):
+        """Copies the result of run, in file_name (and its observables,
+        convergence and profile files, if there are any), into the store,
+        and adds it to the index. run must have the seed the run used.
+        Returns the entry."""
+        key = run_key(run)
+        if key['seed'] is None:
+            raise ValueError('a run can only be stored with its seed')
+        digest = key_hash(key)
+        stored = self.path(digest)
+        make_directory(os.path.dirname(stored))
+        suffixes = [output_suffix]
+        if key['observe_int']:
+            suffixes.append(observe_suffix)
+        if key['converge']:
+            suffixes.append(converge_suffix)
+        if key['profile']:
+            suffixes.append(profile_suffix)
+        for suffix in suffixes:
+            copy_file(file_name + suffix, stored + suffix)
+        entry = {'key':      key,
+                 'hash':     digest,
+                 'suffixes': suffixes,
+                 'source':   file_name,
+                 'size':     os.path.getsize(stored)}
+        temp_name = '%s.json.tmp%i' % (stored, os.getpid())
+        with open(temp_name, 'w') as entry_file:
+            json.dump(entry, entry_file, indent = 1, sort_keys = True)
+        os.rename(temp_name, stored + '.json')
+        with open(os.path.join(self.directory, index_name),
+                  'a') as index_file:
+            index_file.write(json.dumps(entry, sort_keys = True) + '\n')
+        return entry
+
+    def entries(self):
+        """Returns the list of entries in the index, the last one for
+        each hash (a result stored twice replaces the first)."""
+        entries = {}
+        order = []
+        index_path = os.path.join(self.directory, index_name)
+        if not os.path.exists(index_path):
+            return []
+        with open(index_path) as index_file:
+            for line in index_file:
+                # (A line cut short by a killed process is skipped.)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry['hash'] not in entries:
+                    order.append(entry['hash'])
+                entries[entry['hash']] = entry
+        return [entries[digest] for digest in order]
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 2:
+        print "usage: %s cache_directory" % os.path.basename(sys.argv[0])
+        sys.exit(1)
+    for entry in Result_Cache(sys.argv[1]).entries():
+        key = entry['key']
+        print '%s  %s steps:%i size:%i sample_int:%i seed:%i %s' % (
+            entry['hash'][:12], key['arguments'], key['steps'],
+            key['size'], key['sample_int'], key['seed'], key['backend'])
@@ -0,0 +1,54 @@
+"""Checkpoints of a runlat.run_react simulation, so a run that is killed
+(for example by the h_rt limit of the queue) can be continued with
+run_react(resume = checkpoint_file) or runlat.py --resume checkpoint_file.
+
+A checkpoint is a pickled dict with:
+'run':     the keyword arguments of run_react for this run
+           (arguments, steps, size, ..., file_name, seed, replica),
+'step':    the last step that was finished,
+'offset':  the length of the output file after that step,
+'observe_offset': the length of the observables file (or None),
+'converge_state': the history of the convergence test (or None),
+'lattice': the lattice state from its get_state (sites, excitation
+           states and random number state)."""
+
+import cPickle as pickle
+import os
+
+# Bumped if what is saved changes.
+checkpoint_version = 1
+
+
+def save_checkpoint(file_name, run, step, offset, lattice,
+                    observe_offset = None, converge_state = None):
+    """Writes a checkpoint of lattice after step to file_name.
+    It is written to a temporary file first, then renamed over
+    file_name, so there is always a complete checkpoint even if the job
+    is killed while writing.
+    Syntax: save_checkpoint(file_name, run, step, offset, lattice,
+    observe_offset, converge_state)
+    Returns None"""
+    checkpoint = {'version': checkpoint_version,
+                  'run':     run,
+                  'step':    step,
+                  'offset':  offset,
+                  'observe_offset': observe_offset,
+                  'converge_state': converge_state,
+                  'lattice': lattice.get_state()}
+    temp_name = file_name + '.tmp'
+    with open(temp_name, 'wb') as out_file:
+        pickle.dump(checkpoint, out_file, pickle.HIGHEST_PROTOCOL)
+        out_file.flush()
+        os.fsync(out_file.fileno())
+    os.rename(temp_name, file_name)
+
+
+def load_checkpoint(file_name):
+    """Reads a checkpoint written by save_checkpoint.
+    Returns the checkpoint dict (see the module docstring)."""
+    with open(file_name, 'rb') as in_file:
+        checkpoint = pickle.load(in_file)
+    if checkpoint.get('version') != checkpoint_version:
+        raise IOError('%s is not a version %i checkpoint' %
+                      (file_name, checkpoint_version))
+    return checkpoint
@@ -0,0 +1,167 @@
+"""Convergence tests for stopping runlat.run_react early, once the
+observables being watched (product counts, ee, association, ... see
+observables) have stopped changing.
+
+A Convergence is given the values of its observables every time they
+are recorded, and keeps the last 2 * window of them. It has converged
+when, for every observable, the means of the last two windows agree:
+|mean(last) - mean(before)| <= threshold * error + tolerance
+where error is the standard error of the difference of the two means.
+With method 'window' the error assumes the values in a window are
+independent. With method 'autocorrelation' it is made larger by the
+integrated autocorrelation time of the values (so each window only
+counts for its number of independent samples), which is the safer test
+for slowly fluctuating observables like the association counts.
+A count that has plateaued (no fluctuation at all) converges when it
+stops changing; tolerance allows a small drift. But an observable that
+has been 0 all through both windows (no product made yet, say) has not
+converged, it has not started, so a run that is waiting for something
+to happen is not stopped. min_step is the first step a run may stop
+at."""
+
+import json
+import numpy as np
+
+methods = ('window', 'autocorrelation')
+
+
+def autocorrelation_time(values):
+    """Returns the integrated autocorrelation time of the 1D array
+    values (1 for uncorrelated values), summing the autocorrelation
+    until it first drops below zero."""
+    values = np.asarray(values, dtype = float)
+    values = values - values.mean()
+    variance = np.dot(values, values)
+    if variance == 0.0:
+        return 1.0
+    tau = 1.0
+    for lag in xrange(1, values.size // 2):
+        rho = np.dot(values[:-lag], values[lag:]) / variance
+        if rho <= 0.0:
+            break
+        tau += 2.0 * rho
+    return tau
+
+
+class Convergence:
+    """Running-window convergence test of the observables names (see
+    the module docstring)."""
+
+    def __init__(self, names, window = 20, threshold = 2.0,
+                 tolerance = 0.0, method = 'window', min_step = 0):
+        """names are the observables to watch, window the number of
+        records in each of the two windows compared, threshold the
+        number of standard errors the means may differ by, and tolerance
+        an absolute difference that is always allowed. It never
+        converges before step min_step.
+        Syntax: Convergence(names, window, threshold, tolerance, method,
+        min_step)
+        Returns None"""
+        if isinstance(names, basestring):
+            raise TypeError('names must be a list-like, given %s' %
+                            type(names))
+        if type(window) != int or window < 2:
+            raise ValueError('window must be an integer >= 2, given %s' %
+                             (window,))
+        if method not in methods:
+            raise ValueError('method must be one of %s, given %s' %
+                             (methods, method))
+        if type(min_step) != int or min_step < 0:
+            raise ValueError('min_step must be an integer >= 0, given %s' %
+                             (min_step,))
+        self.names     = list(names)
+        self.window    = window
+        self.threshold = float(threshold)
+        self.tolerance = float(tolerance)
+        self.method    = method
+        self.min_step  = min_step
+        # The last 2 * window records, and the step of the last one.
+        self.history   = []
+        self.step      = None
+
+    def add(self, step, values):
+        """Adds the values of the observables (in the order of names)
+        recorded at step.
+        Returns True if the run has converged."""
+        self.history.append([float(value) for value in values])
+        del self.history[:-2 * self.window]
+        self.step = step
+        return self.converged()
+
+    def differences(self):
+        """Returns the difference of the means of the two windows for
+        each observable and the largest allowed (threshold * error +
+        tolerance), as two arrays, or None if there are not two full
+        windows yet."""
+        if len(self.history) < 2 * self.window:
+            return None
+        history = np.array(self.history)
+        before, last = history[:self.window], history[self.window:]
+        variance = (before.var(axis = 0, ddof = 1) +
+                    last.var(axis = 0, ddof = 1)) / self.window
+        if self.method == 'autocorrelation':
+            variance *= [autocorrelation_time(column)
+                         for column in history.T]
+        difference = np.abs(last.mean(axis = 0) - before.mean(axis = 0))
+        return (difference,
+                self.threshold * np.sqrt(variance) + self.tolerance)
+
+    def started(self):
+        """Returns a boolean array that is True for the observables that
+        have not been 0 all through the two windows."""
+        return np.any(np.array(self.history) != 0.0, axis = 0)
+
+    def converged(self):
+        """Returns True if it is step min_step or later, and the means of
+        the two windows agree for every observable, and none of them has
+        been 0 all along."""
+        if self.step is None or self.step < self.min_step:
+            return False
+        differences = self.differences()
+        if differences is None:
+            return False
+        difference, allowed = differences
+        return bool(np.all((difference <= allowed) & self.started()))
+
+    def get_state(self):
+        """Returns the history, for checkpoints. set_state puts it
+        back."""
+        return {'history': [list(values) for values in self.history],
+                'step':    self.step}
+
+    def set_state(self, state):
+        """Sets the history from get_state.
+        Returns None"""
+        self.history = [list(values) for values in state['history']]
+        self.step    = state['step']
+
+    def summary(self):
+        """Returns a JSON serializable dict of the test and where it
+        stands: the settings, the step of the last record, whether it
+        has converged, and the window means and differences."""
+        summary = {'names':     self.names,
+                   'window':    self.window,
+                   'threshold': self.threshold,
+                   'tolerance': self.tolerance,
+                   'method':    self.method,
+                   'min_step':  self.min_step,
+                   'step':      self.step,
+                   'converged': self.converged()}
+        differences = self.differences()
+        if differences is not None:
+            history = np.array(self.history)
+            summary['mean_before'] = history[:self.window].mean(
+                axis = 0).tolist()
+            summary['mean_last']   = history[self.window:].mean(
+                axis = 0).tolist()
+            summary['difference']  = differences[0].tolist()
+            summary['allowed']     = differences[1].tolist()
+            summary['started']     = self.started().tolist()
+        return summary
+
+    def write(self, file_name):
+        """Writes summary to file_name as JSON.
+        Returns None"""
+        with open(file_name, 'w') as out_file:
+            json.dump(self.summary(), out_file, indent = 1,
+                      sort_keys = True)
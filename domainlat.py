@@ -0,0 +1,313 @@
+"""Domain decomposition of one large Array_Lattice over several worker
+processes, so a single big run (2000 x 2000, say) can use every core of
+a node.
+
+The planes and excitation states are kept in shared memory
+(multiprocessing.sharedctypes), and the lattice is split into strips of
+whole rows. Each worker owns one strip: it excites and reacts the
+occupied sites of its strip and does the moves of the sites in its
+strip (the sources). The moves are done with the checkerboard groups of
+Array_Lattice.move_checkerboard: within one (direction, class) group no
+two source/target pairs share a site, so the workers can do their parts
+of a group at the same time, even for moves across strip borders. The
+parent process sends every worker each group in turn, first to pick
+their sources and then to move them, and waits for all of them to finish
+each phase before the next one. So the planes (including the rows at
+the borders, the halos of a message passing code) are always up to date
+when a group starts, and nothing has to be copied between workers.
+
+Each worker keeps an index of the occupied sites of its strip
+(Array_Lattice.index_occupied), updated after its moves like the
+single-process one. Only the first and last rows of a strip can be
+changed by another worker (moving into them from the next strip), so
+those are looked at again before the index is next used. The parent's
+index is made from the workers' when something asks for it.
+
+Each worker has its own random stream, a substream of the lattice's
+(seed, replica) (see rnglat), so runs are repeatable for a given number
+of processes (but not between different numbers of processes)."""
+
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+import arraylat
+import profilelat
+import rnglat
+
+
+def shared_array(shape, dtype, values):
+    """Returns a numpy array of shape and dtype in shared memory (that
+    forked worker processes also see), filled with values."""
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    array = np.frombuffer(RawArray('b', size), dtype = dtype).reshape(shape)
+    array[...] = values
+    return array
+
+
+class Domain_Lattice(arraylat.Array_Lattice):
+    """An Array_Lattice whose sweeps are split over processes worker
+    processes, each owning a strip of rows (see the module docstring).
+    It has the same over_sites contract. close() stops the workers
+    (they also stop when the parent process exits)."""
+
+    # (start, stop) of the flat indices of the strip, set in the
+    # workers (None in the parent).
+    strip = None
+    # Whether the border rows of a worker's strip might have been
+    # changed by the other workers since its index was updated.
+    border_stale = False
+    # Whether the parent's index is out of date.
+    index_stale = False
+
+    def __init__(self, arguments, size = 3, dimension = 2, seed = None,
+                 replica = 0, processes = None):
+        """Same as Array_Lattice (the moves are always the checkerboard
+        ones). processes is the number of workers (default the number of
+        cores, at most size).
+        Syntax: Domain_Lattice(arguments, size, dimension, seed, replica,
+        processes)
+        Returns None."""
+        arraylat.Array_Lattice.__init__(self, arguments, size, dimension,
+                                        seed = seed, replica = replica)
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if type(processes) != int or processes < 1:
+            raise ValueError('processes must be a positive integer, ' +
+                             'given %s' % (processes,))
+        self.processes = min(processes, size)
+        # Move the planes into shared memory (and remake the views).
+        shape = self.catalyst.shape
+        for name in ('catalyst', 'htmf', 'cinna', 'product'):
+            setattr(self, name, shared_array(shape, np.int8,
+                                             getattr(self, name)))
+        self.excitation = shared_array(self.excitation.shape, np.float32,
+                                       self.excitation)
+        self.catalyst_excitation_state = self.excitation[0]
+        self.htmf_excitation_state     = self.excitation[1]
+        self.flat_planes = [plane.reshape(-1) for plane in
+                            (self.catalyst, self.htmf,
+                             self.cinna, self.product)]
+        self.flat_excitation = self.excitation.reshape(2, -1)
+        # Flat index bounds of the strips (of slices along the first
+        # axis).
+        rows = np.linspace(0, size, self.processes + 1).astype(int)
+        self.strip_bounds = rows * size**(dimension - 1)
+        self.workers = []
+        self.start_workers()
+
+    def start_workers(self):
+        """Forks the worker processes (each gets a copy of this lattice
+        that shares the planes).
+        Returns None"""
+        for k in xrange(self.processes):
+            parent_end, child_end = multiprocessing.Pipe()
+            process = multiprocessing.Process(target = self.work,
+                                              args = (k, child_end))
+            process.daemon = True
+            process.start()
+            child_end.close()
+            self.workers.append((process, parent_end))
+
+    def work(self, k, connection):
+        """The loop run by worker k: does the commands sent by the parent
+        on connection for strip k, and answers each one.
+        Returns None"""
+        start, stop = self.strip_bounds[k], self.strip_bounds[k + 1]
+        self.strip = (start, stop)
+        # The first and last rows of the strip.
+        row = self.size**(self.dimension - 1)
+        self.border_sites = np.union1d(np.arange(start, start + row),
+                                       np.arange(stop - row, stop))
+        self.index_occupied()
+        self.rng = rnglat.Random_Stream(self.seed, self.replica,
+                                        substream = k)
+        while True:
+            command, value = connection.recv()
+            if command == 'stop':
+                break
+            elif command == 'excite':
+                arraylat.Array_Lattice.excite(self)
+            elif command == 'react':
+                arraylat.Array_Lattice.react(self)
+            elif command == 'sweep':
+                self.sweep_count = value
+            elif command == 'select':
+                source = self.group_sources(*value)
+            elif command == 'group':
+                direc = value[0]
+                if source.size:
+                    target = self.neighbour_table[source, direc]
+                    self.accept_moves(target, source)
+                    self.update_occupied(np.concatenate((target, source)))
+                self.border_stale = True
+            elif command == 'index':
+                self.index_occupied()
+            elif command == 'set_index':
+                self.set_index(value)
+            elif command == 'occupied':
+                value = self.occupied().copy()
+            elif command == 'get_rng':
+                value = self.rng.get_state()
+            elif command == 'set_rng':
+                self.rng.set_state(value)
+            elif command == 'enable_profile':
+                self.profile = profilelat.Profile()
+            elif command == 'get_profile':
+                # Hand over what was counted since the last time.
+                value = self.profile
+                self.profile = profilelat.Profile()
+            connection.send(value)
+        connection.close()
+
+    def command(self, command, values = None):
+        """Sends command to every worker (with values[k] for worker k,
+        or None) and waits for all of them to finish it.
+        Returns the list of their answers."""
+        if values is None:
+            values = [None] * self.processes
+        for (process, connection), value in zip(self.workers, values):
+            connection.send((command, value))
+        return [connection.recv() for process, connection in self.workers]
+
+    def index_occupied(self):
+        """Array_Lattice.index_occupied (in a worker, of its strip only).
+        Returns None"""
+        if self.strip is None:
+            arraylat.Array_Lattice.index_occupied(self)
+            self.index_stale = False
+            return
+        start, stop = self.strip
+        self.set_index(start + np.flatnonzero(
+            self.occupied_mask(np.arange(start, stop))))
+
+    def set_index(self, occupied):
+        """Sets the index of a worker's strip to the flat indices
+        occupied, in that order (which is the order the sweeps go
+        through them, so it is part of a worker's state).
+        Returns None"""
+        self.n_occupied = occupied.size
+        self.occupied_sites[:self.n_occupied] = occupied
+        self.site_slot.fill(-1)
+        self.site_slot[occupied] = np.arange(self.n_occupied)
+        self.border_stale = False
+
+    def occupied(self):
+        """Returns the flat indices of the occupied sites (in a worker,
+        those of its strip, after looking at its border rows again if
+        other workers might have moved things in or out of them).
+        In the parent, the index is made from the workers' ones if it is
+        out of date."""
+        if self.border_stale:
+            self.border_stale = False
+            self.update_occupied(self.border_sites)
+        elif self.index_stale:
+            self.gather_occupied()
+        return arraylat.Array_Lattice.occupied(self)
+
+    def update_occupied(self, sites):
+        """Array_Lattice.update_occupied (in a worker, of the sites that
+        are in its strip).
+        Returns None"""
+        if self.strip is not None:
+            start, stop = self.strip
+            sites = sites[(sites >= start) & (sites < stop)]
+        arraylat.Array_Lattice.update_occupied(self, sites)
+
+    def gather_occupied(self):
+        """Makes the parent's index of occupied sites from the indices of
+        the workers' strips.
+        Returns None"""
+        self.index_stale = False
+        # (Only the slots of the sites that were in it are cleared.)
+        self.site_slot[arraylat.Array_Lattice.occupied(self)] = -1
+        occupied = np.concatenate(self.command('occupied'))
+        self.n_occupied = occupied.size
+        self.occupied_sites[:self.n_occupied] = occupied
+        self.site_slot[occupied] = np.arange(self.n_occupied)
+
+    def excite(self):
+        """Array_Lattice.excite, each worker for its strip.
+        Returns None"""
+        self.command('excite')
+
+    def react(self):
+        """Array_Lattice.react, each worker for its strip.
+        Returns None"""
+        self.command('react')
+
+    def move(self):
+        """Array_Lattice.move_checkerboard, with each group done by all
+        the workers at once for the sources in their strips.
+        Returns None"""
+        n_groups = self.max_move * 3
+        self.sweep_count += 1
+        self.command('sweep', [self.sweep_count] * self.processes)
+        for g in self.rng.permutation(n_groups):
+            group = [divmod(g, 3)] * self.processes
+            # All the workers pick their sources before any of them
+            # moves, so what they pick doesn't depend on timing.
+            self.command('select', group)
+            self.command('group', group)
+        # The parent's index of occupied sites is made again from the
+        # workers' when it is needed (by state_histogram, say).
+        self.index_stale = True
+
+    def enable_profile(self):
+        """Array_Lattice.enable_profile, and the workers start counting
+        moves and reactions.
+        Returns the Profile."""
+        self.command('enable_profile')
+        return arraylat.Array_Lattice.enable_profile(self)
+
+    def get_profile(self):
+        """Array_Lattice.get_profile, with the counts of the workers
+        added.
+        Returns the Profile, or None."""
+        if self.profile is not None:
+            for worker_profile in self.command('get_profile'):
+                self.profile.merge(worker_profile)
+        return self.profile
+
+    def get_state(self):
+        """Array_Lattice.get_state plus the workers' random streams and
+        indices.
+        Returns a dict."""
+        # (Brings the parent's index up to date.)
+        self.occupied()
+        state = arraylat.Array_Lattice.get_state(self)
+        state['worker_rngs']     = self.command('get_rng')
+        state['worker_occupied'] = self.command('occupied')
+        return state
+
+    def set_state(self, state):
+        """Array_Lattice.set_state plus the workers' random streams and
+        indices (state must be from a lattice with the same number of
+        processes).
+        Returns None"""
+        if len(state['worker_rngs']) != self.processes:
+            raise ValueError('state is from a lattice with %i processes, '
+                             % len(state['worker_rngs']) +
+                             'this one has %i' % self.processes)
+        arraylat.Array_Lattice.set_state(self, state)
+        self.index_stale = False
+        self.command('set_index', state['worker_occupied'])
+        self.command('set_rng', state['worker_rngs'])
+        if self.profile is not None:
+            self.command('enable_profile')
+
+    def set_configuration(self, configuration):
+        """Array_Lattice.set_configuration, and the workers index their
+        strips again.
+        Returns None"""
+        arraylat.Array_Lattice.set_configuration(self, configuration)
+        self.command('index')
+
+    def close(self):
+        """Stops the worker processes.
+        Returns None"""
+        for process, connection in self.workers:
+            connection.send(('stop', None))
+        for process, connection in self.workers:
+            process.join()
+            connection.close()
+        self.workers = []
@@ -0,0 +1,257 @@
+#! /usr/bin/env python
+"""Ensembles of replicas of one set of parameters, advanced together.
+
+Instead of running the same parameters in separate processes for
+duplicate statistics (as batchlatreactjobdups.sh does), Ensemble_Lattice
+stacks R replicas into planes of shape (R, size, ..., size) and advances
+them all in each vectorized excite, react and move pass of
+Array_Lattice, so the interpreter overhead of a pass is paid once for
+all of them. The neighbour table never crosses from one replica to
+another, so they are independent lattices that just share the arrays.
+
+All the replicas draw from the one random stream of the ensemble. Each
+draw is for a different site, and in the checkerboard move sweep each
+replica does the (direction, class) groups in its own random order
+(they are done side by side, the first group of each replica, then the
+second, ...), so the replicas are statistically independent. But
+replica k of an ensemble is not the same run as runlat.run_react with
+replica k.
+
+run_ensemble writes a trajectory (and observables, if observe_int is
+given) for each replica, through Replica_View, and the mean of the
+observables over the replicas to file_name + '_mean.obs'.
+
+Example, from python:
+    ensemblelat.run_ensemble((0.02, 0.375, 2.0, 0.5, 0.5, 0.30, 0.1),
+                             replicas = 8, steps = 35000, size = 120,
+                             sample_int = 500, observe_int = 100)
+or from the command line (replicas, then the same as runlat.py):
+    python ensemblelat.py 8 35000 120 500 0.02 0.375 2.0 0.5 0.5 0.30 0.1"""
+
+import numpy as np
+import arraylat
+import observables
+import trajectory
+from runlat import output_file_name
+
+
+class Ensemble_Lattice(arraylat.Array_Lattice):
+    """replicas Array_Lattices with the same arguments, size and
+    dimension, stored as planes of shape (replicas,) + (size,) *
+    dimension and advanced together (see the module docstring).
+    The over_sites contract is the same, with sample giving the
+    samples of all the replicas stacked; view(k) is replica k on its
+    own."""
+
+    def __init__(self, arguments, size = 3, dimension = 2, replicas = 2,
+                 move_mode = 'checkerboard', seed = None, replica = 0):
+        """Same as Array_Lattice, with replicas the number of replicas.
+        (replica is the rnglat replica of the ensemble's random stream.)
+        Syntax: Ensemble_Lattice(arguments, size, dimension, replicas,
+        move_mode, seed, replica)
+        Returns None."""
+        if type(replicas) != int or replicas < 1:
+            raise ValueError('replicas must be a positive integer, ' +
+                             'given %s' % (replicas,))
+        self.n_replicas = replicas
+        arraylat.Array_Lattice.__init__(self, arguments, size, dimension,
+                                        move_mode = move_mode, seed = seed,
+                                        replica = replica)
+        # Number of sites in each replica; replica k has the flat
+        # indices k * replica_sites to (k + 1) * replica_sites.
+        self.replica_sites = size**dimension
+
+    def lattice_shape(self):
+        """Returns the shape of the planes, (replicas,) + (size,) *
+        dimension."""
+        return (self.n_replicas,) + (self.size,) * self.dimension
+
+    def make_neighbour_table(self):
+        """Returns the neighbour table of one replica (see
+        arraylat.neighbour_table) repeated for each replica, with the
+        flat indices moved to that replica's sites."""
+        table = arraylat.neighbour_table(self.size, self.dimension)
+        offsets = np.arange(self.n_replicas) * table.shape[0]
+        return (table[np.newaxis] + offsets[:, np.newaxis, np.newaxis].astype(
+            table.dtype)).reshape(-1, table.shape[1])
+
+    def move_checkerboard(self):
+        """Array_Lattice.move_checkerboard, with the groups done in a
+        different random order for each replica: at each turn every
+        replica moves the group that is next in its own order, all of
+        them together (the replicas never touch, so that is the same as
+        doing them one after another).
+        Returns None"""
+        n_groups = self.max_move * 3
+        self.sweep_count += 1
+        orders = np.array([self.rng.permutation(n_groups)
+                           for k in xrange(self.n_replicas)])
+        for turn in xrange(n_groups):
+            direc, s_class = divmod(orders[:, turn], 3)
+            self.move_group(direc, s_class)
+
+    def group_sources(self, direc, s_class):
+        """Array_Lattice.group_sources, with direc and s_class arrays of
+        the group of each replica.
+        Returns the flat indices of the occupied sites in the group of
+        their replica."""
+        occupied = self.occupied()
+        self.pick_directions(occupied)
+        replica = occupied // self.replica_sites
+        direc   = direc[replica]
+        return occupied[
+            (self.site_direction[occupied] == direc) &
+            (self.sublattice_class[self.move_axis[direc], occupied] ==
+             s_class[replica])]
+
+    def replica_histograms(self):
+        """Returns the number of sites of each replica in each state
+        code, as an array of shape (replicas, arraylat.n_states).
+        Only the occupied sites are looked at."""
+        occupied = self.occupied()
+        codes = arraylat.encode_states(*[plane[occupied] for plane
+                                         in self.flat_planes])
+        n_states = arraylat.n_states
+        histograms = np.bincount(
+            (occupied // self.replica_sites) * n_states + codes,
+            minlength = self.n_replicas * n_states).reshape(
+                self.n_replicas, n_states)
+        histograms[:, arraylat.empty_state] += (self.replica_sites -
+                                                histograms.sum(axis = 1))
+        return histograms
+
+    def view(self, k):
+        """Returns the Replica_View of replica k."""
+        return Replica_View(self, k)
+
+
+class Replica_View:
+    """One replica of an Ensemble_Lattice, with what the trajectory
+    writers and observables need (over_sites('sample'), state_codes,
+    state_histogram and energy_table). It looks at the ensemble's
+    planes, so it is always up to date."""
+
+    def __init__(self, ensemble, k):
+        """Makes the view of replica k of ensemble.
+        Syntax: Replica_View(ensemble, k)
+        Returns None."""
+        if not 0 <= k < ensemble.n_replicas:
+            raise ValueError('k must be from 0 to %i, given %s' %
+                             (ensemble.n_replicas - 1, k))
+        self.ensemble     = ensemble
+        self.k            = k
+        self.energy_table = ensemble.energy_table
+
+    def over_sites(self, kw):
+        """Only 'sample' can be done for one replica (the others are done
+        for the whole ensemble).
+        Returns the occupation state of each site of this replica."""
+        if kw != 'sample':
+            raise IOError('only sample can be done on a Replica_View. ' +
+                          'Given: %s' % kw)
+        ensemble = self.ensemble
+        return arraylat.sample_planes(ensemble.catalyst[self.k],
+                                      ensemble.htmf[self.k],
+                                      ensemble.cinna[self.k],
+                                      ensemble.product[self.k])
+
+    def state_codes(self):
+        """Returns the state code of each site of this replica."""
+        ensemble = self.ensemble
+        return arraylat.encode_states(ensemble.catalyst[self.k],
+                                      ensemble.htmf[self.k],
+                                      ensemble.cinna[self.k],
+                                      ensemble.product[self.k])
+
+    def state_histogram(self):
+        """Returns the number of sites of this replica in each state
+        code."""
+        return np.bincount(self.state_codes().ravel(),
+                           minlength = arraylat.n_states)
+
+
+class Mean_Recorder(observables.Recorder):
+    """An observables.Recorder that writes the mean over the replicas of
+    an Ensemble_Lattice of each observable (in the same file format)."""
+
+    def record(self, step, lattice):
+        """Computes the observables of each replica of the ensemble
+        lattice and writes their means as the line for step.
+        Returns the list of means."""
+        functions = [observables.observables[name] for name in self.names]
+        values = [[function(histogram, lattice) for function in functions]
+                  for histogram in lattice.replica_histograms()]
+        means = [float(mean) for mean in np.mean(values, axis = 0)]
+        self.write(step, means)
+        return means
+
+
+def run_ensemble(arguments = (0.1, 0.1, 2.0, 0.5, 2.0, 0.5, 1.0),
+                 replicas = 2, steps = 2000, size = 10, sample_int = 20,
+                 dimension = 2, move_mode = 'checkerboard',
+                 output_format = 'text', file_name = None, verbose = True,
+                 seed = None, observe_int = None, observe_names = None):
+    """Runs replicas replicas of a reaction together (see
+    runlat.run_react for the other arguments).
+    The output of replica k goes to file_name + '_r%02i' % k, and if
+    observe_int is given its observables to that + '.obs', and their
+    means over the replicas to file_name + '_mean.obs'.
+    Syntax: run_ensemble(arguments, replicas, steps, size, sample_int,
+    dimension, move_mode, output_format, file_name, verbose, seed,
+    observe_int, observe_names)
+    Returns the list of output file names of the replicas."""
+    if output_format not in trajectory.writers:
+        raise ValueError('output_format must be one of %s, given %s' %
+                         (sorted(trajectory.writers.keys()), output_format))
+    if file_name is None:
+        file_name = output_file_name
+    lattice = Ensemble_Lattice(arguments, size, dimension, replicas,
+                               move_mode = move_mode, seed = seed)
+    views = [lattice.view(k) for k in xrange(replicas)]
+    file_names = ['%s_r%02i' % (file_name, k) for k in xrange(replicas)]
+    out_files = [trajectory.writers[output_format](
+                     name, arguments, steps, size, sample_int,
+                     dimension = dimension, backend = 'ensemble',
+                     seed = lattice.seed, replica = k)
+                 for k, name in enumerate(file_names)]
+    recorders = []
+    if observe_int:
+        recorders = [observables.Recorder(name + '.obs', observe_names)
+                     for name in file_names]
+        recorders.append(Mean_Recorder(file_name + '_mean.obs',
+                                       observe_names))
+    try:
+        for step in xrange(steps + 1):
+            lattice.over_sites('excite')
+            lattice.over_sites('react')
+            lattice.over_sites('move')
+            # sample every sample_int, as in run_react
+            if step % sample_int == 0:
+                for out_file, view in zip(out_files, views):
+                    out_file.write_frame(view)
+            if observe_int and (step % observe_int == 0 or step == steps):
+                for recorder, view in zip(recorders, views + [lattice]):
+                    recorder.record(step, view)
+            if verbose and step in xrange(0, steps, max(steps / 10, 1)):
+                print step
+    finally:
+        for out_file in out_files + recorders:
+            out_file.close()
+    if verbose:
+        print file_name
+    return file_names
+
+
+if __name__ == "__main__":
+    import sys
+    import os
+    prog_name = os.path.basename(sys.argv[0])
+    usage = "usage: %s replicas steps size sample_int " % prog_name + \
+      "molecprob reaction_energy reaction_favoritism " + \
+      "assoc_stabilization assoc_favoritism excit_prob beta"
+    if len(sys.argv) != 12:
+        print usage
+        sys.exit(1)
+    argums = sys.argv[1:]
+    run_ensemble([float(value) for value in argums[4:]], int(argums[0]),
+                 int(argums[1]), int(argums[2]), int(argums[3]))
@@ -0,0 +1,313 @@
+#! /usr/bin/env python
+"""Replica exchange (parallel tempering) over beta.
+
+Runs one lattice per beta, each in its own worker process (so a set of
+betas uses the same cores as running them side by side), and every
+exchange_int steps proposes to swap the configurations (planes and
+excitation states) of lattices at neighbouring betas. The even pairs
+(0-1, 2-3, ...) and the odd pairs (1-2, 3-4, ...) are proposed in turn.
+
+A swap of the configurations x_i and x_j of the lattices at beta_i and
+beta_j is accepted with probability min(1, exp(-delta)), where
+delta = u_i(x_j) + u_j(x_i) - u_i(x_i) - u_j(x_j)
+and u_k(x) is beta_k * E of configuration x at beta_k (from the
+lattice's energy_table, so the same e_of_state energies as the moves).
+Only the state histogram of each lattice is needed for this, so the
+configurations are only sent between processes when a swap is accepted.
+
+Each lattice keeps its own random stream (rnglat replica k for the
+lattice at betas[k]); the swaps are decided with replica len(betas) of
+the same seed, so a run can be repeated from its seed.
+The output of the lattice at betas[k] goes to file_name + '_beta' +
+str(betas[k]) (see trajectory), and the acceptance of each pair after
+every round of exchanges to file_name + '.rex'.
+
+Example, from python:
+    exchangelat.run_exchange((0.03, 0.01, 3.0, 0.7, 3.0, 0.3, 0.7),
+                             [0.7, 0.8, 0.9, 1.0], steps = 10000,
+                             size = 200, sample_int = 100)
+or from the command line (steps, size, sample_int, then the other six
+arguments, then the betas):
+    python exchangelat.py 10000 200 100 0.03 0.01 3 0.7 3 0.3
+        0.7,0.8,0.9,1.0"""
+
+import multiprocessing
+import numpy as np
+import arraylat
+import jitlat
+import kmclat
+import observables
+import rnglat
+import trajectory
+
+# Lattice engines that can be exchanged (they have get_configuration
+# and set_configuration). The object lattice keeps beta in every site,
+# and domain lattices can't start their own workers inside a worker.
+backends = {'array': arraylat.Array_Lattice,
+            'jit':   jitlat.JIT_Lattice,
+            'kmc':   kmclat.KMC_Lattice}
+
+
+def beta_arguments(arguments, beta):
+    """Returns the arguments tuple with beta (the last of the seven)
+    replaced."""
+    arguments = list(arguments)
+    arguments[6] = beta
+    return tuple(arguments)
+
+
+def exchange_delta(histogram_i, histogram_j, energy_i, energy_j):
+    """Returns delta (see the module docstring) for swapping the
+    configurations with state histograms histogram_i and histogram_j
+    between the lattices with energy tables energy_i and energy_j."""
+    return float(np.dot(histogram_j - histogram_i, energy_i - energy_j))
+
+
+def work_replica(job, connection):
+    """The loop run by the worker for one beta: makes the lattice and
+    its output file from the dict job, then does the commands sent by
+    the parent on connection, and answers each one.
+    Returns None"""
+    lattice = backends[job['backend']](job['arguments'], job['size'],
+                                       job['dimension'],
+                                       seed = job['seed'],
+                                       replica = job['replica'])
+    steps      = job['steps']
+    sample_int = job['sample_int']
+    with trajectory.writers[job['output_format']](
+            job['file_name'], job['arguments'], steps, job['size'],
+            sample_int, dimension = job['dimension'],
+            backend = job['backend'], seed = job['seed'],
+            replica = job['replica']) as out_file:
+        while True:
+            command, value = connection.recv()
+            if command == 'stop':
+                break
+            elif command == 'energy_table':
+                value = lattice.energy_table
+            elif command == 'steps':
+                # Run the steps first to last, sampling as run_react.
+                first, last = value
+                for step in xrange(first, last + 1):
+                    lattice.over_sites('excite')
+                    lattice.over_sites('react')
+                    lattice.over_sites('move')
+                    if step % sample_int == 0:
+                        out_file.write_frame(lattice)
+                value = None
+            elif command == 'histogram':
+                value = observables.state_histogram(lattice)
+            elif command == 'get_configuration':
+                value = lattice.get_configuration()
+            elif command == 'set_configuration':
+                lattice.set_configuration(value)
+                value = None
+            connection.send(value)
+    if hasattr(lattice, 'close'):
+        lattice.close()
+    connection.close()
+
+
+class Replica_Exchange:
+    """A set of lattices at different betas, each run by a worker
+    process, with configuration swaps between neighbouring betas (see
+    the module docstring). close() stops the workers."""
+
+    def __init__(self, arguments, betas, steps = 2000, size = 10,
+                 sample_int = 20, dimension = 2, backend = 'array',
+                 output_format = 'text', file_name = None, seed = None):
+        """Starts one worker per beta in betas (in increasing order),
+        with the other six of arguments and the given steps, size,
+        sample_int, dimension, backend and output_format (see
+        runlat.run_react).
+        Syntax: Replica_Exchange(arguments, betas, steps, size,
+        sample_int, dimension, backend, output_format, file_name, seed)
+        Returns None."""
+        if len(arguments) != 7:
+            raise ValueError('arguments must be len 7')
+        betas = [float(beta) for beta in betas]
+        if len(betas) < 2:
+            raise ValueError('at least two betas are needed')
+        if betas != sorted(betas) or len(set(betas)) != len(betas):
+            raise ValueError('betas must be increasing, given %s' % betas)
+        if backend not in backends:
+            raise ValueError('backend must be one of %s, given %s' %
+                             (sorted(backends.keys()), backend))
+        if file_name is None:
+            file_name = 'lat_react_out_rex'
+        if seed is None:
+            seed = rnglat.new_seed()
+        self.betas      = betas
+        self.steps      = steps
+        self.file_name  = file_name
+        self.seed       = seed
+        self.file_names = ['%s_beta%s' % (file_name, beta)
+                           for beta in betas]
+        self.rng = rnglat.Random_Stream(seed, len(betas))
+        # Proposed and accepted swaps of each pair (k, k + 1), and which
+        # pairs (even or odd) are proposed next.
+        self.attempts  = np.zeros(len(betas) - 1, dtype = np.int64)
+        self.accepted  = np.zeros(len(betas) - 1, dtype = np.int64)
+        self.next_pair = 0
+        self.workers = []
+        for k, beta in enumerate(betas):
+            job = {'arguments':     beta_arguments(arguments, beta),
+                   'steps':         steps,
+                   'size':          size,
+                   'sample_int':    sample_int,
+                   'dimension':     dimension,
+                   'backend':       backend,
+                   'output_format': output_format,
+                   'file_name':     self.file_names[k],
+                   'seed':          seed,
+                   'replica':       k}
+            parent_end, child_end = multiprocessing.Pipe()
+            process = multiprocessing.Process(target = work_replica,
+                                              args = (job, child_end))
+            process.daemon = True
+            process.start()
+            child_end.close()
+            self.workers.append((process, parent_end))
+        self.energy_tables = self.command('energy_table')
+
+    def command(self, command, values = None, workers = None):
+        """Sends command to the workers with the numbers workers (default
+        all of them), with values[k] for the k-th of them (or None), and
+        waits for all of them to finish it.
+        Returns the list of their answers."""
+        if workers is None:
+            workers = range(len(self.workers))
+        if values is None:
+            values = [None] * len(workers)
+        for k, value in zip(workers, values):
+            self.workers[k][1].send((command, value))
+        return [self.workers[k][1].recv() for k in workers]
+
+    def run_steps(self, first, last):
+        """Runs the steps first to last (inclusive) of every lattice at
+        once.
+        Returns None"""
+        self.command('steps', [(first, last)] * len(self.workers))
+
+    def exchange(self):
+        """Proposes swaps of the even or odd pairs of neighbouring betas
+        (in turn), and does the ones that are accepted.
+        Returns the list of pairs (k, k + 1) that were swapped."""
+        histograms = self.command('histogram')
+        swapped = []
+        for k in xrange(self.next_pair, len(self.betas) - 1, 2):
+            delta = exchange_delta(histograms[k], histograms[k + 1],
+                                   self.energy_tables[k],
+                                   self.energy_tables[k + 1])
+            self.attempts[k] += 1
+            # Same as uniform < exp(-delta), without overflowing.
+            if self.rng.uniform() < np.exp(-max(delta, 0.0)):
+                self.accepted[k] += 1
+                swapped.append((k, k + 1))
+        self.next_pair = 1 - self.next_pair
+        for k, l in swapped:
+            configurations = self.command('get_configuration',
+                                          workers = [k, l])
+            self.command('set_configuration', configurations[::-1],
+                         workers = [k, l])
+        return swapped
+
+    def acceptance(self):
+        """Returns the fraction of the proposed swaps that were accepted
+        for each pair (k, k + 1), nan if none were proposed yet."""
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            return self.accepted / self.attempts.astype(float)
+
+    def close(self):
+        """Stops the workers (which closes their output files).
+        Returns None"""
+        for process, connection in self.workers:
+            connection.send(('stop', None))
+        for process, connection in self.workers:
+            process.join()
+            connection.close()
+        self.workers = []
+
+
+def run_exchange(arguments, betas, steps = 2000, size = 10,
+                 sample_int = 20, dimension = 2, backend = 'array',
+                 exchange_int = 10, output_format = 'text',
+                 file_name = None, verbose = True, seed = None):
+    """Runs a replica exchange of the lattices with arguments at each of
+    betas for steps steps (like runlat.run_react), proposing swaps every
+    exchange_int steps, and writes the acceptance of each pair of
+    neighbouring betas to file_name + '.rex' after every exchange
+    (a header line '# step' then the pair names, separated by tabs).
+    Syntax: run_exchange(arguments, betas, steps, size, sample_int,
+    dimension, backend, exchange_int, output_format, file_name, verbose,
+    seed)
+    Returns the list of output file names, in the order of betas."""
+    if type(exchange_int) != int or exchange_int < 1:
+        raise ValueError('exchange_int must be a positive integer, ' +
+                         'given %s' % (exchange_int,))
+    rex = Replica_Exchange(arguments, betas, steps, size, sample_int,
+                           dimension, backend, output_format, file_name,
+                           seed)
+    try:
+        with open(rex.file_name + '.rex', 'w') as log_file:
+            pairs = ['%s-%s' % (rex.betas[k], rex.betas[k + 1])
+                     for k in xrange(len(rex.betas) - 1)]
+            log_file.write('# step\t' + '\t'.join(pairs) + '\n')
+            first = 0
+            # Print about every tenth of the steps, to keep track.
+            next_print = 0
+            while first <= steps:
+                last = min(first + exchange_int - 1, steps)
+                rex.run_steps(first, last)
+                if last < steps:
+                    rex.exchange()
+                    log_file.write('%i\t' % last + '\t'.join(
+                        repr(rate) for rate in rex.acceptance()) + '\n')
+                if verbose and last >= next_print:
+                    print last
+                    next_print = last + max(steps / 10, 1)
+                first = last + 1
+    finally:
+        rex.close()
+    if verbose:
+        for pair, rate in zip(pairs, rex.acceptance()):
+            print 'beta %s: %.3f of the swaps accepted' % (pair, rate)
+    return rex.file_names
+
+
+def read_log(file_name):
+    """Reads an acceptance log written by run_exchange.
+    Returns a numpy record array with a field step and one for each
+    pair."""
+    with open(file_name) as in_file:
+        names = in_file.readline().lstrip('#').split()
+    return np.genfromtxt(file_name, names = names, comments = '#',
+                         delimiter = '\t', deletechars = '')
+
+
+if __name__ == "__main__":
+    import sys
+    import os
+    prog_name = os.path.basename(sys.argv[0])
+    usage = "usage: %s steps size sample_int molecprob " % prog_name + \
+      "reaction_energy reaction_favoritism assoc_stabilization " + \
+      "assoc_favoritism excit_prob beta1,beta2,... " + \
+      "[--exchange_int N] [--backend name]"
+    exchange_int = 10
+    backend = 'array'
+    if '--exchange_int' in sys.argv:
+        where = sys.argv.index('--exchange_int')
+        exchange_int = int(sys.argv[where + 1])
+        del sys.argv[where:where + 2]
+    if '--backend' in sys.argv:
+        where = sys.argv.index('--backend')
+        backend = sys.argv[where + 1]
+        del sys.argv[where:where + 2]
+    if len(sys.argv) != 11:
+        print usage
+        sys.exit(1)
+    argums = sys.argv[1:]
+    betas = [float(beta) for beta in argums[9].split(',')]
+    run_exchange([float(value) for value in argums[3:9]] + [betas[0]],
+                 betas, int(argums[0]), int(argums[1]), int(argums[2]),
+                 backend = backend, exchange_int = exchange_int)
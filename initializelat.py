@@ -1,4 +1,11 @@
 import mclatticecellobject as site
+from arraylat import encode_states, lattice_moves, neighbour_table
+import profilelat
+import rnglat
+import random
+import copy
+import gc
+from timeit import default_timer as timer
 import numpy as np
 
 class Lattice:
@@ -9,12 +16,21 @@ class Lattice:
     it can take returned arguments after applying a keyword, apply them to
     a specified other cell, then give input back to the original mover."""
 
-    def __init__(self, arguments, size = 3, dimension = 2):
+    # The class of each lattice site (a subclass can use other rules,
+    # like latticecellobject.Lattice_Cell_Object).
+    cell_class = site.Lattice_Cell_Object
+
+    def __init__(self, arguments, size = 3, dimension = 2, seed = None,
+                 replica = 0):
         """This will create a lattice with edge length
-        size, (and dimension dimension?).
+        size and dimension dimension.
         First argument in inputs to each lattice site.
+        seed and replica seed the random numbers (see rnglat). The sites
+        all draw from self.rng, a random.Random of this lattice seeded
+        from them, so lattices in the same process don't share a stream.
+        If seed is None a new one is picked; it is kept as self.seed.
         Other arguments are optional.
-        syntax: Lattice(arguments, size, dimension)
+        syntax: Lattice(arguments, size, dimension, seed, replica)
         Returns None."""
         # input checks:
         if type(size) != int:
@@ -32,42 +48,82 @@ class Lattice:
             raise ValueError('arguments must be len 7')
         self.dimension = dimension
         self.size      = size
+        stream = rnglat.Random_Stream(seed, replica)
+        self.seed      = stream.seed
+        self.replica   = replica
+        self.rng       = random.Random(stream.integers(2**52))
+        # Phase times and move and reaction counters (see profilelat),
+        # None unless enable_profile is called.
+        self.profile = None
         #
         # declares self.object lattice as an empty numpy array
         # with object-type sites
         #
-        if dimension == 2:
-            self.ob_lattice = np.empty((size, size), dtype = object)
-            for i in xrange(size):
-                for j in xrange(size):
-                    self.ob_lattice[i, j] = self.mapable_site(arguments)
-            # moves is the list for picking move directions.
-            # It will be referenced when a site tries to make a move,
-            # and the iterator needs to interpret where it is trying
-            # to make a move to.
-            # It is the list of changes to the currently referenced site
-            # to which it wants to move.
-            # AKA, if it wants to move up, the indices will be changed by
-            # (delta row = -1, delta column = 0).
-            # The ordering here is arbitrary as it is just picked
-            # randomly anyway and probabilities are checked afterwards.
-            # To get the first part of the first item, reference as
-            # self.moves[0][0]
-            self.moves = ((-1, 0), (0, -1), (1, 0), (0, 1))
-            # This sample_templ is a template for output.
-            # It is an array of strings with length defined by the number
-            # in the 'a10' at the end.
-            # The length should be no greater than 10
-            # because the very longest possible state returned should
-            # be '1,-1,-1,-1' (though hopefully that won't ever happen).
-            # If for any reason the length needs to be greater than that,
-            # this length needs to be changed, or the output will be
-            # truncated to 10 characters.
-            self.sample_templ = np.empty((size, size), dtype = 'a10')
-        else:
-            raise ValueError('Lattice has not be taught to handle ' + \
-                             'dimension != 2, given %i' % dimension)
-        
+        shape = (size,) * dimension
+        self.ob_lattice = self.make_sites(arguments, shape, stream)
+        # moves is the list for picking move directions.
+        # It will be referenced when a site tries to make a move,
+        # and the iterator needs to interpret where it is trying
+        # to make a move to.
+        # It is the list of changes to the currently referenced site
+        # to which it wants to move.
+        # AKA, if it wants to move up, the indices will be changed by
+        # (delta row = -1, delta column = 0).
+        # The ordering here is arbitrary as it is just picked
+        # randomly anyway and probabilities are checked afterwards.
+        # To get the first part of the first item, reference as
+        # self.moves[0][0]
+        # (For dimension 2 it is ((-1, 0), (0, -1), (1, 0), (0, 1)).)
+        self.moves = lattice_moves(dimension)
+        # neighbour_table[k, direc] is the flat index of the site
+        # reached from flat index k by moves[direc], wrapping around
+        # each edge onto the same row (column, ...).
+        self.neighbour_table = neighbour_table(size, dimension)
+        # This sample_templ is a template for output.
+        # It is an array of strings with length defined by the number
+        # in the 'a10' at the end.
+        # The length should be no greater than 10
+        # because the very longest possible state returned should
+        # be '1,-1,-1,-1' (though hopefully that won't ever happen).
+        # If for any reason the length needs to be greater than that,
+        # this length needs to be changed, or the output will be
+        # truncated to 10 characters.
+        self.sample_templ = np.empty(shape, dtype = 'a10')
+
+    def make_sites(self, arguments, shape, stream):
+        """Returns the object array of shape of the lattice sites.
+        The arguments are checked once (site.cell_parameters) and the
+        one parameters tuple is shared by all the sites, and the
+        occupancy of the whole lattice is drawn at once from stream
+        (with the same probabilities as a site would use).
+        The parameters are kept as self.parameters.
+        Syntax make_sites(arguments, shape, stream)
+        Returns a numpy array of cell_class objects."""
+        self.parameters = site.cell_parameters(
+            *([float(arg) for arg in arguments] + [self.dimension]))
+        molecprob = self.parameters.molecprob
+        catalyst = (stream.uniform(shape) < molecprob).astype(int)
+        htmf  = ((stream.uniform(shape) < molecprob) *
+                 stream.signs(shape)).astype(int)
+        cinna = ((stream.uniform(shape) < molecprob) *
+                 stream.signs(shape)).astype(int)
+        # (Plain ints, like the sites make themselves.)
+        occupancies = zip(catalyst.ravel().tolist(), htmf.ravel().tolist(),
+                          cinna.ravel().tolist())
+        # Making this many objects would set off the cyclic garbage
+        # collector over and over (and none of them can be garbage yet).
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            cells = [self.cell_class(parameters = self.parameters,
+                                     occupancy = occupancy, rng = self.rng)
+                     for occupancy in occupancies]
+        finally:
+            if gc_enabled:
+                gc.enable()
+        sites = np.empty(len(cells), dtype = object)
+        sites[:] = cells
+        return sites.reshape(shape)
 
     def mapable_site(self, arguments):
         """This function returns a cell object initialized with
@@ -77,10 +133,13 @@ class Lattice:
         I couldn't figure out how to make an array of arguments
         and have this apply to each site. (Possibly need to define
         custom dtype for each site of the argument lattice.)
+        (make_sites now does that for the whole lattice; this is still
+        used for cell classes that check their own arguments, like
+        latticecellobject.)
         Syntax mapable_site(arguments)
         Returns initialized Lattice Cell Object."""
         # get arguments from arguments tuple to pass to
-        # site.Lattice_Cell_Object to initialize each lattice site
+        # cell_class to initialize each lattice site
         molecprob           = float(arguments[0])
         reaction_energy     = float(arguments[1])
         reaction_favoritism = float(arguments[2])
@@ -88,10 +147,10 @@ class Lattice:
         assoc_favoritism    = float(arguments[4])
         excit_prob          = float(arguments[5])
         beta                = float(arguments[6])
-        return site.Lattice_Cell_Object(molecprob, reaction_energy,
-                                 reaction_favoritism, assoc_stabilization,
-                                 assoc_favoritism, excit_prob,
-                                 beta, self.dimension)
+        return self.cell_class(molecprob, reaction_energy,
+                               reaction_favoritism, assoc_stabilization,
+                               assoc_favoritism, excit_prob,
+                               beta, self.dimension)
 
     def over_sites(self, kw):
         """This function will take a keyword and apply that keyword
@@ -117,20 +176,22 @@ class Lattice:
         #
         if type(kw) != str:
             raise TypeError('keyword must be a string')
+        if self.profile is not None:
+            start = timer()
+        sample_out = None
         # Simple for excite and react:
         # just apply the keyword to each lattice site.
         # We expect no output or anything. Each site just acts internally.
         #
         # Look into nditer for better iteration over arrays?
         #
+        # The sites are gone through in flat (row major) order.
         if   kw == 'excite':
-            for i in xrange(self.size):
-                for j in xrange(self.size):
-                    self.ob_lattice[i, j].excite()
+            for a_site in self.ob_lattice.flat:
+                a_site.excite()
         elif kw == 'react':
-            for i in xrange(self.size):
-                for j in xrange(self.size):
-                    self.ob_lattice[i, j].react()
+            for a_site in self.ob_lattice.flat:
+                a_site.react()
         #
         # move is more difficult. If the site has something there,
         # it will attempt to move by returning its current state
@@ -140,52 +201,103 @@ class Lattice:
         # original cell that attempted the move.
         #
         elif kw == 'move':
-            for i in xrange(self.size):
-                for j in xrange(self.size):
-                    move_out = self.ob_lattice[i, j].move()
-                    # If nothing to move, will return move_out = None, 
-                    # which will evaluate to False.
-                    # Otherwise, this will evaluate to True.
-                    if move_out:
-                        move_direc = self.moves[move_out[0]]
-                        # Now, takes what is trying to be moved and
-                        # gives it to the accept_move function of the
-                        # site determined by move_direc(tion).
-                        # The accept_move function will return whatever
-                        # it does not accept, which needs to be then
-                        # passed back to the move_result function
-                        # of the original lattice site.
-                        #
-                        # Had some trouble indexing past edges when it wanted
-                        # to move past the ends, so np.take wraps around edges
-                        # but it also indexes like a flattened array.
-                        # That's why the math is needed for the index.
-                        # Not certain this is right, but as long as it is 
-                        # unique it should work fine to converge to
-                        # uniform sampling.
-                        #
-                        move_to = self.ob_lattice.take(\
-                            self.size * (i + move_direc[0]) +\
-                            (j + move_direc[1]), mode = 'wrap')
-                        amove_out = move_to.accept_move(
-                                            move_out[1], move_out[2],
-                                            move_out[3], move_out[4],
-                                            move_out[5], move_out[6])
-                        self.ob_lattice[i, j].move_result(
-                            amove_out[0], amove_out[1],
-                            amove_out[2], amove_out[3],
-                            amove_out[4], amove_out[5])
+            for k in xrange(self.ob_lattice.size):
+                a_site = self.ob_lattice.flat[k]
+                move_out = a_site.move()
+                # If nothing to move, will return move_out = None,
+                # which will evaluate to False.
+                # Otherwise, this will evaluate to True.
+                if move_out:
+                    # Now, takes what is trying to be moved and
+                    # gives it to the accept_move function of the
+                    # site in the direction move_out[0].
+                    # The accept_move function will return whatever
+                    # it does not accept, which needs to be then
+                    # passed back to the move_result function
+                    # of the original lattice site.
+                    #
+                    # The neighbour is looked up in neighbour_table,
+                    # which wraps around each edge of the lattice.
+                    # (This used to be ob_lattice.take of the
+                    # flattened index with mode = 'wrap', which went
+                    # off the end of a row onto the next row.)
+                    #
+                    move_to = self.ob_lattice.flat[
+                        self.neighbour_table[k, move_out[0]]]
+                    amove_out = move_to.accept_move(
+                                        move_out[1], move_out[2],
+                                        move_out[3], move_out[4],
+                                        move_out[5], move_out[6])
+                    a_site.move_result(
+                        amove_out[0], amove_out[1],
+                        amove_out[2], amove_out[3],
+                        amove_out[4], amove_out[5])
         elif kw == 'sample':
             sample_out = self.sample_templ
-            for i in xrange(self.size):
-                for j in xrange(self.size):
-                    # This will call __repr__ of each site which will
-                    # output a string of the current occupancy.
-                    # This will then be added to the correct spot in
-                    # the output file.
-                    sample_out[i, j] = str(self.ob_lattice[i, j])
-            return sample_out
+            for k in xrange(self.ob_lattice.size):
+                # This will call __repr__ of each site which will
+                # output a string of the current occupancy.
+                # This will then be added to the correct spot in
+                # the output file.
+                sample_out.flat[k] = str(self.ob_lattice.flat[k])
         else:
             raise IOError('keyword not recognized. Given: %s' % kw)
+        if self.profile is not None:
+            self.profile.add_time(kw, timer() - start)
+        return sample_out
+
+    def enable_profile(self):
+        """Starts collecting phase times and move and reaction counts
+        (see profilelat). The sites count their own proposals and
+        reactions into the same Profile.
+        Syntax enable_profile()
+        Returns the Profile (also self.profile)."""
+        self.profile = profilelat.Profile()
+        for a_site in self.ob_lattice.flat:
+            a_site.profile = self.profile
+        return self.profile
 
+    def get_profile(self):
+        """Returns the Profile with everything collected so far, or
+        None if profiling is not enabled.
+        Syntax get_profile()"""
+        return self.profile
+
+    def get_state(self):
+        """Returns everything needed to continue this lattice exactly
+        where it is (the sites and the state of self.rng), for
+        checkpoints. set_state puts it back.
+        Syntax get_state()
+        Returns a dict."""
+        # (Copied together so the sites still share the profile. The
+        # sites keep pointing at self.rng, whose state is saved on its
+        # own.)
+        state = copy.deepcopy({'ob_lattice': self.ob_lattice,
+                               'profile':    self.profile},
+                              {id(self.rng): self.rng})
+        state['random'] = self.rng.getstate()
+        return state
+
+    def set_state(self, state):
+        """Sets this lattice to a state from get_state.
+        Syntax set_state(state)
+        Returns None."""
+        self.ob_lattice = state['ob_lattice']
+        self.profile    = state.get('profile')
+        for a_site in self.ob_lattice.flat:
+            a_site.rng = self.rng
+        self.rng.setstate(state['random'])
 
+    def state_codes(self):
+        """Returns the state code of each site (see
+        arraylat.encode_states) as a uint8 array the shape of the
+        lattice. This is what is written for each frame of a binary
+        trajectory.
+        Syntax state_codes()
+        Returns a numpy array of uint8."""
+        codes = np.empty(self.ob_lattice.shape, dtype = np.uint8)
+        for k in xrange(self.ob_lattice.size):
+            a_site = self.ob_lattice.flat[k]
+            codes.flat[k] = encode_states(a_site.catalyst, a_site.htmf,
+                                          a_site.cinna, a_site.product)
+        return codes
@@ -0,0 +1,287 @@
+"""Compiled sweep kernels for Array_Lattice.
+
+The per-molecule Metropolis loop of accept_move (a random order of the
+molecules, and each accepted swap changes the state the next one is
+tried against) does not vectorize cleanly. Here the whole excite, react
+and move sweeps are written as plain loops over the flat planes and
+compiled with numba, so they run at compiled speed one site at a time.
+
+numba is optional. JIT_Lattice uses the compiled kernels when numba can
+be imported (have_numba), and otherwise falls back to the NumPy sweeps
+of Array_Lattice, so it can always be used (runlat backend 'jit').
+
+The kernels do the same sweeps as Array_Lattice with move_mode 'serial'
+(and so as Lattice): the move sweep walks the sites in order, and a site
+further along that something was just moved into gets its turn too.
+They draw their random numbers from their own xoroshiro128+ generator
+(seeded from the lattice's rnglat stream and saved by get_state), so the
+results are statistically, not bit for bit, the same as the NumPy
+sweeps."""
+
+import numpy as np
+import arraylat
+
+try:
+    import numba
+    have_numba = True
+except ImportError:
+    numba = None
+    have_numba = False
+
+
+def jit(function):
+    """Compiles function with numba if it is available (otherwise
+    returns it unchanged)."""
+    if have_numba:
+        return numba.njit(nogil = True, cache = True)(function)
+    return function
+
+
+@jit
+def next_uniform(rng_state):
+    """Returns the next uniform random number in [0, 1) of the
+    xoroshiro128+ generator with state rng_state (two uint64s), and
+    advances the state."""
+    s0 = rng_state[0]
+    s1 = rng_state[1]
+    result = s0 + s1
+    s1 ^= s0
+    rng_state[0] = (((s0 << np.uint64(24)) | (s0 >> np.uint64(40))) ^ s1 ^
+                    (s1 << np.uint64(16)))
+    rng_state[1] = (s1 << np.uint64(37)) | (s1 >> np.uint64(27))
+    # The top 53 bits as a double.
+    return (result >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+
+
+@jit
+def set_occupied(site, occupied, occupied_sites, site_slot, n_occupied):
+    """Adds site to (or removes it from) the index of occupied sites
+    (see Array_Lattice.index_occupied), if it is not already so.
+    Returns the new n_occupied."""
+    if occupied and site_slot[site] < 0:
+        occupied_sites[n_occupied] = site
+        site_slot[site] = n_occupied
+        return n_occupied + 1
+    if not occupied and site_slot[site] >= 0:
+        # Fill its slot with the last one.
+        slot = site_slot[site]
+        last = occupied_sites[n_occupied - 1]
+        occupied_sites[slot] = last
+        site_slot[last] = slot
+        site_slot[site] = -1
+        return n_occupied - 1
+    return n_occupied
+
+
+@jit
+def excite_kernel(catalyst, htmf, excitation, occupied_sites, n_occupied,
+                  excit_prob, rng_state):
+    """Excites each occupied catalyst and htmf with probability
+    excit_prob (Array_Lattice.excite).
+    Returns None"""
+    for k in range(n_occupied):
+        site = occupied_sites[k]
+        if next_uniform(rng_state) < excit_prob and catalyst[site] != 0:
+            excitation[0, site] = 1.0
+        if next_uniform(rng_state) < excit_prob and htmf[site] != 0:
+            excitation[1, site] = 1.0
+
+
+@jit
+def react_kernel(catalyst, htmf, cinna, product, excitation, occupied_sites,
+                 n_occupied, p_react_pos, p_react_neg, rng_state,
+                 reaction_counts):
+    """Reacts the fully occupied sites and halves the excitation states
+    of the sites that had no product (Array_Lattice.react).
+    reaction_counts[0] and [1] count the attempts and reactions of
+    positive and negative product (see profilelat).
+    Returns None"""
+    for k in range(n_occupied):
+        site = occupied_sites[k]
+        occupancy_product = catalyst[site] * htmf[site] * cinna[site]
+        if occupancy_product == 1:
+            p_react = p_react_pos
+        elif occupancy_product == -1:
+            p_react = p_react_neg
+        else:
+            p_react = 0.0
+        p_react *= max(excitation[0, site], excitation[1, site])
+        had_product = product[site] != 0
+        attempted = occupancy_product != 0 and not had_product
+        if attempted:
+            reaction_counts[0, (1 - occupancy_product) // 2] += 1
+        if next_uniform(rng_state) < p_react and product[site] == 0:
+            reaction_counts[1, (1 - occupancy_product) // 2] += 1
+            product[site] = occupancy_product
+            htmf[site]  = 0
+            cinna[site] = 0
+            excitation[0, site] = 0.0
+            excitation[1, site] = 0.0
+        if not had_product:
+            excitation[0, site] *= 0.5
+            excitation[1, site] *= 0.5
+
+
+@jit
+def move_kernel(catalyst, htmf, cinna, product, excitation, occupied_sites,
+                site_slot, n_occupied, turn, state_table, accept_table,
+                move_to_table, move_from_table, neighbour_table, rng_state,
+                move_counts):
+    """Lets each occupied site try to move to a random neighbour, in
+    order of site, with the Metropolis test of accept_move for each of
+    its molecules in a random order (Array_Lattice.move_serial).
+    turn is a uint8 work array the size of the lattice.
+    move_counts[0] and [1] count the proposals and acceptances of each
+    molecule (see profilelat).
+    Returns the new n_occupied."""
+    n_sites = site_slot.size
+    max_move = neighbour_table.shape[1]
+    # The sites that get a turn: the ones occupied now, and the ones
+    # further along that something moves into.
+    turn[:] = 0
+    for k in range(n_occupied):
+        turn[occupied_sites[k]] = 1
+    order = np.empty(4, dtype = np.intp)
+    for site in range(n_sites):
+        # Might have been emptied by an earlier move.
+        if turn[site] == 0 or site_slot[site] < 0:
+            continue
+        direc = int(next_uniform(rng_state) * max_move)
+        target = neighbour_table[site, direc]
+        to = (27 * catalyst[target] + 9 * (htmf[target] + 1) +
+              3 * (cinna[target] + 1) + (product[target] + 1))
+        fr = (27 * catalyst[site] + 9 * (htmf[site] + 1) +
+              3 * (cinna[site] + 1) + (product[site] + 1))
+        # Random order of the molecules (Fisher-Yates shuffle).
+        for mol in range(4):
+            order[mol] = mol
+        for i in range(3, 0, -1):
+            j = int(next_uniform(rng_state) * (i + 1))
+            order[i], order[j] = order[j], order[i]
+        for i in range(4):
+            mol = order[i]
+            flip = int(next_uniform(rng_state) * 4)
+            accepted = (next_uniform(rng_state) <
+                        accept_table[to, fr, mol, flip])
+            if state_table[to, mol] != 0 or state_table[fr, mol] != 0:
+                move_counts[0, mol] += 1
+                if accepted:
+                    move_counts[1, mol] += 1
+            if accepted:
+                to, fr = (move_to_table[to, fr, mol, flip],
+                          move_from_table[to, fr, mol, flip])
+                # Excitation goes with the excitable molecules.
+                if mol < 2:
+                    excit = excitation[mol, target]
+                    excitation[mol, target] = excitation[mol, site]
+                    excitation[mol, site]   = excit
+        catalyst[target] = state_table[to, 0]
+        htmf[target]     = state_table[to, 1]
+        cinna[target]    = state_table[to, 2]
+        product[target]  = state_table[to, 3]
+        catalyst[site]   = state_table[fr, 0]
+        htmf[site]       = state_table[fr, 1]
+        cinna[site]      = state_table[fr, 2]
+        product[site]    = state_table[fr, 3]
+        n_occupied = set_occupied(target, to != 13, occupied_sites,
+                                  site_slot, n_occupied)
+        n_occupied = set_occupied(site, fr != 13, occupied_sites,
+                                  site_slot, n_occupied)
+        if target > site and to != 13:
+            turn[target] = 1
+    return n_occupied
+
+
+class JIT_Lattice(arraylat.Array_Lattice):
+    """An Array_Lattice whose excite, react and move sweeps are the
+    compiled kernels of this module when numba is available, or the
+    NumPy sweeps of Array_Lattice (with its move_mode) when it is not."""
+
+    def __init__(self, arguments, size = 3, dimension = 2,
+                 move_mode = 'checkerboard', seed = None, replica = 0):
+        """Same as Array_Lattice. move_mode is only used if numba is not
+        available; the compiled move sweep is always the serial one.
+        Syntax: JIT_Lattice(arguments, size, dimension, move_mode, seed,
+        replica)
+        Returns None."""
+        arraylat.Array_Lattice.__init__(self, arguments, size, dimension,
+                                        move_mode = move_mode, seed = seed,
+                                        replica = replica)
+        self.compiled = have_numba
+        # State of the kernels' random number generator, from 128 bits
+        # of the lattice's stream (so it is set by seed and replica too).
+        words = (self.rng.uniform(4) * 2**32).astype(np.uint64)
+        self.kernel_rng = ((words[0::2] << np.uint64(32)) | words[1::2])
+        if not self.kernel_rng.any():
+            self.kernel_rng[0] = 1
+        self.turn = np.zeros(self.catalyst.size, dtype = np.uint8)
+        # The kernels always count moves and reactions (it costs next to
+        # nothing compiled); get_profile adds them to the profile.
+        self.move_counts     = np.zeros((2, 4), dtype = np.int64)
+        self.reaction_counts = np.zeros((2, 2), dtype = np.int64)
+
+    def excite(self):
+        """Array_Lattice.excite, compiled if possible.
+        Returns None"""
+        if not self.compiled:
+            return arraylat.Array_Lattice.excite(self)
+        excite_kernel(self.flat_planes[0], self.flat_planes[1],
+                      self.flat_excitation, self.occupied_sites,
+                      self.n_occupied, self.excit_prob, self.kernel_rng)
+
+    def react(self):
+        """Array_Lattice.react, compiled if possible.
+        Returns None"""
+        if not self.compiled:
+            return arraylat.Array_Lattice.react(self)
+        react_kernel(self.flat_planes[0], self.flat_planes[1],
+                     self.flat_planes[2], self.flat_planes[3],
+                     self.flat_excitation, self.occupied_sites,
+                     self.n_occupied, self.p_react_pos, self.p_react_neg,
+                     self.kernel_rng, self.reaction_counts)
+
+    def move(self):
+        """Array_Lattice.move_serial, compiled if possible (otherwise
+        Array_Lattice.move).
+        Returns None"""
+        if not self.compiled:
+            return arraylat.Array_Lattice.move(self)
+        self.n_occupied = move_kernel(
+            self.flat_planes[0], self.flat_planes[1], self.flat_planes[2],
+            self.flat_planes[3], self.flat_excitation, self.occupied_sites,
+            self.site_slot, self.n_occupied, self.turn, arraylat.state_table,
+            self.accept_table, self.move_to_table, self.move_from_table,
+            self.neighbour_table, self.kernel_rng, self.move_counts)
+
+    def enable_profile(self):
+        """Array_Lattice.enable_profile (the kernels' counts start from
+        now).
+        Returns the Profile."""
+        self.move_counts[...]     = 0
+        self.reaction_counts[...] = 0
+        return arraylat.Array_Lattice.enable_profile(self)
+
+    def get_profile(self):
+        """Array_Lattice.get_profile, with the kernels' counts added.
+        Returns the Profile, or None."""
+        if self.profile is not None:
+            self.profile.proposed          += self.move_counts[0]
+            self.profile.accepted          += self.move_counts[1]
+            self.profile.reaction_attempts += self.reaction_counts[0]
+            self.profile.reactions         += self.reaction_counts[1]
+            self.move_counts[...]     = 0
+            self.reaction_counts[...] = 0
+        return self.profile
+
+    def get_state(self):
+        """Array_Lattice.get_state plus the kernels' random numbers.
+        Returns a dict."""
+        state = arraylat.Array_Lattice.get_state(self)
+        state['kernel_rng'] = self.kernel_rng.copy()
+        return state
+
+    def set_state(self, state):
+        """Array_Lattice.set_state plus the kernels' random numbers.
+        Returns None"""
+        arraylat.Array_Lattice.set_state(self, state)
+        self.kernel_rng[...] = state['kernel_rng']
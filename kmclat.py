@@ -0,0 +1,638 @@
+"""Rejection-free (n-fold way / BKL) kinetic Monte Carlo engine.
+
+In the dilute regime with low excit_prob and high reaction energies
+almost every excite and react call, and many move attempts, change
+nothing. KMC_Lattice instead keeps the rate of every event that would
+change the lattice, picks one with probability proportional to its rate
+and jumps the clock straight to it.
+
+The energies and Metropolis acceptances are the tables of Array_Lattice
+(make_tables). The sweep dynamics are mapped to rates per sweep, so
+that time is measured in equivalent sweeps:
+moves:      in a sweep each occupied site makes one move attempt, in a
+            random direction: it tries to swap each of its 4 molecules
+            with the neighbour in a random order, each with random
+            flips and its own Metropolis test (accept_moves). Here the
+            attempt of a site in one direction is one event, with rate
+            P_change / max_move, where P_change is the chance that the
+            whole attempt changes anything (the codes, or the
+            excitations of the catalysts or htmf). When it happens, the
+            first molecule that changes something (and its flips) is
+            drawn from the chances of the orders and flips that lead to
+            it, and the molecules after it in the order are then tried
+            as in the sweep. So a move event gives the same result as an
+            attempt of accept_moves that changed something.
+excitation: an unexcited catalyst or htmf is excited at rate
+            -log(1 - excit_prob), so the chance in one sweep is
+            excit_prob.
+            In the sweeps the excitation is halved every sweep (except
+            on sites with product), giving 1 + 1/2 + 1/4 + ... = 2
+            sweeps of full excitation in all. Here an excitation is
+            either on (1.0) or off, and goes off at rate 1/2 (except on
+            sites with product), so it lasts the same 2 sweeps on
+            average.
+reaction:   a full complex with the catalyst or htmf excited reacts at
+            rate -log(1 - p_react_pos/neg), so the chance in one sweep
+            at full excitation is the same as in the sweeps.
+The moves are the same as in the sweep engines, but happen continuously
+in time instead of once per site per sweep, and the excitation is on or
+off instead of halving; the yield per excitation agrees with the sweep
+engines when p_react is small.
+
+The rates of all the sites are kept in a Fenwick tree, so an event
+costs O(log n_sites) to pick and only the rates of the sites it changed
+and their neighbours are worked out again. The events are done by the
+kernels of this module, compiled with numba like jitlat when it is
+available (the same code runs on lists when it is not). They take their
+random numbers from the lattice's rnglat stream, so the results are the
+same either way. During advance the codes and excitations are kept in
+their own arrays, and the planes and the occupied index of
+Array_Lattice are brought up to date from them at the end."""
+
+from math import factorial
+from math import log
+import numpy as np
+import arraylat
+from jitlat import jit, have_numba
+
+# Events of a site after its moves (which are numbered by direction).
+excite_catalyst = 0
+excite_htmf     = 1
+decay_catalyst  = 2
+decay_htmf      = 3
+react           = 4
+n_other_events  = 5
+# Outcomes of a move event: the molecule that changes first, the set of
+# the other molecules that were tried before it (as a 3 bit mask of the
+# other molecules in order) and its flips, numbered
+# (mol * 8 + before) * 4 + flip.
+n_outcomes = 128
+# Copies of the arraylat constants for the kernels.
+n_states    = 54
+empty_state = 13
+# The most random numbers an event can take (the wait, the site and
+# event, the outcome, the order of the molecules after it and 2 for each
+# of them), with room for drawing the site again a few times.
+event_uniforms = 16
+# Random numbers taken from the stream for each call of advance_kernel.
+block_uniforms = 4096
+
+
+@jit
+def tree_add(tree, site, delta):
+    """Adds delta to the rate of site in the Fenwick tree tree (tree[0]
+    is the total of all the rates).
+    Returns None"""
+    n_sites = len(tree) - 1
+    tree[0] += delta
+    i = site + 1
+    while i <= n_sites:
+        tree[i] += delta
+        i += i & -i
+
+
+@jit
+def tree_build(tree, site_rate):
+    """Makes the Fenwick tree tree of the rates site_rate.
+    Returns None"""
+    n_sites = len(site_rate)
+    total = 0.0
+    for site in range(n_sites):
+        tree[site + 1] = site_rate[site]
+        total += site_rate[site]
+    tree[0] = total
+    for i in range(1, n_sites + 1):
+        j = i + (i & -i)
+        if j <= n_sites:
+            tree[j] += tree[i]
+
+
+@jit
+def tree_find(tree, value):
+    """Returns the site whose part of the cumulative rate in the Fenwick
+    tree tree has value in it, and how far into its rate value is."""
+    n_sites = len(tree) - 1
+    i = 0
+    step = 1
+    while step * 2 <= n_sites:
+        step *= 2
+    while step > 0:
+        j = i + step
+        if j <= n_sites and tree[j] <= value:
+            i = j
+            value -= tree[j]
+        step //= 2
+    if i > n_sites - 1:
+        i = n_sites - 1
+    return i, value
+
+
+@jit
+def site_events(site, codes, excited, neighbours, event_rate, move_rate,
+                states, other_rates):
+    """Works out the rates of the events of site (its moves in each
+    direction, then the others) into its part of event_rate (all 0 if it
+    is empty).
+    Returns their total."""
+    max_move = len(neighbours) // len(codes)
+    n_events = max_move + n_other_events
+    first = site * n_events
+    code = codes[site]
+    if code == empty_state:
+        for event in range(n_events):
+            event_rate[first + event] = 0.0
+        return 0.0
+    c_excited = excited[2 * site]
+    h_excited = excited[2 * site + 1]
+    total = 0.0
+    for direc in range(max_move):
+        other = neighbours[site * max_move + direc]
+        xdiff = (int(c_excited != excited[2 * other]) +
+                 2 * int(h_excited != excited[2 * other + 1]))
+        rate = move_rate[(xdiff * n_states + codes[other]) * n_states +
+                         code]
+        event_rate[first + direc] = rate
+        total += rate
+    catalyst = states[4 * code]
+    htmf     = states[4 * code + 1]
+    cinna    = states[4 * code + 2]
+    product  = states[4 * code + 3]
+    first += max_move
+    for event in range(n_other_events):
+        event_rate[first + event] = 0.0
+    if catalyst != 0 and c_excited == 0:
+        event_rate[first + excite_catalyst] = other_rates[0]
+    if htmf != 0 and h_excited == 0:
+        event_rate[first + excite_htmf] = other_rates[0]
+    if c_excited != 0 and product == 0:
+        event_rate[first + decay_catalyst] = other_rates[1]
+    if h_excited != 0 and product == 0:
+        event_rate[first + decay_htmf] = other_rates[1]
+    occupancy_product = catalyst * htmf * cinna
+    if occupancy_product != 0 and product == 0 and (c_excited != 0 or
+                                                    h_excited != 0):
+        if occupancy_product == 1:
+            event_rate[first + react] = other_rates[2]
+        else:
+            event_rate[first + react] = other_rates[3]
+    for event in range(n_other_events):
+        total += event_rate[first + event]
+    return total
+
+
+@jit
+def all_events(codes, excited, neighbours, event_rate, site_rate,
+               move_rate, states, other_rates):
+    """Works out the rates of the events of all the sites.
+    Returns None"""
+    for site in range(len(codes)):
+        site_rate[site] = site_events(site, codes, excited, neighbours,
+                                      event_rate, move_rate, states,
+                                      other_rates)
+
+
+@jit
+def update_site(site, codes, excited, neighbours, event_rate, site_rate,
+                tree, move_rate, states, other_rates):
+    """Works out the rates of the events of site again, and puts its
+    total in the tree.
+    Returns None"""
+    total = site_events(site, codes, excited, neighbours, event_rate,
+                        move_rate, states, other_rates)
+    tree_add(tree, site, total - site_rate[site])
+    site_rate[site] = total
+
+
+@jit
+def update_neighbours(site, skip, codes, excited, neighbours, opposite,
+                      event_rate, site_rate, tree, move_rate):
+    """Works out the rates of the moves into site of its neighbours
+    again (except skip, which is done in full), and their totals.
+    Returns None"""
+    max_move = len(opposite)
+    n_events = max_move + n_other_events
+    for direc in range(max_move):
+        other = neighbours[site * max_move + direc]
+        if other == site or other == skip or codes[other] == empty_state:
+            continue
+        first = other * n_events
+        xdiff = (int(excited[2 * site] != excited[2 * other]) +
+                 2 * int(excited[2 * site + 1] != excited[2 * other + 1]))
+        event_rate[first + opposite[direc]] = move_rate[
+            (xdiff * n_states + codes[site]) * n_states + codes[other]]
+        # (Summed in the same order as site_events, so it is the same
+        # as working it out from scratch.)
+        total = 0.0
+        for event in range(n_events):
+            total += event_rate[first + event]
+        tree_add(tree, other, total - site_rate[other])
+        site_rate[other] = total
+
+
+@jit
+def attempt_move(to, fr, excit, after, uniforms, position, outcome_table,
+                 accept_table, move_to_table, move_from_table):
+    """Does a move attempt of a site with code fr into a site with code
+    to, given that it changes something (see the module docstring).
+    excit is [to catalyst, to htmf, from catalyst, from htmf] excitation
+    (0 or 1), changed in place, and after is room for 3 molecules.
+    The random numbers are uniforms[position:].
+    Returns the codes (to, fr) after it and the new position."""
+    xdiff = int(excit[0] != excit[2]) + 2 * int(excit[1] != excit[3])
+    row = ((xdiff * n_states + to) * n_states + fr) * n_outcomes
+    value = uniforms[position] * outcome_table[row + n_outcomes - 1]
+    position += 1
+    # The first outcome whose cumulative chance is above value.
+    low = 0
+    high = n_outcomes - 1
+    while low < high:
+        middle = (low + high) // 2
+        if outcome_table[row + middle] <= value:
+            low = middle + 1
+        else:
+            high = middle
+    mol    = low // 32
+    before = (low // 4) % 8
+    index = ((to * n_states + fr) * 4 + mol) * 4 + low % 4
+    to, fr = move_to_table[index], move_from_table[index]
+    if mol < 2:
+        excit[mol], excit[mol + 2] = excit[mol + 2], excit[mol]
+    # The molecules after it in the order are tried as in the sweep, in
+    # a random order (numbered by its Lehmer code).
+    n_after = 0
+    bit = 1
+    for other in range(4):
+        if other != mol:
+            if before & bit == 0:
+                after[n_after] = other
+                n_after += 1
+            bit *= 2
+    n_orders = 1
+    for k in range(2, n_after + 1):
+        n_orders *= k
+    order = int(uniforms[position] * n_orders)
+    position += 1
+    for k in range(n_after):
+        n_orders //= n_after - k
+        pick = k + order // n_orders
+        order %= n_orders
+        mol = after[pick]
+        for j in range(pick, k, -1):
+            after[j] = after[j - 1]
+        after[k] = mol
+        index = (((to * n_states + fr) * 4 + mol) * 4 +
+                 int(uniforms[position] * 4))
+        position += 1
+        if uniforms[position] < accept_table[index]:
+            to, fr = move_to_table[index], move_from_table[index]
+            if mol < 2:
+                excit[mol], excit[mol + 2] = excit[mol + 2], excit[mol]
+        position += 1
+    return to, fr, position
+
+
+@jit
+def advance_kernel(end, clock, counts, uniforms, codes, excited,
+                   neighbours, opposite, event_rate, site_rate, tree,
+                   move_rate, outcome_table, accept_table, move_to_table,
+                   move_from_table, states, other_rates, changed,
+                   changed_sites, excit, after):
+    """Does events until clock[0] (the time) reaches end, or there are
+    not enough random numbers left in uniforms for another one.
+    clock[1] is what is left of the wait to the next event (-1 if it has
+    to be drawn), counts is [position in uniforms, number of events done,
+    number of changed sites], and changed and changed_sites mark the
+    sites that were changed.
+    Returns True if it got to end."""
+    max_move = len(opposite)
+    n_events = max_move + n_other_events
+    position = counts[0]
+    while True:
+        if position + event_uniforms > len(uniforms):
+            counts[0] = position
+            return False
+        wait = clock[1]
+        if wait < 0.0:
+            if tree[0] <= 0.0:
+                clock[0] = end
+                counts[0] = position
+                return True
+            wait = -log(1.0 - uniforms[position]) / tree[0]
+            position += 1
+        if clock[0] + wait > end:
+            # Keep what is left of the wait for next time (this is the
+            # same as drawing it again, but makes the run the same
+            # however it is split up into calls).
+            clock[1] = clock[0] + wait - end
+            clock[0] = end
+            counts[0] = position
+            return True
+        clock[1] = -1.0
+        clock[0] += wait
+        # Pick a site, then one of its events, by its rate.
+        site, value = tree_find(tree, uniforms[position] * tree[0])
+        position += 1
+        # (Rounding can land just past the last site with events, or on
+        # a site without any next to it.)
+        while site_rate[site] <= 0.0 and position < len(uniforms):
+            site, value = tree_find(tree, uniforms[position] * tree[0])
+            position += 1
+        first = site * n_events
+        event = 0
+        while event < n_events - 1 and value >= event_rate[first + event]:
+            value -= event_rate[first + event]
+            event += 1
+        while event_rate[first + event] == 0.0:
+            event -= 1
+        if event < max_move:
+            target = neighbours[site * max_move + event]
+            excit[0] = excited[2 * target]
+            excit[1] = excited[2 * target + 1]
+            excit[2] = excited[2 * site]
+            excit[3] = excited[2 * site + 1]
+            to, fr, position = attempt_move(
+                codes[target], codes[site], excit, after, uniforms,
+                position, outcome_table, accept_table, move_to_table,
+                move_from_table)
+            codes[target] = to
+            codes[site]   = fr
+            excited[2 * target]     = excit[0]
+            excited[2 * target + 1] = excit[1]
+            excited[2 * site]       = excit[2]
+            excited[2 * site + 1]   = excit[3]
+        else:
+            target = site
+            event -= max_move
+            if event == excite_catalyst:
+                excited[2 * site] = 1
+            elif event == excite_htmf:
+                excited[2 * site + 1] = 1
+            elif event == decay_catalyst:
+                excited[2 * site] = 0
+            elif event == decay_htmf:
+                excited[2 * site + 1] = 0
+            else:
+                # Create product, and remove reactants and excitation.
+                code = codes[site]
+                catalyst = states[4 * code]
+                product = (catalyst * states[4 * code + 1] *
+                           states[4 * code + 2])
+                codes[site] = 27 * catalyst + 9 + 3 + product + 1
+                excited[2 * site]     = 0
+                excited[2 * site + 1] = 0
+        # The rates of the changed sites, and of the moves of their
+        # neighbours into them, change.
+        update_site(site, codes, excited, neighbours, event_rate,
+                    site_rate, tree, move_rate, states, other_rates)
+        update_neighbours(site, target, codes, excited, neighbours,
+                          opposite, event_rate, site_rate, tree, move_rate)
+        if not changed[site]:
+            changed[site] = 1
+            changed_sites[counts[2]] = site
+            counts[2] += 1
+        if target != site:
+            update_site(target, codes, excited, neighbours, event_rate,
+                        site_rate, tree, move_rate, states, other_rates)
+            update_neighbours(target, site, codes, excited, neighbours,
+                              opposite, event_rate, site_rate, tree,
+                              move_rate)
+            if not changed[target]:
+                changed[target] = 1
+                changed_sites[counts[2]] = target
+                counts[2] += 1
+        counts[1] += 1
+
+
+class KMC_Lattice(arraylat.Array_Lattice):
+    """An Array_Lattice that is advanced by rejection-free kinetic Monte
+    Carlo instead of sweeps. It has the same over_sites contract:
+    'move' advances the lattice by one equivalent sweep (with all kinds
+    of events), and 'excite' and 'react' do nothing since they are part
+    of the events.
+    time is the number of equivalent sweeps done so far."""
+
+    # Whether the kernels are compiled (needed by make_tables, which is
+    # called before __init__ is done).
+    compiled = have_numba
+
+    def __init__(self, arguments, size = 3, dimension = 2, seed = None,
+                 replica = 0):
+        """Same as Array_Lattice (move_mode does not apply).
+        Syntax: KMC_Lattice(arguments, size, dimension, seed, replica)
+        Returns None."""
+        arraylat.Array_Lattice.__init__(self, arguments, size, dimension,
+                                        seed = seed, replica = replica)
+        self.time = 0.0
+        # What is left of the wait to the next event when advance
+        # stopped (None if it has to be drawn).
+        self.next_wait = None
+        self.n_events = self.max_move + n_other_events
+        # Neighbours of site s are neighbours[s * max_move:][:max_move],
+        # and the move back from the neighbour in direction d is in
+        # direction opposite[d].
+        self.neighbours = self.kernel_array(self.neighbour_table.ravel(),
+                                            np.int64)
+        self.opposite = self.kernel_array(
+            [(direc + dimension) % self.max_move
+             for direc in xrange(self.max_move)], np.int64)
+        self.excit = self.kernel_array(np.zeros(4), np.int8)
+        self.after = self.kernel_array(np.zeros(3), np.int64)
+        self.reset_events()
+
+    def kernel_array(self, values, dtype):
+        """Returns values as an array of dtype for the compiled kernels,
+        or as a list if they are not compiled."""
+        values = np.asarray(values, dtype = dtype).ravel()
+        if self.compiled:
+            return values.copy()
+        return values.tolist()
+
+    def make_tables(self):
+        """Makes the tables of Array_Lattice.make_tables, and those of
+        the events (flattened, for the kernels):
+        move_rate[xdiff, to, fr] is the rate of a move event of a site
+        with code fr into one with code to, where bit 0 of xdiff is set
+        if their catalyst excitations differ and bit 1 if their htmf
+        excitations do (so swapping them changes something).
+        outcome_table[xdiff, to, fr] is the cumulative chance of each
+        outcome of that move (see n_outcomes).
+        other_rates are the excite, decay and react (pos, neg) rates.
+        Returns None"""
+        arraylat.Array_Lattice.make_tables(self)
+        to, fr = np.indices((n_states, n_states))
+        changes = ((self.move_to_table != to[..., np.newaxis, np.newaxis]) |
+                   (self.move_from_table != fr[..., np.newaxis, np.newaxis]))
+        outcome_table = np.zeros((4, n_states, n_states, n_outcomes))
+        for xdiff in xrange(4):
+            swaps = np.array([xdiff & 1, xdiff & 2, 0, 0], dtype = bool)
+            # Chance of each molecule and flips changing something, and
+            # of a molecule tried with random flips changing nothing.
+            change = self.accept_table * (changes | swaps[:, np.newaxis])
+            same = 1.0 - change.mean(axis = 3)
+            for mol in xrange(4):
+                others = [m for m in xrange(4) if m != mol]
+                for before in xrange(8):
+                    tried = [m for bit, m in enumerate(others)
+                             if before & (1 << bit)]
+                    # Chance of an order with the molecules in tried
+                    # first, none of them changing anything, then mol
+                    # with each of the flips.
+                    weight = (factorial(len(tried)) *
+                              factorial(3 - len(tried)) / 24.0 *
+                              np.prod(same[..., tried], axis = 2) / 4.0)
+                    k = (mol * 8 + before) * 4
+                    outcome_table[xdiff, ..., k:k + 4] = (
+                        weight[..., np.newaxis] * change[:, :, mol])
+        np.cumsum(outcome_table, axis = 3, out = outcome_table)
+        self.move_rate = outcome_table[..., -1] / self.max_move
+        # (The kernels look up the outcomes in the array even if they
+        # are not compiled, since a list of them would be large.)
+        self.outcome_table = outcome_table.ravel()
+        self.other_rates = [-log(1.0 - min(self.excit_prob, 1 - 1e-12)),
+                            0.5,
+                            -log(1.0 - min(self.p_react_pos, 1 - 1e-12)),
+                            -log(1.0 - min(self.p_react_neg, 1 - 1e-12))]
+        self.kernel_tables = (
+            self.kernel_array(self.move_rate, np.float64),
+            self.outcome_table,
+            self.kernel_array(self.accept_table, np.float64),
+            self.kernel_array(self.move_to_table, np.int64),
+            self.kernel_array(self.move_from_table, np.int64),
+            self.kernel_array(arraylat.state_table, np.int64),
+            self.kernel_array(self.other_rates, np.float64))
+
+    def reset_events(self):
+        """Takes the codes and excitations from the planes, and works out
+        the rates of all the events.
+        Returns None"""
+        n_sites = self.catalyst.size
+        self.codes   = self.kernel_array(self.state_codes(), np.int64)
+        self.excited = self.kernel_array(self.flat_excitation.T != 0,
+                                         np.int8)
+        self.event_rate = self.kernel_array(
+            np.zeros(n_sites * self.n_events), np.float64)
+        self.site_rate  = self.kernel_array(np.zeros(n_sites), np.float64)
+        self.tree       = self.kernel_array(np.zeros(n_sites + 1),
+                                            np.float64)
+        move_rate, outcome_table, accept_table, move_to_table, \
+            move_from_table, states, other_rates = self.kernel_tables
+        all_events(self.codes, self.excited, self.neighbours,
+                   self.event_rate, self.site_rate, move_rate, states,
+                   other_rates)
+        # Sites changed since the planes were last brought up to date.
+        self.changed       = self.kernel_array(np.zeros(n_sites), np.uint8)
+        self.changed_sites = self.kernel_array(np.zeros(n_sites), np.int64)
+
+    def site_rates(self):
+        """Returns the total event rate of each site as an array the
+        shape of the lattice."""
+        return np.array(self.site_rate).reshape(self.catalyst.shape)
+
+    def attempt_move(self, to, fr, to_excit, from_excit):
+        """Does a move attempt of a site with code fr and excitations
+        from_excit ([catalyst, htmf], 0 or 1) into one with code to and
+        excitations to_excit, given that it changes something (the
+        outcome of a move event, see attempt_move of the module).
+        Returns the codes and excitations (to, fr, to_excit, from_excit)
+        after it."""
+        excit = self.kernel_array(list(to_excit) + list(from_excit),
+                                  np.int8)
+        uniforms = self.kernel_array(self.rng.uniform(event_uniforms),
+                                     np.float64)
+        move_rate, outcome_table, accept_table, move_to_table, \
+            move_from_table, states, other_rates = self.kernel_tables
+        to, fr, position = attempt_move(to, fr, excit, self.after,
+                                        uniforms, 0, outcome_table,
+                                        accept_table, move_to_table,
+                                        move_from_table)
+        return (int(to), int(fr), [int(excit[0]), int(excit[1])],
+                [int(excit[2]), int(excit[3])])
+
+    def advance(self, sweeps = 1.0):
+        """Does events until time has gone forward by sweeps equivalent
+        sweeps. (The waiting time to an event is memoryless, so the event
+        that would come after the end is just not done.) Then brings the
+        planes and the occupied index up to date.
+        Returns the number of events done."""
+        move_rate, outcome_table, accept_table, move_to_table, \
+            move_from_table, states, other_rates = self.kernel_tables
+        # (The tree is made again every time so that rounding errors of
+        # the updates don't build up.)
+        tree_build(self.tree, self.site_rate)
+        end = self.time + sweeps
+        next_wait = -1.0 if self.next_wait is None else self.next_wait
+        clock = self.kernel_array([self.time, next_wait], np.float64)
+        counts = self.kernel_array([0, 0, 0], np.int64)
+        done = False
+        while not done:
+            uniforms = self.kernel_array(self.rng.uniform(block_uniforms),
+                                         np.float64)
+            counts[0] = 0
+            done = advance_kernel(
+                end, clock, counts, uniforms, self.codes, self.excited,
+                self.neighbours, self.opposite, self.event_rate,
+                self.site_rate, self.tree, move_rate, outcome_table,
+                accept_table, move_to_table, move_from_table, states,
+                other_rates, self.changed, self.changed_sites, self.excit,
+                self.after)
+        self.time = float(clock[0])
+        self.next_wait = None if clock[1] < 0.0 else float(clock[1])
+        self.write_planes(int(counts[2]))
+        return int(counts[1])
+
+    def write_planes(self, n_changed):
+        """Copies the codes and excitations of the n_changed sites
+        changed by events to the planes, and updates the occupied index.
+        Returns None"""
+        if not n_changed:
+            return
+        sites = np.array(self.changed_sites[:n_changed], dtype = np.intp)
+        codes = np.asarray(self.codes)[sites]
+        excited = np.asarray(self.excited).reshape(-1, 2)[sites]
+        states = arraylat.decode_states(codes)
+        for m in xrange(4):
+            self.flat_planes[m][sites] = states[:, m]
+        self.flat_excitation[:, sites] = excited.T
+        for site in sites:
+            self.changed[site] = 0
+        self.update_occupied(sites)
+
+    def excite(self):
+        """Excitation is one of the events done in move.
+        Returns None"""
+        pass
+
+    def react(self):
+        """Reaction is one of the events done in move.
+        Returns None"""
+        pass
+
+    def move(self):
+        """Advances the lattice by one equivalent sweep of events.
+        Returns None"""
+        self.advance(1.0)
+
+    def get_state(self):
+        """Array_Lattice.get_state plus the time.
+        Returns a dict."""
+        state = arraylat.Array_Lattice.get_state(self)
+        state['time']      = self.time
+        state['next_wait'] = self.next_wait
+        return state
+
+    def set_state(self, state):
+        """Array_Lattice.set_state plus the time, then recomputes all
+        the rates.
+        Returns None"""
+        arraylat.Array_Lattice.set_state(self, state)
+        self.time      = state['time']
+        self.next_wait = state['next_wait']
+        self.reset_events()
+
+    def set_configuration(self, configuration):
+        """Array_Lattice.set_configuration, then recomputes all the rates
+        (and draws a new wait, since the total rate changed).
+        Returns None"""
+        arraylat.Array_Lattice.set_configuration(self, configuration)
+        self.next_wait = None
+        self.reset_events()
@@ -1,22 +1,106 @@
 #! /usr/bin/env python
 
-from random import random
-# random() returns random number between 0 and 1
-from random import choice
-# choice(seq) psuedorandomly returns a value of in seq
-from random import randint
-# randint(a, b) psuedorandomly returns an integer in range (a, b) inclusive
-from random import shuffle
-# shuffle(list) will create a permutation of list in place with no return
+import random
+# Each site draws its random numbers from its rng, which has the
+# functions of the random module:
+# rng.random() returns random number between 0 and 1
+# rng.choice(seq) psuedorandomly returns a value of in seq
+# rng.randint(a, b) psuedorandomly returns an integer in range (a, b)
+# inclusive
+# rng.shuffle(list) will create a permutation of list in place with no
+# return
 from math import exp
 # exponential function
 from math import sqrt
 # square root function
+from collections import namedtuple
+# tuple with named fields, for the parameters
 
 
-def pm():
-    """this function returns + or - 1 psuedorandomly"""
-    return choice((-1, 1))
+def pm(rng = random):
+    """this function returns + or - 1 psuedorandomly (from rng, by default
+    the random module)"""
+    return rng.choice((-1, 1))
+
+
+# The molecule (0 catalyst, 1 htmf, 2 cinnamate, 3 product, as in
+# profilelat) at each position of the state vectors of accept_move.
+molecule_slot = {0: 0, 2: 1, 4: 2, 5: 3}
+
+
+# The parameters of a site, derived from the arguments by
+# cell_parameters. It is a tuple, so it can't be changed, and one can be
+# shared by all the sites of a lattice.
+Cell_Parameters = namedtuple('Cell_Parameters',
+                             ('molecprob', 'e_react_pos', 'e_react_neg',
+                              'e_assoc_pos', 'e_assoc_neg', 'e_assoc',
+                              'excit_prob', 'max_move', 'beta',
+                              'large_num'))
+
+
+def cell_parameters(molecprob = 0.01, reaction_energy = 0.1,
+                    reaction_favoritism = 2.0, assoc_stabilization = 0.1,
+                    assoc_favoritism = 2.0, excit_prob = 0.01,
+                    beta = 1.0, dimension = 2):
+    """Checks the arguments of a site and works out the energies from
+    them.
+    molecprob is an optional argument that must be between 0 and 1.
+    It is the probability of a molecule starting in this lattice site.
+    reaction_energy is essentially the activation energy of the reaction.
+    reaction_favoritism is the relative amount the
+    positive product is favored in the reaction.
+    assoc_stabilization is the amount association is favored
+    over molecules by themselves.
+    assoc_favoritism is the relative amount the
+    positive product is favored in staying associated.
+    excit_prob is the probability of an excitation at any step.
+    beta is the unitless inverse temperature.
+    dimension is the dimensionality of the lattice. Probably
+    going to stay at 2D.
+    Syntax: cell_parameters(molecprob, reaction_energy,
+    reaction_favoritism, assoc_stabilization,
+    association_favoritism, excitation_probability, beta, dimension)
+    Returns a Cell_Parameters."""
+    # Check values of inputs
+    if type(molecprob) != float:
+        raise TypeError('molecprob must be a real number (float), %s'
+                        % type(molecprob))
+    elif molecprob >= 1:
+        raise ValueError('moleprob must be less than 1')
+    elif molecprob <= 0:
+        raise ValueError('moleprob must be greater than 0')
+    elif reaction_energy <= 0:
+        raise ValueError('reaction energy must be greater than 0')
+    elif type(reaction_favoritism) != float:
+        raise TypeError('reaction favoritism must be a float')
+    elif assoc_stabilization <= 0:
+        raise ValueError('assoc stabilization must be greater than 0')
+    elif type(assoc_favoritism) != float:
+        raise TypeError('assoc favoritism must be a float')
+    elif beta <= 0.0:
+        raise ValueError('beta (inv temp) must be greater than 0.0')
+    e_assoc_pos = assoc_stabilization * assoc_favoritism
+    e_assoc_neg = assoc_stabilization
+    # This can support negative association favoritism now by just using
+    # the arithemetic mean instead.
+    if assoc_favoritism < 0.0:
+        e_assoc = (e_assoc_neg + e_assoc_pos) / 2
+    else:
+        e_assoc = assoc_stabilization * sqrt(assoc_favoritism)
+    return Cell_Parameters(
+        molecprob   = molecprob,
+        e_react_pos = reaction_energy / reaction_favoritism,
+        e_react_neg = reaction_energy,
+        e_assoc_pos = e_assoc_pos,
+        e_assoc_neg = e_assoc_neg,
+        e_assoc     = e_assoc,
+        excit_prob  = excit_prob,
+        max_move    = 2 * dimension,
+        beta        = beta,
+        # This number is used to determine the product repulsion in
+        # e_of_state. It depends on beta such that at high beta, it
+        # shouldn't overflow.
+        large_num   = 700 / (2.5 * beta))
 
 
 class Lattice_Cell_Object:
@@ -35,91 +119,73 @@ class Lattice_Cell_Object:
     or molecules.
     excite will possibly excite some molecules that are present."""
 
+    # A profilelat.Profile to count move proposals and reaction
+    # attempts in, set on each site by Lattice.enable_profile.
+    profile = None
+    # Where the random numbers come from: the random module, unless the
+    # site is given a random.Random of its own lattice.
+    rng = random
+
     def __init__(self, molecprob = 0.01, reaction_energy = 0.1,
                  reaction_favoritism = 2.0, assoc_stabilization = 0.1,
                  assoc_favoritism = 2.0, excit_prob = 0.01,
                  beta = 1.0,
-                 dimension = 2):
+                 dimension = 2, parameters = None, occupancy = None,
+                 rng = None):
         """This initializes an instance of lattice_cell_object with a
         chance of population
         of molecules determined by molecprob.
         All arguments are optional.
         Syntax: __init__(molecprob, reaction_energy,
         reaction_favoritism, assoc_stabilization,
-        association_favoritism, excitation_probability, beta, dimension)
-        molecprob is an optional argument that must be between 0 and 1.
-        It is the probability of a molecule starting in this lattice site.
-        reaction_energy is essentially the activation energy of the reaction.
-        reaction_favoritism is the relative amount the
-        positive product is favored in the reaction.
-        assoc_stabilization is the amount association is favored
-        over molecules by themselves.
-        assoc_favoritism is the relative amount the
-        positive product is favored in staying associated.
-        excit_prob is the probability of an excitation at any step.
-        beta is the unitless inverse temperature.
-        dimension is the dimensionality of the lattice. Probably
-        going to stay at 2D.
+        association_favoritism, excitation_probability, beta, dimension,
+        parameters, occupancy, rng)
+        The first eight arguments are checked and made into the
+        parameters of this site by cell_parameters (see there for what
+        they are).
+        parameters is a Cell_Parameters to use instead of the first eight
+        arguments. It is shared, not copied, so a lattice can check its
+        arguments once and give every site the same one.
+        occupancy is (catalyst, htmf, cinna) to start with. If it is not
+        given, each one is present with probability molecprob (with a
+        random orientation for htmf and cinnamate).
+        rng is the random.Random to draw from (shared by the sites of a
+        lattice), instead of the random module.
         Returns None."""
-        # Check values of inputs
-        if type(molecprob) != float:
-            raise TypeError('molecprob must be a real number (float), %s'
-                            % type(molecprob))
-        elif molecprob >= 1:
-            raise ValueError('moleprob must be less than 1')
-        elif molecprob <= 0:
-            raise ValueError('moleprob must be greater than 0')
-        elif reaction_energy <= 0:
-            raise ValueError('reaction energy must be greater than 0')
-        elif type(reaction_favoritism) != float:
-            raise TypeError('reaction favoritism must be a float')
-        elif assoc_stabilization <= 0:
-            raise ValueError('assoc stabilization must be greater than 0')
-        elif type(assoc_favoritism) != float:
-            raise TypeError('assoc favoritism must be a float')
-        elif beta <= 0.0:
-            raise ValueError('beta (inv temp) must be greater than 0.0')
-        # With molecprob probability sets occupancy for catalyst.
-        if random() < molecprob:
-            self.catalyst = 1
+        if rng is not None:
+            self.rng = rng
+        if parameters is None:
+            parameters = cell_parameters(molecprob, reaction_energy,
+                                         reaction_favoritism,
+                                         assoc_stabilization,
+                                         assoc_favoritism, excit_prob,
+                                         beta, dimension)
+        self.parameters = parameters
+        if occupancy is not None:
+            self.catalyst, self.htmf, self.cinna = occupancy
         else:
-            self.catalyst = 0
-        # With molecprob probability sets occupancy for htmf.
-        # If occupied, can be in pm 1 orientation
-        if random() < molecprob:
-            self.htmf = pm()
-        else:
-            self.htmf = 0
-        # With Monte Carlo-like probability sets occupancy for cinnamate.
-        # If occupied, can be in pm 1 orientation
-        if random() < molecprob:
-            self.cinna = pm()
-        else:
-            self.cinna = 0
+            molecprob = parameters.molecprob
+            # With molecprob probability sets occupancy for catalyst.
+            if self.rng.random() < molecprob:
+                self.catalyst = 1
+            else:
+                self.catalyst = 0
+            # With molecprob probability sets occupancy for htmf.
+            # If occupied, can be in pm 1 orientation
+            if self.rng.random() < molecprob:
+                self.htmf = pm(self.rng)
+            else:
+                self.htmf = 0
+            # With Monte Carlo-like probability sets occupancy for
+            # cinnamate. If occupied, can be in pm 1 orientation
+            if self.rng.random() < molecprob:
+                self.cinna = pm(self.rng)
+            else:
+                self.cinna = 0
         # sets product occupancy to 0, as well as excitation state
         self.product = 0
         self.htmf_excitation_state = 0.0
         self.catalyst_excitation_state = 0.0
-        # Need to define relevant variables for this!!
-        # They should be taken as input to init and set as internal
-        # variables here
-        self.e_react_pos = reaction_energy / reaction_favoritism
-        self.e_react_neg = reaction_energy
-        self.e_assoc_pos = assoc_stabilization * assoc_favoritism
-        self.e_assoc_neg = assoc_stabilization
-        # This can support negative association favoritism now by just using
-        # the arithemetic mean instead.
-        if assoc_favoritism < 0.0:
-            self.e_assoc = (self.e_assoc_neg + self.e_assoc_pos) / 2
-        else:
-            self.e_assoc = assoc_stabilization * sqrt(assoc_favoritism)
-        self.excit_prob  = excit_prob
-        self.max_move    = 2 * dimension
-        self.beta        = beta
-        # This number is used to determine the product repulsion in e_of_state
-        # It depends on beta such that at high beta, it shouldn't overflow.
-        self.large_num   = 700 / (2.5 * beta)
-        #self.counter     = 1
 
     def __repr__(self):
         """Returns current occupation of this instance as a comma separated
@@ -154,7 +220,7 @@ class Lattice_Cell_Object:
         # by returning a direction and the current state.
         # If it's empty, it will return None.
         if sum_state_squared:
-            move_direc = randint(0, (self.max_move - 1))
+            move_direc = self.rng.randint(0, (self.parameters.max_move - 1))
             return (move_direc, self.catalyst, self.catalyst_excitation_state,
                     self.htmf, self.htmf_excitation_state, self.cinna,
                     self.product)
@@ -183,11 +249,12 @@ class Lattice_Cell_Object:
         Returns None"""
         #randomnumber = random
         #print randomnumber, self.catalyst, self.excit_prob
+        excit_prob = self.parameters.excit_prob
         if self.catalyst != 0:
-            if random() < self.excit_prob:
+            if self.rng.random() < excit_prob:
                 self.catalyst_excitation_state = 1.0
         if self.htmf != 0:
-            if random() < self.excit_prob:
+            if self.rng.random() < excit_prob:
                 self.htmf_excitation_state = 1.0
         #print self.catalyst_excitation_state
 
@@ -218,10 +285,11 @@ class Lattice_Cell_Object:
         # If it does react, it will create product,
         # and remove both reactants and all excitation.
         if occupancy_product == -1:
-            reaction_energy = self.e_react_neg
+            reaction_energy = self.parameters.e_react_neg
             # with psuedo-MMC probability, this will react. The probability of
             # the reaction is attenuated by the excitation of the molecules.
-            if random() < total_excit * exp(-self.beta * reaction_energy):
+            if self.rng.random() < total_excit * exp(-self.parameters.beta *
+                                            reaction_energy):
                 # Create product.
                 self.product = -1
                 # Remove reactants and excitation.
@@ -231,13 +299,18 @@ class Lattice_Cell_Object:
                 self.catalyst_excitation_state = 0
         # Does the same except for the positive product.
         elif occupancy_product == 1:
-            reaction_energy = self.e_react_pos
-            if random() < total_excit * exp(-self.beta * reaction_energy):
+            reaction_energy = self.parameters.e_react_pos
+            if self.rng.random() < total_excit * exp(-self.parameters.beta *
+                                            reaction_energy):
                 self.product = 1
                 self.htmf    = 0
                 self.htmf_excitation_state     = 0
                 self.cinna   =  0
                 self.catalyst_excitation_state = 0
+        # There was no product before, so there is one now if it
+        # reacted.
+        if self.profile is not None and occupancy_product:
+            self.profile.count_reactions(occupancy_product, self.product != 0)
         # Reduce the excitation state (need to be floats, not integers).
         self.htmf_excitation_state /= 2.
         self.catalyst_excitation_state /= 2.
@@ -275,7 +348,7 @@ class Lattice_Cell_Object:
         # randomize this list to check each sequentially, but in a
         # random order (shuffle does this in place, aka changes variable
         # definition)
-        shuffle(molecule_list)
+        self.rng.shuffle(molecule_list)
         # proposeto will be a vector that will be sent to check_proposed
         # after certain parts are replaced.
         # proposeto is the site being moved into, and proposefrom is being
@@ -294,14 +367,19 @@ class Lattice_Cell_Object:
             # and the product shouldn't change configuration. It will flip
             # it possibly by multiplying by +- 1.
             if mol in (2, 4):
-                proposeto[mol]   = pm() * p_state[mol]
-                proposefrom[mol] = pm() * c_state[mol]
+                proposeto[mol]   = pm(self.rng) * p_state[mol]
+                proposefrom[mol] = pm(self.rng) * c_state[mol]
             else:
                 proposeto[mol]   = p_state[mol]
                 proposefrom[mol] = c_state[mol]
             # Check proposal. If it returns true, move was accepted,
             # otherwise it was rejected. Set states accordingly.
-            if self.check_proposed(proposeto, proposefrom, c_state, p_state):
+            accepted = self.check_proposed(proposeto, proposefrom,
+                                           c_state, p_state)
+            # Count it if either site has this molecule.
+            if self.profile is not None and (c_state[mol] or p_state[mol]):
+                self.profile.count_move(molecule_slot[mol], accepted)
+            if accepted:
                 c_state[mol] = proposeto[mol]
                 p_state[mol] = proposefrom[mol]
                 # If it is an "excitable" molecule, need to include
@@ -351,6 +429,7 @@ class Lattice_Cell_Object:
         # A few terms to help make things cleaner later:
         # Product of occupancies to determine which association stabilization
         # to use:
+        parameters = self.parameters
         occ_prod = state[2] * state[4]
         # Sum of abs of occupancies to determine magnitude of stabilization
         # (or destabilization if there is a product present)
@@ -358,19 +437,20 @@ class Lattice_Cell_Object:
         # Term to help ensure nothing overlaps with a product.
         # It will be 0 if product is 0, large negative if it has product and
         # nothing else, otherwise it will be quite large and positive.
-        product_repulsion = abs(state[5]) * (occ_sum - 0.5) * self.large_num
+        product_repulsion = (abs(state[5]) * (occ_sum - 0.5) *
+                             parameters.large_num)
         # Stabilization due to occupancy. This depends on the sign of
         # occ_prod and the magnitude of occ_sum.
         if occ_prod == -1:
-            stabil = self.e_assoc_neg * occ_sum
+            stabil = parameters.e_assoc_neg * occ_sum
         elif occ_prod == 1:
-            stabil = self.e_assoc_pos * occ_sum
+            stabil = parameters.e_assoc_pos * occ_sum
         else:
-            stabil = self.e_assoc     * occ_sum
+            stabil = parameters.e_assoc     * occ_sum
         # Finally, calculate the energy. The stabilization
         # will lower the energy (making it more stable).
         energy = product_repulsion - stabil
-        return self.beta * energy
+        return parameters.beta * energy
 
     def check_proposed(self, proposedto, proposedfrom, currentfrom,
                        currentto):
@@ -392,7 +472,7 @@ class Lattice_Cell_Object:
         ##     print "look, it's not 1!!"
         ##     print p_energy, " , ", c_energy
         ##     print exp(-(p_energy - c_energy))
-        if random() < exp(-(p_energy - c_energy)):
+        if self.rng.random() < exp(-(p_energy - c_energy)):
             # Negative of energy of proposed state minus the energy
             # of the current state. If it is going down in energy (or
             # the energy of the proposed state is the same), this
@@ -0,0 +1,280 @@
+#! /usr/bin/env python
+"""Movies of runs: renders the frames of a trajectory (binary or text,
+see trajectory) to images, on a pool of processes.
+
+Each state code gets a colour (state_colours): the mean of the colours
+of the molecules on the site, from molecule_colours (catalyst grey,
++/- htmf red/orange, +/- cinnamate blue/cyan, +/- product green/purple),
+or background for an empty site. A frame is turned into an image by
+looking up the colour of every site at once and blowing each site up to
+scale x scale pixels. Lattices of more than two dimensions are shown
+one slice (layer) at a time.
+
+The images are written as PNG files (file_name_00000.png, ...), or as
+one animated PNG (APNG, which browsers and most viewers play) with
+out_format 'apng'. Both are written here with zlib, so nothing beyond
+numpy is needed. The workers each read just the frames they render (the
+binary trajectory is memory-mapped, and the text one is read through
+its frame index), so the whole trajectory is never in memory.
+
+Example, from python:
+    movielat.render_movie('lat_react_out201501011200123', scale = 4)
+or from the command line:
+    python movielat.py lat_react_out201501011200123 [--apng] [--scale 4]
+        [--every N] [--fps 10]"""
+
+import multiprocessing
+import os
+import struct
+import zlib
+import numpy as np
+import arraylat
+import trajectory
+
+# Colours (red, green, blue) of the molecules: catalyst, htmf +1 and -1,
+# cinnamate +1 and -1, product +1 and -1.
+molecule_colours = {'catalyst':    (128, 128, 128),
+                    'htmf_pos':    (220, 40, 40),
+                    'htmf_neg':    (250, 160, 30),
+                    'cinna_pos':   (40, 70, 220),
+                    'cinna_neg':   (40, 200, 230),
+                    'product_pos': (30, 180, 60),
+                    'product_neg': (160, 50, 190)}
+# Colour of empty sites.
+background = (255, 255, 255)
+# First bytes of every PNG file.
+png_signature = '\x89PNG\r\n\x1a\n'
+
+
+def state_colours(colours = None, empty = background):
+    """Returns the colour of each state code, as a uint8 array of shape
+    (arraylat.n_states, 3): the mean of the colours (a dict like
+    molecule_colours, by default that one) of the molecules in it, or
+    empty if there are none."""
+    if colours is None:
+        colours = molecule_colours
+    catalyst, htmf, cinna, product = arraylat.state_table.T
+    present = [(catalyst == 1, 'catalyst'),
+               (htmf == 1, 'htmf_pos'), (htmf == -1, 'htmf_neg'),
+               (cinna == 1, 'cinna_pos'), (cinna == -1, 'cinna_neg'),
+               (product == 1, 'product_pos'), (product == -1, 'product_neg')]
+    total = np.zeros((arraylat.n_states, 3))
+    count = np.zeros(arraylat.n_states)
+    for mask, name in present:
+        total[mask] += colours[name]
+        count[mask] += 1
+    result = np.empty((arraylat.n_states, 3))
+    result[:] = empty
+    occupied = count > 0
+    result[occupied] = total[occupied] / count[occupied, np.newaxis]
+    return np.round(result).astype(np.uint8)
+
+
+def frame_image(codes, palette, scale = 1, layer = 0):
+    """Returns the image of the frame of state codes codes (the shape of
+    the lattice), as a uint8 array of shape (rows, columns, 3), with
+    each site scale x scale pixels. Beyond the first two axes, slice
+    layer of each is shown."""
+    codes = np.asarray(codes)
+    if codes.ndim > 2:
+        codes = codes[(slice(None), slice(None)) +
+                      (layer,) * (codes.ndim - 2)]
+    elif codes.ndim == 1:
+        codes = codes[np.newaxis]
+    image = palette[codes]
+    if scale > 1:
+        image = np.repeat(np.repeat(image, scale, axis = 0), scale, axis = 1)
+    return image
+
+
+def png_chunk(kind, data):
+    """Returns the PNG chunk of type kind (4 letters) with data."""
+    return (struct.pack('>I', len(data)) + kind + data +
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+
+def png_header(rows, columns):
+    """Returns the IHDR chunk for an RGB image (8 bits each) of rows x
+    columns pixels."""
+    return png_chunk('IHDR', struct.pack('>IIBBBBB', columns, rows,
+                                         8, 2, 0, 0, 0))
+
+
+def compress_image(image, level = 6):
+    """Returns the zlib compressed pixel data of image (rows, columns,
+    3) for a PNG (each row starting with filter type 0)."""
+    rows = image.shape[0]
+    raw = np.empty((rows, 1 + image[0].size), dtype = np.uint8)
+    raw[:, 0]  = 0
+    raw[:, 1:] = image.reshape(rows, -1)
+    return zlib.compress(raw.tostring(), level)
+
+
+def write_png(file_name, image, data = None):
+    """Writes image (rows, columns, 3) to file_name as a PNG. data is its
+    compress_image, if that has already been done.
+    Returns None"""
+    if data is None:
+        data = compress_image(image)
+    with open(file_name, 'wb') as out_file:
+        out_file.write(png_signature + png_header(*image.shape[:2]) +
+                       png_chunk('IDAT', data) + png_chunk('IEND', ''))
+
+
+class APNG_Writer:
+    """Writes an animated PNG a frame at a time. The number of frames
+    has to be known at the start."""
+
+    def __init__(self, file_name, n_frames, fps = 10):
+        """Opens file_name for an animation of n_frames frames shown at
+        fps frames per second (looping).
+        Syntax: APNG_Writer(file_name, n_frames, fps)
+        Returns None"""
+        self.out_file = open(file_name, 'wb')
+        self.n_frames = n_frames
+        self.fps      = int(fps)
+        # Frames written so far, and the sequence number of the next
+        # fcTL or fdAT chunk.
+        self.count    = 0
+        self.sequence = 0
+
+    def add(self, data, rows, columns):
+        """Adds the next frame, of rows x columns pixels (all frames must
+        be the same size), with data its compress_image.
+        Returns None"""
+        if self.count == 0:
+            self.out_file.write(png_signature + png_header(rows, columns) +
+                                png_chunk('acTL', struct.pack(
+                                    '>II', self.n_frames, 0)))
+        # Frame control: the whole image, shown for 1 / fps seconds.
+        self.out_file.write(png_chunk('fcTL', struct.pack(
+            '>IIIIIHHBB', self.sequence, columns, rows, 0, 0, 1, self.fps,
+            0, 0)))
+        self.sequence += 1
+        if self.count == 0:
+            # The first frame is also the image for viewers that don't
+            # animate.
+            self.out_file.write(png_chunk('IDAT', data))
+        else:
+            self.out_file.write(png_chunk('fdAT', struct.pack(
+                '>I', self.sequence) + data))
+            self.sequence += 1
+        self.count += 1
+
+    def close(self):
+        """Ends the file and closes it.
+        Returns None"""
+        if not self.out_file.closed:
+            self.out_file.write(png_chunk('IEND', ''))
+            self.out_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# The trajectory and settings of a worker process (set by start_worker).
+worker = {}
+
+
+def start_worker(file_name, settings):
+    """Opens the trajectory file_name in a worker process, to render
+    frames with settings (a dict of palette, scale, layer and, for PNG
+    files, out_pattern).
+    Returns None"""
+    worker['frames']   = trajectory.open_trajectory(file_name)
+    worker['settings'] = settings
+
+
+def render_one(k):
+    """Renders frame k in a worker. Writes it to its PNG file if there
+    is an out_pattern, or returns its compressed data.
+    Returns the file name, or (data, rows, columns)."""
+    settings = worker['settings']
+    image = frame_image(worker['frames'][k], settings['palette'],
+                        settings['scale'], settings['layer'])
+    data = compress_image(image)
+    if settings.get('out_pattern'):
+        name = settings['out_pattern'] % k
+        write_png(name, image, data)
+        return name
+    return (data,) + image.shape[:2]
+
+
+def render_movie(file_name, out_name = None, out_format = 'png',
+                 scale = 4, every = 1, layer = 0, fps = 10,
+                 colours = None, processes = None):
+    """Renders every every-th frame of the trajectory file_name (binary
+    or text) on processes worker processes (default the number of
+    cores).
+    out_format 'png' writes out_name + '_%05i.png' for each frame (its
+    number in the trajectory), 'apng' writes one animated out_name +
+    '.png' at fps frames per second. out_name is file_name by default.
+    scale is the number of pixels along each side of a site, layer the
+    slice shown of a lattice of more than two dimensions, and colours
+    the molecule colours (see state_colours).
+    Syntax: render_movie(file_name, out_name, out_format, scale, every,
+    layer, fps, colours, processes)
+    Returns the list of PNG files, or the name of the APNG."""
+    if out_format not in ('png', 'apng'):
+        raise ValueError('out_format must be png or apng, given %s' %
+                         out_format)
+    if type(scale) != int or scale < 1:
+        raise ValueError('scale must be a positive integer, given %s' %
+                         (scale,))
+    if out_name is None:
+        out_name = file_name
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    n_frames = len(trajectory.open_trajectory(file_name))
+    frame_numbers = range(0, n_frames, every)
+    settings = {'palette': state_colours(colours),
+                'scale':   scale,
+                'layer':   layer}
+    if out_format == 'png':
+        settings['out_pattern'] = out_name + '_%05i.png'
+    pool = multiprocessing.Pool(processes, start_worker,
+                                (file_name, settings))
+    try:
+        # Frames are handed out a few at a time, and come back in order.
+        results = pool.imap(render_one, frame_numbers,
+                            chunksize = max(1, min(16, len(frame_numbers) //
+                                                   (4 * processes))))
+        if out_format == 'png':
+            result = list(results)
+        else:
+            result = out_name + '.png'
+            with APNG_Writer(result, len(frame_numbers), fps) as out_file:
+                for data, rows, columns in results:
+                    out_file.add(data, rows, columns)
+    finally:
+        pool.close()
+        pool.join()
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+    prog_name = os.path.basename(sys.argv[0])
+    usage = "usage: %s trajectory_file [--apng] [--scale N] " % prog_name + \
+      "[--every N] [--fps N] [--layer N]"
+    options = {'scale': 4, 'every': 1, 'fps': 10, 'layer': 0}
+    for name in options:
+        if '--' + name in sys.argv:
+            where = sys.argv.index('--' + name)
+            options[name] = int(sys.argv[where + 1])
+            del sys.argv[where:where + 2]
+    out_format = 'png'
+    if '--apng' in sys.argv:
+        sys.argv.remove('--apng')
+        out_format = 'apng'
+    if len(sys.argv) != 2:
+        print usage
+        sys.exit(1)
+    result = render_movie(sys.argv[1], out_format = out_format, **options)
+    if out_format == 'png':
+        print '%i frames written to %s_*.png' % (len(result), sys.argv[1])
+    else:
+        print result
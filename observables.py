@@ -0,0 +1,182 @@
+"""Observables computed on the fly during runlat.run_react, so the
+aggregate numbers we want (product counts and enantiomeric excess, free
+catalyst, associated htmf-cinnamate pairs, ...) don't have to be parsed
+out of full lattice snapshots afterwards.
+
+Every observable is computed from the histogram of state codes of the
+lattice (how many sites are in each of the arraylat.n_states states,
+see state_histogram), which is cheap to get, especially from an
+Array_Lattice that only looks at its occupied sites.
+To add an observable, add a function f(histogram, lattice) returning a
+number to the observables dict (and to needs, if it uses an attribute
+of the lattice that not every backend has), and give its name to
+Recorder (or run_react(observe_int = N, observe_names = [...]))."""
+
+import numpy as np
+import arraylat
+
+# Occupancy of each state code, to pick out states by what is in them.
+catalyst, htmf, cinna, product = arraylat.state_table.T.astype(int)
+
+
+def state_histogram(lattice):
+    """Returns the number of sites of lattice in each state code, as an
+    array of length arraylat.n_states.
+    Uses lattice.state_histogram if it has one (Array_Lattice), or else
+    counts lattice.state_codes()."""
+    if hasattr(lattice, 'state_histogram'):
+        return lattice.state_histogram()
+    return np.bincount(lattice.state_codes().ravel(),
+                       minlength = arraylat.n_states)
+
+
+def count(mask):
+    """Returns an observable function that counts the sites whose state
+    is True in mask (an array over state codes)."""
+    def count_states(histogram, lattice):
+        return int(histogram[mask].sum())
+    return count_states
+
+
+def enantiomeric_excess(histogram, lattice):
+    """(positive - negative product) / (all product), or 0 if there is
+    no product yet."""
+    pos = histogram[product == 1].sum()
+    neg = histogram[product == -1].sum()
+    if pos + neg == 0:
+        return 0.0
+    return float(pos - neg) / (pos + neg)
+
+
+def energy(histogram, lattice):
+    """beta * E of the whole lattice (needs lattice.energy_table, which
+    Array_Lattice and the engines built on it have, but the object
+    Lattice does not: its moves are not worked out from energies)."""
+    return float(np.dot(histogram, lattice.energy_table))
+
+
+# All the observables that can be recorded, by name.
+observables = {
+    'product_pos':    count(product == 1),
+    'product_neg':    count(product == -1),
+    'ee':             enantiomeric_excess,
+    # Catalyst with nothing else on its site.
+    'free_catalyst':  count((catalyst == 1) & (htmf == 0) & (cinna == 0) &
+                            (product == 0)),
+    'free_htmf':      count((htmf != 0) & (catalyst == 0) & (cinna == 0)),
+    'free_cinna':     count((cinna != 0) & (catalyst == 0) & (htmf == 0)),
+    # Associated htmf and cinnamate, with the same or opposite
+    # orientation (with or without catalyst).
+    'assoc_same':     count(htmf * cinna == 1),
+    'assoc_opposite': count(htmf * cinna == -1),
+    # Full catalyst-htmf-cinnamate complexes that would make positive or
+    # negative product.
+    'complex_pos':    count(catalyst * htmf * cinna == 1),
+    'complex_neg':    count(catalyst * htmf * cinna == -1),
+    'energy':         energy}
+
+# What is recorded if no names are given.
+default_names = ['product_pos', 'product_neg', 'ee', 'free_catalyst',
+                 'assoc_same', 'assoc_opposite', 'complex_pos',
+                 'complex_neg']
+
+
+# Observables that need something of the lattice (an attribute) that
+# not every backend has.
+needs = {'energy': 'energy_table'}
+
+
+def check_names(names, lattice = None):
+    """Raises ValueError if any of names is not a known observable, or,
+    if lattice is given, can't be computed for lattice (see needs).
+    Returns None"""
+    unknown = [name for name in names if name not in observables]
+    if unknown:
+        raise ValueError('unknown observables %s, known are %s' %
+                         (unknown, sorted(observables.keys())))
+    if lattice is None:
+        return
+    missing = [name for name in names if name in needs and
+               not hasattr(lattice, needs[name])]
+    if missing:
+        raise ValueError('observables %s can not be computed for a %s' %
+                         (missing, lattice.__class__.__name__))
+
+
+def compute(lattice, names = None):
+    """Returns the list of the values of the observables names (default
+    default_names) for the current state of lattice."""
+    if names is None:
+        names = default_names
+    histogram = state_histogram(lattice)
+    return [observables[name](histogram, lattice) for name in names]
+
+
+class Recorder:
+    """Writes observables of a lattice to a small time series file:
+    a header line '# step name1 name2 ...' then one line per record,
+    separated by tabs."""
+
+    def __init__(self, file_name, names = None, offset = None):
+        """Opens file_name and writes the header line.
+        names are the observables to record (default default_names).
+        If offset is given, the existing file is cut to offset bytes
+        (from tell) and written after that, instead of starting over.
+        Syntax: Recorder(file_name, names, offset)
+        Returns None"""
+        if names is None:
+            names = default_names
+        check_names(names)
+        self.file_name = file_name
+        self.names     = list(names)
+        if offset is not None:
+            out_file = open(file_name, 'r+')
+            out_file.truncate(offset)
+            out_file.seek(offset)
+            self.out_file = out_file
+        else:
+            self.out_file = open(file_name, 'w')
+            self.out_file.write('# step\t' + '\t'.join(self.names) + '\n')
+
+    def record(self, step, lattice):
+        """Computes the observables of lattice and writes them as the
+        line for step.
+        Returns the list of values."""
+        values = compute(lattice, self.names)
+        self.write(step, values)
+        return values
+
+    def write(self, step, values):
+        """Writes the list values (one for each of names) as the line
+        for step.
+        Returns None"""
+        self.out_file.write('%i\t' % step +
+                            '\t'.join(repr(value) for value in values) +
+                            '\n')
+
+    def tell(self):
+        """Returns the number of bytes written so far (where to continue
+        from after a restart)."""
+        self.out_file.flush()
+        return self.out_file.tell()
+
+    def close(self):
+        """Closes the file.
+        Returns None"""
+        self.out_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read(file_name):
+    """Reads a file written by Recorder.
+    Returns a numpy record array with a field step and one for each
+    observable."""
+    with open(file_name) as in_file:
+        names = in_file.readline().lstrip('#').split()
+    return np.genfromtxt(file_name, names = names, comments = '#',
+                         delimiter = '\t')
@@ -0,0 +1,119 @@
+"""Opt-in instrumentation of a lattice: wall time per phase of
+over_sites (excite, react, move, sample) and counts of the Metropolis
+move proposals and acceptances per molecule (catalyst, htmf, cinnamate,
+product) and of the reaction attempts and reactions per enantiomer.
+
+Profiling is off unless lattice.enable_profile() is called (or
+run_react(profile = True), which writes the profile to file_name +
+'.prof' next to the trajectory). When it is off the lattices only check
+that lattice.profile is None.
+
+A move proposal is counted for a molecule when either of the two sites
+has that molecule (trying to swap two empty slots is not counted).
+A reaction attempt is a full catalyst-htmf-cinnamate complex without
+product getting its chance to react (whatever its excitation).
+KMC_Lattice only has the phase times, since its events are never
+rejected."""
+
+import json
+import numpy as np
+
+# Names of the molecules, in the order of the move counts.
+molecules = ('catalyst', 'htmf', 'cinna', 'product')
+# Names of the enantiomers, in the order of the reaction counts.
+enantiomers = ('pos', 'neg')
+
+
+class Profile:
+    """Phase times and move and reaction counters of one lattice.
+    proposed[mol] and accepted[mol] count the move proposals of each
+    molecule, reaction_attempts[k] and reactions[k] those of each of
+    enantiomers."""
+
+    def __init__(self):
+        """Makes a profile with everything zero.
+        Syntax: Profile()
+        Returns None"""
+        self.phase_seconds     = {}
+        self.phase_calls       = {}
+        self.proposed          = np.zeros(4, dtype = np.int64)
+        self.accepted          = np.zeros(4, dtype = np.int64)
+        self.reaction_attempts = np.zeros(2, dtype = np.int64)
+        self.reactions         = np.zeros(2, dtype = np.int64)
+
+    def add_time(self, phase, seconds):
+        """Adds one call of phase that took seconds.
+        Returns None"""
+        self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + \
+            seconds
+        self.phase_calls[phase] = self.phase_calls.get(phase, 0) + 1
+
+    def count_move(self, mol, accepted):
+        """Counts one proposal of molecule mol, accepted or not.
+        Returns None"""
+        self.proposed[mol] += 1
+        if accepted:
+            self.accepted[mol] += 1
+
+    def count_moves(self, mol, proposed, accepted):
+        """Counts the proposals of an array of molecules mol, where
+        proposed and accepted are boolean arrays the same shape.
+        Returns None"""
+        self.proposed += np.bincount(mol[proposed], minlength = 4)
+        self.accepted += np.bincount(mol[accepted & proposed],
+                                     minlength = 4)
+
+    def count_reactions(self, occupancy_product, reacted):
+        """Counts reaction attempts of sites with occupancy_product
+        (catalyst * htmf * cinna, 1 for positive and -1 for negative
+        product), and the ones that reacted (numbers or arrays).
+        Returns None"""
+        occupancy_product = np.asarray(occupancy_product)
+        reacted = np.asarray(reacted, dtype = bool)
+        for k, sign in enumerate((1, -1)):
+            attempts = occupancy_product == sign
+            self.reaction_attempts[k] += np.count_nonzero(attempts)
+            self.reactions[k] += np.count_nonzero(attempts & reacted)
+
+    def merge(self, other):
+        """Adds the times and counts of the Profile other to this one.
+        Returns None"""
+        for phase, seconds in other.phase_seconds.items():
+            self.phase_seconds[phase] = (self.phase_seconds.get(phase, 0.0)
+                                         + seconds)
+            self.phase_calls[phase] = (self.phase_calls.get(phase, 0) +
+                                       other.phase_calls[phase])
+        self.proposed          += other.proposed
+        self.accepted          += other.accepted
+        self.reaction_attempts += other.reaction_attempts
+        self.reactions         += other.reactions
+
+    def to_dict(self):
+        """Returns the profile as a JSON serializable dict, with the
+        acceptance and reaction ratios worked out."""
+        def ratio(top, bottom):
+            return [float(t) / b if b else None for t, b in zip(top, bottom)]
+        return {'phase_seconds':     dict(self.phase_seconds),
+                'phase_calls':       dict(self.phase_calls),
+                'molecules':         list(molecules),
+                'proposed':          self.proposed.tolist(),
+                'accepted':          self.accepted.tolist(),
+                'acceptance':        ratio(self.accepted, self.proposed),
+                'enantiomers':       list(enantiomers),
+                'reaction_attempts': self.reaction_attempts.tolist(),
+                'reactions':         self.reactions.tolist(),
+                'reaction_ratio':    ratio(self.reactions,
+                                           self.reaction_attempts)}
+
+    def write(self, file_name):
+        """Writes to_dict to file_name as JSON.
+        Returns None"""
+        with open(file_name, 'w') as out_file:
+            json.dump(self.to_dict(), out_file, indent = 1,
+                      sort_keys = True)
+
+
+def read(file_name):
+    """Returns the dict written by Profile.write."""
+    with open(file_name) as in_file:
+        return json.load(in_file)
@@ -0,0 +1,144 @@
+"""Random number streams for the lattices.
+
+Each lattice gets its own Random_Stream, seeded from a (seed, replica)
+pair, so a run can be regenerated exactly from the seed recorded in its
+output header, and replicas run in parallel have independent streams.
+With numpy >= 1.17 the stream is a numpy.random.Generator seeded by
+SeedSequence(seed, spawn_key = (replica,)) (the same as spawning
+children of SeedSequence(seed)). With older numpy it falls back to a
+RandomState seeded with the seed and replica numbers.
+A lattice that is split over several worker processes (domainlat) gives
+each worker a substream, spawn_key = (replica, substream), which is the
+same as spawning children of the replica's SeedSequence.
+
+Random numbers are handed out from pre-drawn blocks of uniforms, so the
+many small draws a sweep makes don't each cost a call into numpy.
+Integers (directions, orientations, ...) are made from the uniforms."""
+
+import binascii
+import os
+import numpy as np
+
+try:
+    from numpy.random import SeedSequence
+except ImportError:
+    SeedSequence = None
+
+
+def new_seed():
+    """Returns a new random seed (a 63 bit integer) from the operating
+    system, for runs where no seed is given."""
+    return int(binascii.hexlify(os.urandom(8)), 16) >> 1
+
+
+def make_generator(seed, replica = 0, substream = None):
+    """Returns a numpy random generator for the given seed and replica
+    number, and substream number if it is not None. (See the module
+    docstring.)"""
+    spawn_key = (replica,)
+    if substream is not None:
+        spawn_key += (substream,)
+    if SeedSequence is not None:
+        return np.random.Generator(np.random.PCG64(
+            SeedSequence(seed, spawn_key = spawn_key)))
+    # (The substream is offset by one so it differs from no substream.)
+    key = [seed & 0xffffffff, seed >> 32 & 0xffffffff, replica]
+    if substream is not None:
+        key.append(substream + 1)
+    return np.random.RandomState(key)
+
+
+class Random_Stream:
+    """A seeded stream of random numbers for one lattice.
+    uniform, integers, signs and permutation take what they need from
+    pre-drawn blocks of block_size uniforms."""
+
+    def __init__(self, seed = None, replica = 0, block_size = 65536,
+                 substream = None):
+        """Makes the stream for seed (a new one is made if it is None),
+        replica and substream.
+        Syntax: Random_Stream(seed, replica, block_size, substream)
+        Returns None"""
+        if seed is None:
+            seed = new_seed()
+        if type(seed) not in (int, long) or seed < 0:
+            raise ValueError('seed must be a non-negative integer, given %s'
+                             % (seed,))
+        if type(replica) not in (int, long) or replica < 0:
+            raise ValueError('replica must be a non-negative integer, ' +
+                             'given %s' % (replica,))
+        self.seed       = seed
+        self.replica    = replica
+        self.substream  = substream
+        self.block_size = block_size
+        self.generator  = make_generator(seed, replica, substream)
+        if isinstance(self.generator, np.random.RandomState):
+            self.draw = self.generator.random_sample
+        else:
+            self.draw = self.generator.random
+        self.block    = np.zeros(0)
+        self.position = 0
+
+    def uniform(self, shape = None):
+        """Returns uniform random numbers in [0, 1) as an array of
+        shape, or a single float if shape is None.
+        The array may be a view of the block, so it should not be
+        changed in place."""
+        if shape is None:
+            if self.position >= self.block.size:
+                self.refill(1)
+            self.position += 1
+            return float(self.block[self.position - 1])
+        n = int(np.prod(shape))
+        if self.position + n > self.block.size:
+            self.refill(n)
+        out = self.block[self.position:self.position + n]
+        self.position += n
+        return out.reshape(shape)
+
+    def refill(self, n):
+        """Draws a new block, keeping the unused part of the old one,
+        so that at least n uniforms are available.
+        Returns None"""
+        self.block = np.concatenate((self.block[self.position:],
+                                     self.draw(max(n, self.block_size))))
+        self.position = 0
+
+    def integers(self, high, shape = None):
+        """Returns random integers from 0 to high - 1 (inclusive) as an
+        array of shape, or a single int if shape is None."""
+        if shape is None:
+            return int(self.uniform() * high)
+        return (self.uniform(shape) * high).astype(np.intp)
+
+    def signs(self, shape):
+        """Returns an int8 array of shape of random +1 or -1."""
+        return np.where(self.uniform(shape) < 0.5, -1, 1).astype(np.int8)
+
+    def permutation(self, n):
+        """Returns a random permutation of range(n) as an array."""
+        return np.argsort(self.uniform(n), kind = 'mergesort')
+
+    def get_state(self):
+        """Returns the full state of the stream (for example to save in
+        a checkpoint). set_state puts it back."""
+        if isinstance(self.generator, np.random.RandomState):
+            generator_state = self.generator.get_state()
+        else:
+            generator_state = self.generator.bit_generator.state
+        return {'seed':       self.seed,
+                'replica':    self.replica,
+                'generator':  generator_state,
+                'block':      self.block[self.position:].copy()}
+
+    def set_state(self, state):
+        """Sets the stream to a state from get_state.
+        Returns None"""
+        self.seed    = state['seed']
+        self.replica = state['replica']
+        if isinstance(self.generator, np.random.RandomState):
+            self.generator.set_state(state['generator'])
+        else:
+            self.generator.bit_generator.state = state['generator']
+        self.block    = state['block'].copy()
+        self.position = 0
@@ -1,7 +1,18 @@
 #! /usr/bin/env python
 
+import os
 import initializelat as initlat
+import arraylat
+import cachelat
+import checkpointlat
+import convergelat
+import domainlat
+import jitlat
+import kmclat
+import observables
+import trajectory
 from time import strftime
+from timeit import default_timer as timer
 from random import randint
 nowtime = strftime("%Y%m%d%H%M")
 # Output file is named lat_react_out followed by the time, then a random
@@ -9,10 +20,31 @@ nowtime = strftime("%Y%m%d%H%M")
 # the same time. BTW, str.zfill makes the string at least 3 characters long
 # by left filling with zeros.
 output_file_name = ("lat_react_out" + nowtime + str(randint(1,999)).zfill(3))
+# Lattice engines that run_react can use. They all take the same
+# (arguments, size, dimension) and have the same over_sites keywords.
+# 'object' is the original lattice of Lattice_Cell_Objects,
+# 'array' keeps the lattice as numpy planes (see arraylat),
+# 'jit' is the same with compiled sweeps when numba is installed (and
+# the NumPy sweeps when it is not, see jitlat),
+# 'domain' splits the planes over worker processes, one strip of rows
+# each (see domainlat),
+# 'kmc' is rejection-free kinetic Monte Carlo on those planes, where a
+# step is one equivalent sweep (see kmclat).
+backends = {'object': initlat.Lattice,
+            'array':  arraylat.Array_Lattice,
+            'jit':    jitlat.JIT_Lattice,
+            'domain': domainlat.Domain_Lattice,
+            'kmc':    kmclat.KMC_Lattice}
 
 def run_react(arguments = (0.1, 0.1, 2.0, 0.5, 2.0, 0.5, 1.0),
                            steps = 2000, size = 10, sample_int = 20,
-                           dimension = 2):
+                           dimension = 2, backend = 'object',
+                           output_format = 'text', file_name = None,
+                           verbose = True, seed = None, replica = 0,
+                           checkpoint_int = None, checkpoint_file = None,
+                           resume = None, observe_int = None,
+                           observe_names = None, profile = False,
+                           converge = None, cache = None):
     """This function will run a reaction based on the lattice implementation
     defined in initializelat (which depends on laticecellobject).
     This will take arguments of parameters for each cell, number of steps,
@@ -21,47 +53,194 @@ def run_react(arguments = (0.1, 0.1, 2.0, 0.5, 2.0, 0.5, 1.0),
     molecprob, reaction_energy,
     reaction_favoritism, assoc_stabilization,
     assoc_favoritism, excit_prob, beta
-    All arguments are optional. It will return an array of arrays of strings
-    that are the occupancies of the sites"""
+    backend is the name of the lattice engine to use (a key of backends).
+    output_format is 'text' for the brace-delimited format, 'binary' for
+    one state code per site per frame, or 'delta' for keyframes and the
+    sites that changed in between (see trajectory).
+    file_name is the output file, output_file_name if not given.
+    If verbose is False, nothing is printed.
+    seed and replica seed the random numbers of the lattice (see rnglat).
+    If seed is None a new one is picked. Either way it is written in the
+    header of the output so the run can be repeated exactly.
+    If checkpoint_int is given, a checkpoint is written to
+    checkpoint_file (file_name + '.chk' if not given) every checkpoint_int
+    steps (see checkpointlat). It is removed when the run finishes.
+    resume is the name of a checkpoint file to continue from. Then the
+    run parameters are taken from the checkpoint (the ones given here are
+    ignored) and the output file is continued as though the run had never
+    stopped. It keeps writing checkpoints every checkpoint_int steps of
+    the run it continues, unless another checkpoint_int is given.
+    If observe_int is given, the observables observe_names (default
+    observables.default_names) are written every observe_int steps to
+    file_name + '.obs' (see observables). Then sample_int can be large,
+    since full snapshots are only needed now and then.
+    If profile is True, the time of each phase and the move and reaction
+    counts are written to file_name + '.prof' at the end (see profilelat).
+    converge is a dict of the keyword arguments of convergelat.Convergence
+    (names, and optionally window, threshold, tolerance, method,
+    min_step). If it is given (with observe_int), the observables names
+    are tested every observe_int steps, and once they have converged the
+    run stops: the frame of that step is written (even if it is not a
+    multiple of sample_int) and the test is written to file_name +
+    '.conv'.
+    cache is the directory of a result store (see cachelat). If it has
+    the result of the same run (which needs a seed), that is copied to
+    file_name instead of running it, and a run that is done is added to
+    it.
+    All arguments are optional. It will return the name of the output file
+    with the occupancies of the sites"""
+    if resume is not None:
+        checkpoint = checkpointlat.load_checkpoint(resume)
+        run = checkpoint['run']
+        if checkpoint_file is None:
+            checkpoint_file = resume
+        if checkpoint_int is None:
+            checkpoint_int = run.get('checkpoint_int')
+        run['checkpoint_int'] = checkpoint_int
+    else:
+        checkpoint = None
+        if backend not in backends:
+            raise ValueError('backend must be one of %s, given %s' %
+                             (sorted(backends.keys()), backend))
+        if output_format not in trajectory.writers:
+            raise ValueError('output_format must be one of %s, given %s' %
+                             (sorted(trajectory.writers.keys()),
+                              output_format))
+        if file_name is None:
+            file_name = output_file_name
+        run = {'arguments':      arguments,
+               'steps':          steps,
+               'size':           size,
+               'sample_int':     sample_int,
+               'dimension':      dimension,
+               'backend':        backend,
+               'output_format':  output_format,
+               'file_name':      file_name,
+               'seed':           seed,
+               'replica':        replica,
+               'observe_int':    observe_int,
+               'observe_names':  observe_names,
+               'profile':        profile,
+               'converge':       converge,
+               'cache':          cache,
+               'checkpoint_int': checkpoint_int}
+    steps       = run['steps']
+    sample_int  = run['sample_int']
+    file_name   = run['file_name']
+    observe_int = run.get('observe_int')
+    if checkpoint_file is None:
+        checkpoint_file = file_name + '.chk'
+    # Use the stored result, if this run has been done before.
+    if cache is None:
+        cache = run.get('cache')
+    if cache is not None:
+        store = cachelat.Result_Cache(cache)
+        if checkpoint is None and store.fetch(run, file_name):
+            if verbose:
+                print "Copied from %s" % cache
+                print file_name
+            return file_name
+    # Test for stopping early (see convergelat).
+    if run.get('converge'):
+        if not observe_int:
+            raise ValueError('converge needs observe_int')
+        monitor = convergelat.Convergence(**run['converge'])
+        observables.check_names(monitor.names)
+        if checkpoint is not None and checkpoint.get('converge_state'):
+            monitor.set_state(checkpoint['converge_state'])
+    else:
+        monitor = None
     # Initialize lattice:
-    lattice = initlat.Lattice(arguments, size, dimension)
-    # Header for the output file. First human readable format then
-    # in machine readable format.
-    header  = '{{"size:%(size)i","steps:%(steps)i","sample_int:%(samp_int)i"\
-            ,"args:%(argus)s"},\n{%(size)i,%(steps)i,%(samp_int)i}\
-            \n' % {'size': size, 'steps': steps, \
-                    'samp_int': sample_int, 'argus': arguments}
+    lattice = backends[run['backend']](run['arguments'], run['size'],
+                                       run['dimension'], seed = run['seed'],
+                                       replica = run['replica'])
+    # If no seed was given, this is the one the lattice picked.
+    run['seed'] = lattice.seed
+    # (Before any file is opened, so a run that can't record what it
+    # was asked to doesn't leave half of one.)
+    if observe_int:
+        observables.check_names(list(run.get('observe_names') or []) +
+                                (monitor.names if monitor else []),
+                                lattice)
+    if checkpoint is None:
+        first_step     = 0
+        offset         = None
+        observe_offset = None
+    else:
+        lattice.set_state(checkpoint['lattice'])
+        first_step     = checkpoint['step'] + 1
+        offset         = checkpoint['offset']
+        observe_offset = checkpoint.get('observe_offset')
+    # (A resumed lattice already has the profile of its checkpoint.)
+    if run.get('profile') and lattice.get_profile() is None:
+        lattice.enable_profile()
+    prof = lattice.get_profile()
+    if observe_int:
+        recorder = observables.Recorder(file_name + '.obs',
+                                        run.get('observe_names'),
+                                        offset = observe_offset)
+    else:
+        recorder = None
     # Open output file. Using "with" will automatically close the file
     # if an exception occurs and it has to quit.
-    with open(output_file_name, 'w') as out_file:
-        out_file.write(header)
-        for step in xrange(steps + 1):
+    with trajectory.writers[run['output_format']](
+            file_name, run['arguments'], steps, run['size'], sample_int,
+            offset = offset, dimension = run['dimension'],
+            backend = run['backend'], seed = run['seed'],
+            replica = run['replica']) as out_file:
+        for step in xrange(first_step, steps + 1):
             lattice.over_sites('excite')
             lattice.over_sites('react')
             lattice.over_sites('move')
             # sample every sample_int
             # goes to steps + 1 so that it samples the last run
             if step in xrange(0, steps + 1, sample_int):
-                # This is is a numpy array
-                a_sample = lattice.over_sites('sample')
-                # This comma separates the previous entry and then starts the
-                # next. This formatting is done so that it can be easily read
-                # in Mathematica, but the braces are matched so other programs
-                # should be able to read it as well.
-                out_file.write(',{{')
-                # Because a_sample is an np array, the tofile will output the
-                # file to out_file separated by sep
-                a_sample.tofile(out_file, sep = '},{')
-                out_file.write('}}')
+                start = timer()
+                out_file.write_frame(lattice)
+                if prof is not None:
+                    prof.add_time('output', timer() - start)
+            if recorder and (step % observe_int == 0 or step == steps):
+                start = timer()
+                recorder.record(step, lattice)
+                if prof is not None:
+                    prof.add_time('observe', timer() - start)
+            # Stop once the watched observables have converged, with the
+            # frame of this step as the last one.
+            if (monitor and step % observe_int == 0 and step < steps and
+                    monitor.add(step, observables.compute(lattice,
+                                                          monitor.names))):
+                if step % sample_int != 0:
+                    out_file.write_frame(lattice)
+                if verbose:
+                    print "Converged at step %i" % step
+                break
+            # Save everything needed to continue after this step.
+            if checkpoint_int and step % checkpoint_int == 0 and step < steps:
+                checkpointlat.save_checkpoint(
+                    checkpoint_file, run, step, out_file.tell(), lattice,
+                    recorder.tell() if recorder else None,
+                    monitor.get_state() if monitor else None)
             # Print the current number of steps for every tenth, just to keep
             # track and give an estimate of how long it may take to finish.
-            if step in xrange(0, steps, steps / 10):
+            if verbose and step in xrange(0, steps, steps / 10):
                 print step
-        # Final brace matches the open brace remaining.
-        out_file.write('}')
-    print output_file_name
-        
-    
+    if recorder:
+        recorder.close()
+    if prof is not None:
+        lattice.get_profile().write(file_name + '.prof')
+    if monitor:
+        monitor.write(file_name + '.conv')
+    if cache is not None:
+        store.store(run, file_name)
+    # Stop any worker processes of the lattice.
+    if hasattr(lattice, 'close'):
+        lattice.close()
+    # The run is done, so the checkpoint would only be confusing.
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    if verbose:
+        print file_name
+    return file_name
 
 
 # I'm not really sure how this works (don't remember what __name__ or
@@ -71,32 +250,56 @@ if __name__ == "__main__":
     import sys
     import os
     prog_name = os.path.basename(sys.argv[0])
-    usage = "usage: %s [steps, size, " % prog_name + \
-      "sample_int, dimension, arguments]"
+    usage = "usage: %s [--checkpoint N] [--profile] [steps, size, " % \
+      prog_name + \
+      "sample_int, dimension, arguments] or %s --resume " % prog_name + \
+      "checkpoint_file"
+    # --checkpoint N writes a checkpoint every N steps, and
+    # --resume checkpoint_file continues a run from its checkpoint.
+    # --profile writes the phase times and move and reaction counts to
+    # the output file name + '.prof'.
+    # These are taken out before looking at the other arguments.
+    checkpoint_int = None
+    profile = '--profile' in sys.argv
+    if profile:
+        sys.argv.remove('--profile')
+    if '--checkpoint' in sys.argv:
+        where = sys.argv.index('--checkpoint')
+        checkpoint_int = int(sys.argv[where + 1])
+        del sys.argv[where:where + 2]
+    if '--resume' in sys.argv:
+        where = sys.argv.index('--resume')
+        print "Resuming from %s" % sys.argv[where + 1]
+        run_react(resume = sys.argv[where + 1],
+                  checkpoint_int = checkpoint_int)
+        sys.exit()
     #try:
     if   len(sys.argv) == 1:
         # No arguments given
         print "No arguments provided, running with default values"
-        run_react()
+        run_react(checkpoint_int = checkpoint_int, profile = profile)
     elif len(sys.argv) == 8:
         print "Running with the one set of arguments given"
         argums = sys.argv[1:]
-        run_react(arumgs[0:])
+        run_react([float(arg) for arg in argums[0:]],
+                  checkpoint_int = checkpoint_int, profile = profile)
     elif len(sys.argv) == 11:
         print "Running with the 4 arguments given"
         argums = sys.argv[1:]
-        run_react(argums[3:], int(argums[0]), int(argums[1]),
-                  int(argums[2]))
+        run_react([float(arg) for arg in argums[3:]], int(argums[0]),
+                  int(argums[1]), int(argums[2]),
+                  checkpoint_int = checkpoint_int, profile = profile)
     elif len(sys.argv) == 12:
         print "Running with the 5 arguments given"
         argums = sys.argv[1:]
-        run_react(argums[4:],  int(argums[0]), int(argums[1]),
-                  int(argums[2]), int(argums[3]))
+        run_react([float(arg) for arg in argums[4:]], int(argums[0]),
+                  int(argums[1]), int(argums[2]), int(argums[3]),
+                  checkpoint_int = checkpoint_int, profile = profile)
     else:
         print "Weird number of args given (%i), " % len(sys.argv)
         print "running with default values. Usage: "
         print usage
-        run_react()
+        run_react(checkpoint_int = checkpoint_int, profile = profile)
     #except(TypeError), args:
     #    print usage
     #    print args
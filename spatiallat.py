@@ -0,0 +1,315 @@
+#! /usr/bin/env python
+"""Spatial statistics of lattice snapshots: pair correlation functions
+between species (by FFT) and the sizes of clusters of neighbouring
+molecules (by vectorized connected component labelling), for single
+frames or whole trajectories.
+
+Everything works on arrays of state codes (Array_Lattice.state_codes,
+or the frames of a trajectory, see trajectory), with a leading axis for
+a batch of frames, so a chunk of frames is done with one FFT and one
+labelling pass. Boundaries are periodic, as in the lattices.
+
+A species is a set of state codes, named in species (catalyst, htmf,
+htmf_pos, ..., complex for full catalyst-htmf-cinnamate complexes,
+reactant for sites with any of catalyst, htmf or cinnamate).
+The pair correlation of species a and b at distance r is
+g_ab(r) = <a(x) b(x + r)> / (<a> <b>)
+averaged over all x and all offsets r that round to the same distance,
+so it is 1 for no correlation.
+Clusters are sets of sites of one species connected through nearest
+neighbours (the moves of the lattice).
+
+analyse_trajectory writes one line per frame (frame, step, the g_ab(r)
+and the cluster numbers) in the tab separated format of observables,
+after a line with the run parameters, so they can be plotted against
+time and the run parameters directly (see read). The step of each frame
+is from trajectory.frame_steps, so the last frame of a run that was
+stopped once it converged has the step it stopped at."""
+
+import json
+import numpy as np
+import arraylat
+import trajectory
+
+catalyst, htmf, cinna, product = arraylat.state_table.T.astype(int)
+# Masks over state codes of each species.
+species = {'catalyst':    catalyst == 1,
+           'htmf':        htmf != 0,
+           'htmf_pos':    htmf == 1,
+           'htmf_neg':    htmf == -1,
+           'cinna':       cinna != 0,
+           'cinna_pos':   cinna == 1,
+           'cinna_neg':   cinna == -1,
+           'product':     product != 0,
+           'product_pos': product == 1,
+           'product_neg': product == -1,
+           'complex':     catalyst * htmf * cinna != 0,
+           'reactant':    (catalyst != 0) | (htmf != 0) | (cinna != 0)}
+
+# What analyse_trajectory does if not told otherwise.
+default_pairs = [('catalyst', 'htmf'), ('catalyst', 'cinna'),
+                 ('htmf', 'cinna'), ('htmf_pos', 'cinna_pos'),
+                 ('htmf_pos', 'cinna_neg'), ('catalyst', 'catalyst')]
+default_cluster_species = 'reactant'
+
+
+def species_mask(codes, name):
+    """Returns the boolean array (the shape of codes) of the sites of
+    codes that have species name."""
+    if name not in species:
+        raise ValueError('unknown species %s, known are %s' %
+                         (name, sorted(species.keys())))
+    return species[name][codes]
+
+
+def cross_correlation(a, b, dimension):
+    """Returns the periodic cross-correlation <a(x) b(x + r)> (the mean
+    over x) of the arrays a and b, for every offset r, computed with
+    FFTs over the last dimension axes (so a and b can have a leading
+    axis of frames)."""
+    axes = tuple(range(a.ndim - dimension, a.ndim))
+    shape = a.shape[-dimension:]
+    fa = np.fft.rfftn(a, axes = axes)
+    if b is a:
+        fb = fa
+    else:
+        fb = np.fft.rfftn(b, axes = axes)
+    return (np.fft.irfftn(fa.conj() * fb, s = shape, axes = axes) /
+            np.prod(shape))
+
+
+def distance_bins(shape):
+    """Returns the periodic distance from the origin of each offset of a
+    lattice of shape, rounded to the nearest integer (the bin of the
+    offset in radial_average)."""
+    distance2 = np.zeros(shape)
+    for axis, size in enumerate(shape):
+        coord = np.arange(size)
+        coord = np.minimum(coord, size - coord)
+        index = [np.newaxis] * len(shape)
+        index[axis] = slice(None)
+        distance2 = distance2 + (coord**2)[tuple(index)]
+    return np.rint(np.sqrt(distance2)).astype(int)
+
+
+def radial_average(correlation, dimension, max_r, bins = None):
+    """Returns the mean of correlation (from cross_correlation, with or
+    without a leading axis of frames) over the offsets at each distance
+    1 to max_r, as an array of shape (..., max_r). bins is
+    distance_bins of the lattice shape, if that is already made."""
+    shape = correlation.shape[-dimension:]
+    if bins is None:
+        bins = distance_bins(shape)
+    bins = bins.ravel()
+    flat = correlation.reshape(correlation.shape[:-dimension] + (-1,))
+    result = np.empty(flat.shape[:-1] + (max_r,))
+    for r in xrange(1, max_r + 1):
+        in_bin = bins == r
+        if in_bin.any():
+            result[..., r - 1] = flat[..., in_bin].mean(axis = -1)
+        else:
+            result[..., r - 1] = np.nan
+    return result
+
+
+def pair_correlation(codes, name_a, name_b, dimension, max_r,
+                     bins = None):
+    """Returns g_ab(r) (see the module docstring) of species name_a and
+    name_b for r from 1 to max_r, for the state codes codes (the
+    lattice, or a batch of frames with a leading axis), as an array of
+    shape (..., max_r). It is nan where either species is absent."""
+    a = species_mask(codes, name_a).astype(float)
+    if name_b == name_a:
+        b = a
+    else:
+        b = species_mask(codes, name_b).astype(float)
+    lattice_axes = tuple(range(codes.ndim - dimension, codes.ndim))
+    density = (a.mean(axis = lattice_axes) * b.mean(axis = lattice_axes))
+    correlation = radial_average(cross_correlation(a, b, dimension),
+                                 dimension, max_r, bins)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        return correlation / np.asarray(density)[..., np.newaxis]
+
+
+def label_clusters(mask, dimension):
+    """Labels the clusters of True sites of mask (the lattice, or a
+    batch of frames with a leading axis), connected through nearest
+    neighbours with periodic boundaries.
+    All the sites of the batch are linked up at once, by hooking the
+    larger of the labels of each linked pair onto the smaller and then
+    following the labels to their ends, until nothing changes.
+    Returns an integer array the shape of mask with the label of each
+    site (the smallest flat index in its cluster), or -1 where mask is
+    False."""
+    shape = mask.shape[-dimension:]
+    size = shape[0]
+    n_sites = int(np.prod(shape))
+    n_frames = mask.size // n_sites
+    flat_mask = mask.reshape(-1)
+    # Neighbours one step forward along each axis (the ones back are
+    # the same pairs the other way round), for every frame.
+    table = arraylat.neighbour_table(size, dimension)[:, dimension:]
+    offsets = np.arange(n_frames) * n_sites
+    table = (table[np.newaxis] + offsets[:, np.newaxis, np.newaxis])
+    sites = np.arange(flat_mask.size)
+    source = np.repeat(sites, dimension)
+    target = table.reshape(-1)
+    linked = flat_mask[source] & flat_mask[target]
+    source = source[linked]
+    target = target[linked]
+    parent = sites.copy()
+    while True:
+        low  = np.minimum(parent[source], parent[target])
+        high = np.maximum(parent[source], parent[target])
+        differ = low != high
+        if not differ.any():
+            break
+        np.minimum.at(parent, high[differ], low[differ])
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+    labels = np.where(flat_mask, parent, -1)
+    return labels.reshape(mask.shape)
+
+
+def cluster_sizes(labels, dimension):
+    """Returns the list of arrays of the sizes of the clusters in each
+    frame of labels (from label_clusters, with a leading axis of frames
+    or not)."""
+    n_sites = int(np.prod(labels.shape[-dimension:]))
+    n_frames = labels.size // n_sites
+    flat = labels.reshape(-1)
+    flat = flat[flat >= 0]
+    counts = np.bincount(flat, minlength = n_frames * n_sites)
+    roots = np.flatnonzero(counts)
+    frames = roots // n_sites
+    return [counts[roots[frames == k]] for k in xrange(n_frames)]
+
+
+def cluster_statistics(sizes):
+    """Returns the number of clusters, the mean size, the weight average
+    size (the mean size of the cluster a molecule is in) and the largest
+    size of the cluster sizes sizes (all 0 if there are none)."""
+    if not sizes.size:
+        return [0, 0.0, 0.0, 0]
+    sizes = sizes.astype(float)
+    return [int(sizes.size), float(sizes.mean()),
+            float((sizes**2).sum() / sizes.sum()), int(sizes.max())]
+
+# Names of cluster_statistics, for the columns of analyse_trajectory.
+cluster_names = ('n_clusters', 'mean_size', 'weight_size', 'max_size')
+
+
+def analyse_frames(codes, dimension, pairs = None, max_r = 5,
+                   cluster_species = None, bins = None):
+    """Returns the values of analyse_trajectory (the g_ab(r) of each of
+    pairs for r = 1 to max_r, then the cluster_statistics of the
+    clusters of cluster_species) for each of the batch of frames of
+    state codes codes (with a leading axis of frames), as an array of
+    shape (frames, values), and the cluster sizes of each frame.
+    Returns (values, sizes)."""
+    if pairs is None:
+        pairs = default_pairs
+    if cluster_species is None:
+        cluster_species = default_cluster_species
+    columns = [pair_correlation(codes, name_a, name_b, dimension, max_r,
+                                bins) for name_a, name_b in pairs]
+    labels = label_clusters(species_mask(codes, cluster_species),
+                            dimension)
+    sizes = cluster_sizes(labels, dimension)
+    columns.append(np.array([cluster_statistics(frame_sizes)
+                             for frame_sizes in sizes], dtype = float))
+    return np.concatenate(columns, axis = 1), sizes
+
+
+def column_names(pairs, max_r):
+    """Returns the names of the columns of analyse_frames."""
+    names = ['g_%s_%s_%i' % (name_a, name_b, r) for name_a, name_b in pairs
+             for r in xrange(1, max_r + 1)]
+    return names + list(cluster_names)
+
+
+def analyse_trajectory(file_name, out_name = None, pairs = None,
+                       max_r = 5, cluster_species = None, chunk = 64,
+                       every = 1):
+    """Analyses every every-th frame of the trajectory file_name
+    (binary or text) chunk frames at a time, and writes the time series
+    to out_name (file_name + '.spatial' by default): a line '# ' and the
+    run parameters as JSON, a line '# frame step' and the column names,
+    then one line per frame (see analyse_frames). The distribution of
+    cluster sizes over all those frames is written to out_name +
+    '_sizes' (lines of size and number of clusters).
+    Syntax: analyse_trajectory(file_name, out_name, pairs, max_r,
+    cluster_species, chunk, every)
+    Returns out_name."""
+    if pairs is None:
+        pairs = default_pairs
+    if cluster_species is None:
+        cluster_species = default_cluster_species
+    for name in [name for pair in pairs for name in pair] + \
+            [cluster_species]:
+        if name not in species:
+            raise ValueError('unknown species %s, known are %s' %
+                             (name, sorted(species.keys())))
+    if out_name is None:
+        out_name = file_name + '.spatial'
+    frames = trajectory.open_trajectory(file_name)
+    header = dict(frames.header)
+    header['pairs']           = [list(pair) for pair in pairs]
+    header['cluster_species'] = cluster_species
+    header['source']          = file_name
+    dimension  = len(frames.shape)
+    sample_int = header.get('sample_int', 1)
+    bins = distance_bins(frames.shape)
+    size_counts = np.zeros(0, dtype = np.int64)
+    frame_numbers = range(0, len(frames), every)
+    steps = trajectory.frame_steps(file_name, len(frames), sample_int)
+    with open(out_name, 'w') as out_file:
+        out_file.write('# ' + json.dumps(header, sort_keys = True) + '\n')
+        out_file.write('# frame\tstep\t' +
+                       '\t'.join(column_names(pairs, max_r)) + '\n')
+        for first in xrange(0, len(frame_numbers), chunk):
+            numbers = frame_numbers[first:first + chunk]
+            codes = np.array([frames[k] for k in numbers])
+            values, sizes = analyse_frames(codes, dimension, pairs, max_r,
+                                           cluster_species, bins)
+            for k, row in zip(numbers, values):
+                out_file.write('%i\t%i\t' % (k, steps[k]) +
+                               '\t'.join(repr(value) for value in row) +
+                               '\n')
+            counts = np.bincount(np.concatenate(sizes + [[0]]).astype(int))
+            counts[0] = 0
+            if counts.size > size_counts.size:
+                counts[:size_counts.size] += size_counts
+                size_counts = counts
+            else:
+                size_counts[:counts.size] += counts
+    with open(out_name + '_sizes', 'w') as out_file:
+        out_file.write('# size\tclusters\n')
+        for size in np.flatnonzero(size_counts):
+            out_file.write('%i\t%i\n' % (size, size_counts[size]))
+    return out_name
+
+
+def read(file_name):
+    """Reads a file written by analyse_trajectory.
+    Returns (header, values): the run parameters (a dict) and a numpy
+    record array with a field for each column."""
+    with open(file_name) as in_file:
+        header = json.loads(in_file.readline()[1:])
+        names = in_file.readline().lstrip('#').split()
+    return header, np.genfromtxt(file_name, names = names, comments = '#',
+                                 delimiter = '\t')
+
+
+if __name__ == "__main__":
+    import sys
+    import os
+    if len(sys.argv) < 2:
+        print "usage: %s trajectory_file [trajectory_file ...]" % \
+            os.path.basename(sys.argv[0])
+        sys.exit(1)
+    for file_name in sys.argv[1:]:
+        print analyse_trajectory(file_name)
@@ -0,0 +1,241 @@
+#! /usr/bin/env python
+"""Runs many runlat.run_react simulations (a parameter sweep) on a pool
+of processes, and writes one results index (a JSON file) that maps each
+set of parameters and replica to its output file.
+This replaces the batch*.sh job scripts that start each run by hand.
+
+Example, from python:
+    sweeplat.run_sweep(sweeplat.argument_grid(
+                           molecprob = [0.03], reaction_energy = [0.01],
+                           reaction_favoritism = [3.0, 2.0, 1.5, 1.1],
+                           assoc_stabilization = [0.7],
+                           assoc_favoritism = [3.0, 2.0, 1.5, 1.1],
+                           excit_prob = [0.30], beta = [0.7]),
+                       steps = 10000, size = 200, sample_int = 100,
+                       replicas = 2)
+or from the command line:
+    python sweeplat.py 10000 200 100 --replicas 2 --grid
+        molecprob=0.03 reaction_energy=0.01 reaction_favoritism=3,2,1.5,1.1
+        assoc_stabilization=0.7 assoc_favoritism=3,2,1.5,1.1
+        excit_prob=0.3 beta=0.7"""
+
+import itertools
+import json
+import multiprocessing
+import os
+from time import strftime
+import cachelat
+import rnglat
+import runlat
+import trajectory
+
+# Names of the seven parameters in the arguments tuple, in order.
+argument_names = ('molecprob', 'reaction_energy', 'reaction_favoritism',
+                  'assoc_stabilization', 'assoc_favoritism', 'excit_prob',
+                  'beta')
+# Engines (runlat.backends) a sweep can use. 'domain' is left out since
+# it forks its own worker processes, and the workers of the pool are
+# daemonic, so they can't have children.
+sweep_backends = sorted(name for name in runlat.backends
+                        if name != 'domain')
+
+
+def argument_grid(**values):
+    """Returns a list of all the arguments tuples made by taking every
+    combination of the given values for each parameter.
+    Every name in argument_names must be given as a list of values.
+    Syntax: argument_grid(molecprob = [...], ..., beta = [...])
+    Returns a list of tuples of length 7."""
+    missing = [name for name in argument_names if name not in values]
+    if missing:
+        raise ValueError('values needed for all arguments, missing %s' %
+                         missing)
+    extra = [name for name in values if name not in argument_names]
+    if extra:
+        raise ValueError('unknown arguments %s' % extra)
+    return list(itertools.product(*[values[name] for name
+                                     in argument_names]))
+
+
+def run_one(job):
+    """Runs one simulation described by the dict job (the keyword
+    arguments of runlat.run_react, and the number of the replica),
+    in a worker process.
+    Returns the job with the run time added, and whether it was copied
+    from the result store if there is one."""
+    start = os.times()[4]
+    result = dict(job)
+    job = dict(job)
+    # Each run gets its own random stream, from the seed of the sweep
+    # and the number of the run.
+    job['replica'] = job.pop('run')
+    if job.get('cache') is not None:
+        result['cached'] = cachelat.Result_Cache(job['cache']).lookup(
+            job) is not None
+    runlat.run_react(verbose = False, **job)
+    result['arguments'] = list(job['arguments'])
+    result['run_time']  = os.times()[4] - start
+    return result
+
+
+def run_sweep(argument_sets, steps = 2000, size = 10, sample_int = 20,
+              dimension = 2, replicas = 1, backend = 'array',
+              output_format = 'binary', processes = None,
+              out_dir = '.', prefix = None, index_name = None,
+              seed = None, cache = None):
+    """Runs each arguments tuple in argument_sets replicas times, with
+    the given steps, size, sample_int, dimension, backend and
+    output_format (see runlat.run_react), on a pool of processes.
+    backend must be one of sweep_backends.
+    processes is the number of worker processes, by default the number
+    of cores. Runs are handed out one at a time as workers finish, so all
+    cores stay busy even when runs take different amounts of time.
+    Output files are put in out_dir, named prefix (by default
+    lat_react_out followed by the time) then the number of the
+    arguments set and replica.
+    A results index is written to index_name (by default prefix +
+    '_index.json'), and is updated as each run finishes.
+    All runs use seed (a new one if None), each with its own random
+    stream (rnglat replica) given by its number in the sweep, so any run
+    can be repeated from the seed and run number in the index.
+    cache is the directory of a result store (see cachelat): runs that
+    are in it (the same parameters and run number, with the same seed)
+    are copied from it instead of being run, and the others are added to
+    it, so a sweep that overlaps an earlier one with the same seed only
+    runs the new points. For this the random stream of each run is
+    picked from its arguments and replica (cachelat.sweep_replica)
+    instead of its number in the sweep.
+    Syntax: run_sweep(argument_sets, steps, size, sample_int, dimension,
+    replicas, backend, output_format, processes, out_dir, prefix, index_name,
+    seed, cache)
+    Returns the list of entries in the index."""
+    argument_sets = [tuple(arguments) for arguments in argument_sets]
+    for arguments in argument_sets:
+        if len(arguments) != 7:
+            raise ValueError('arguments must be len 7, given %s' %
+                             (arguments,))
+    if replicas < 1:
+        raise ValueError('replicas must be >= 1')
+    if backend not in sweep_backends:
+        raise ValueError('backend must be one of %s in a sweep, given %s' %
+                         (sweep_backends, backend))
+    if prefix is None:
+        prefix = 'lat_react_out' + strftime("%Y%m%d%H%M")
+    if index_name is None:
+        index_name = os.path.join(out_dir, prefix + '_index.json')
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if seed is None:
+        seed = rnglat.new_seed()
+    jobs = []
+    for k, arguments in enumerate(argument_sets):
+        for replica in xrange(replicas):
+            file_name = os.path.join(out_dir, '%s_%03i_r%02i' %
+                                     (prefix, k, replica))
+            run = len(jobs)
+            if cache is not None:
+                run = cachelat.sweep_replica(arguments, replica)
+            jobs.append({'arguments':     arguments,
+                         'steps':         steps,
+                         'size':          size,
+                         'sample_int':    sample_int,
+                         'dimension':     dimension,
+                         'backend':       backend,
+                         'output_format': output_format,
+                         'replica':       replica,
+                         'seed':          seed,
+                         'run':           run,
+                         'file_name':     file_name,
+                         'cache':         cache})
+    index = {'steps':      steps,
+             'size':       size,
+             'sample_int': sample_int,
+             'dimension':  dimension,
+             'seed':       seed,
+             'runs':       []}
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(run_one, jobs):
+            index['runs'].append(result)
+            write_index(index_name, index)
+    finally:
+        pool.close()
+        pool.join()
+    return index['runs']
+
+
+def write_index(index_name, index):
+    """Writes the results index to index_name, first to a temporary file
+    then renamed, so the index file is always complete."""
+    with open(index_name + '.tmp', 'w') as index_file:
+        json.dump(index, index_file, indent = 1, sort_keys = True)
+    os.rename(index_name + '.tmp', index_name)
+
+
+def read_index(index_name):
+    """Returns the list of runs in a results index, each a dict with
+    the arguments, steps, etc. and file_name of the output."""
+    with open(index_name) as index_file:
+        return json.load(index_file)['runs']
+
+
+def parse_grid(items):
+    """Turns command line items like 'beta=0.5,0.7' into the keyword
+    arguments of argument_grid."""
+    values = {}
+    for item in items:
+        name, _, numbers = item.partition('=')
+        values[name] = [float(number) for number in numbers.split(',')]
+    return values
+
+
+def read_argument_file(file_name):
+    """Reads arguments tuples from a file with the seven numbers of one
+    tuple on each line (separated by spaces or commas). Blank lines
+    and lines starting with # are skipped."""
+    argument_sets = []
+    with open(file_name) as arg_file:
+        for line in arg_file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                argument_sets.append(tuple(float(number) for number in
+                                           line.replace(',', ' ').split()))
+    return argument_sets
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description = 'Run a sweep of lattice reactions on all cores.')
+    parser.add_argument('steps', type = int)
+    parser.add_argument('size', type = int)
+    parser.add_argument('sample_int', type = int)
+    parser.add_argument('--dimension', type = int, default = 2)
+    parser.add_argument('--replicas', type = int, default = 1)
+    parser.add_argument('--backend', default = 'array',
+                        choices = sweep_backends)
+    parser.add_argument('--format', dest = 'output_format',
+                        default = 'binary',
+                        choices = sorted(trajectory.writers.keys()))
+    parser.add_argument('--processes', type = int, default = None)
+    parser.add_argument('--out-dir', default = '.')
+    parser.add_argument('--prefix', default = None)
+    parser.add_argument('--index', dest = 'index_name', default = None)
+    parser.add_argument('--seed', type = int, default = None)
+    parser.add_argument('--cache', default = None,
+                        help = 'directory of the result store')
+    sets = parser.add_mutually_exclusive_group(required = True)
+    sets.add_argument('--grid', nargs = '+', metavar = 'NAME=V1,V2',
+                      help = 'values of each of %s' %
+                      ', '.join(argument_names))
+    sets.add_argument('--args-file',
+                      help = 'file with one arguments tuple per line')
+    options = vars(parser.parse_args())
+    grid      = options.pop('grid')
+    args_file = options.pop('args_file')
+    if grid:
+        argument_sets = argument_grid(**parse_grid(grid))
+    else:
+        argument_sets = read_argument_file(args_file)
+    runs = run_sweep(argument_sets, **options)
+    print '%i runs done' % len(runs)
@@ -0,0 +1,209 @@
+"""Tests of the numpy lattice engine (arraylat) and its compiled twin
+(jitlat). Run from the top directory with
+    python -m unittest discover tests"""
+
+import unittest
+import numpy as np
+import arraylat
+import jitlat
+
+arguments = (0.1, 0.375, 2.0, 0.5, 0.5, 0.3, 0.1)
+
+
+def occupied_set(lattice):
+    """Returns the set of sites in the occupied index of lattice."""
+    return set(lattice.occupied().tolist())
+
+
+class Test_States(unittest.TestCase):
+
+    def test_codes_round_trip(self):
+        codes = np.arange(arraylat.n_states, dtype = np.uint8)
+        occupancy = arraylat.decode_states(codes)
+        self.assertTrue((arraylat.encode_states(*occupancy.T) ==
+                         codes).all())
+        self.assertEqual(tuple(arraylat.state_table[arraylat.empty_state]),
+                         (0, 0, 0, 0))
+
+
+class Test_React(unittest.TestCase):
+
+    engines = (arraylat.Array_Lattice, jitlat.JIT_Lattice)
+
+    def test_product_site_keeps_excitation(self):
+        # As in Lattice_Cell_Object.react, a site with product is left
+        # alone, and only the others have their excitation halved.
+        for engine in self.engines:
+            lattice = engine(arguments, 4, seed = 1)
+            configuration = lattice.get_configuration()
+            for name in ('catalyst', 'htmf', 'cinna', 'product'):
+                configuration[name][...] = 0
+            configuration['excitation'][...] = 0.0
+            configuration['catalyst'][0, 0] = 1
+            configuration['product'][0, 0] = 1
+            configuration['excitation'][:, 0, 0] = 1.0
+            configuration['htmf'][1, 1] = 1
+            configuration['excitation'][1, 1, 1] = 1.0
+            lattice.set_configuration(configuration)
+            lattice.over_sites('react')
+            self.assertEqual(lattice.excitation[0, 0, 0], 1.0)
+            self.assertEqual(lattice.excitation[1, 0, 0], 1.0)
+            self.assertEqual(lattice.excitation[1, 1, 1], 0.5)
+
+
+class Test_Index(unittest.TestCase):
+
+    def test_index_follows_sweeps(self):
+        for move_mode in ('checkerboard', 'serial'):
+            lattice = arraylat.Array_Lattice(arguments, 9,
+                                             move_mode = move_mode,
+                                             seed = 2)
+            for step in xrange(50):
+                for kw in ('excite', 'react', 'move'):
+                    lattice.over_sites(kw)
+            occupied = set(np.flatnonzero(lattice.occupied_mask()).tolist())
+            self.assertEqual(occupied_set(lattice), occupied)
+            self.assertEqual(lattice.n_occupied, len(occupied))
+
+    def test_same_seed_same_run(self):
+        runs = []
+        for k in xrange(2):
+            lattice = arraylat.Array_Lattice(arguments, 8, seed = 3)
+            for step in xrange(20):
+                for kw in ('excite', 'react', 'move'):
+                    lattice.over_sites(kw)
+            runs.append(lattice.state_codes())
+        self.assertTrue((runs[0] == runs[1]).all())
+
+
+class Test_Neighbours(unittest.TestCase):
+
+    def test_table_wraps_along_each_axis(self):
+        for dimension in (1, 2, 3):
+            size = 4
+            table = arraylat.neighbour_table(size, dimension)
+            shape = (size,) * dimension
+            self.assertEqual(table.shape, (size**dimension, 2 * dimension))
+            # Stepping back then forward along an axis comes home.
+            sites = np.arange(size**dimension)
+            for axis in xrange(dimension):
+                self.assertTrue((table[table[:, axis], dimension + axis] ==
+                                 sites).all())
+            # The last site of a row steps forward to the first of the
+            # same row, not on to the next row.
+            last = np.ravel_multi_index((size - 1,) * dimension, shape)
+            self.assertEqual(
+                table[last, 2 * dimension - 1],
+                np.ravel_multi_index((size - 1,) * (dimension - 1) + (0,),
+                                     shape))
+
+    def test_any_dimension_runs(self):
+        for dimension in (1, 3):
+            lattice = arraylat.Array_Lattice(arguments, 5, dimension,
+                                             seed = 8)
+            self.assertEqual(lattice.state_codes().shape, (5,) * dimension)
+            for step in xrange(20):
+                for kw in ('excite', 'react', 'move'):
+                    lattice.over_sites(kw)
+            occupied = set(np.flatnonzero(lattice.occupied_mask()).tolist())
+            self.assertEqual(occupied_set(lattice), occupied)
+
+
+def jit_lattice(size, seed, compiled = True):
+    """Returns a JIT_Lattice that runs its kernels if compiled is True
+    (compiled with numba if it is there, or else as plain Python), or the
+    NumPy sweeps of Array_Lattice if not."""
+    lattice = jitlat.JIT_Lattice(arguments, size, seed = seed)
+    lattice.compiled = compiled
+    return lattice
+
+
+def xoroshiro_uniforms(state, n):
+    """Returns n uniforms of xoroshiro128+ from the two word state,
+    worked out with Python integers."""
+    mask = 2**64 - 1
+    s0, s1 = [int(word) for word in state]
+    uniforms = []
+    for k in xrange(n):
+        uniforms.append(((s0 + s1) & mask) >> 11)
+        s1 ^= s0
+        s0 = (((s0 << 24) | (s0 >> 40)) ^ s1 ^ (s1 << 16)) & mask
+        s1 = ((s1 << 37) | (s1 >> 27)) & mask
+    return [uniform / 2.0**53 for uniform in uniforms]
+
+
+class Test_JIT(unittest.TestCase):
+
+    def test_next_uniform(self):
+        state = np.array([12345678901234567, 98765432109876543],
+                         dtype = np.uint64)
+        expected = xoroshiro_uniforms(state, 20)
+        self.assertEqual([jitlat.next_uniform(state) for k in xrange(20)],
+                         expected)
+
+    def test_index_follows_sweeps(self):
+        # The kernels and the NumPy sweeps alike.
+        for compiled in (True, False):
+            lattice = jit_lattice(9, 4, compiled)
+            for step in xrange(50):
+                for kw in ('excite', 'react', 'move'):
+                    lattice.over_sites(kw)
+            occupied = set(np.flatnonzero(lattice.occupied_mask()).tolist())
+            self.assertEqual(occupied_set(lattice), occupied, compiled)
+            self.assertEqual(lattice.n_occupied, len(occupied))
+            self.assertTrue(lattice.product.any(), compiled)
+
+    def test_moves_keep_the_molecules(self):
+        for compiled in (True, False):
+            lattice = jit_lattice(10, 5, compiled)
+            lattice.over_sites('excite')
+            # (A move can flip the hand of htmf or cinna, -1 or 1.)
+            counts = [np.abs(plane).sum() for plane in lattice.flat_planes]
+            excitation = lattice.flat_excitation.sum(axis = 1)
+            lattice.enable_profile()
+            for step in xrange(20):
+                lattice.over_sites('move')
+            self.assertEqual([np.abs(plane).sum()
+                              for plane in lattice.flat_planes],
+                             counts)
+            self.assertTrue(excitation.any())
+            self.assertTrue((lattice.flat_excitation.sum(axis = 1) ==
+                             excitation).all())
+            profile = lattice.get_profile()
+            self.assertTrue(profile.accepted.sum() > 0)
+            self.assertTrue((profile.accepted <= profile.proposed).all())
+
+    def test_kernels_react(self):
+        lattice = jit_lattice(10, 6)
+        lattice.enable_profile()
+        for step in xrange(30):
+            for kw in ('excite', 'react', 'move'):
+                lattice.over_sites(kw)
+        profile = lattice.get_profile()
+        self.assertTrue(profile.reactions.sum() > 0)
+        self.assertTrue((profile.reactions <=
+                         profile.reaction_attempts).all())
+        self.assertEqual(profile.reactions.sum(),
+                         np.abs(lattice.product).sum())
+
+    def test_state_round_trip(self):
+        lattice = jit_lattice(8, 6)
+        for step in xrange(10):
+            for kw in ('excite', 'react', 'move'):
+                lattice.over_sites(kw)
+        state = lattice.get_state()
+        for step in xrange(10):
+            for kw in ('excite', 'react', 'move'):
+                lattice.over_sites(kw)
+        resumed = jit_lattice(8, 7)
+        resumed.set_state(state)
+        for step in xrange(10):
+            for kw in ('excite', 'react', 'move'):
+                resumed.over_sites(kw)
+        self.assertTrue((resumed.state_codes() ==
+                         lattice.state_codes()).all())
+        self.assertTrue((resumed.excitation == lattice.excitation).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
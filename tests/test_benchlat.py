@@ -0,0 +1,111 @@
+"""Tests of the sweep throughput benchmarks (benchlat). Run from the top
+directory with
+    python -m unittest discover tests"""
+
+import copy
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import benchlat
+
+# A matrix small enough to run in a moment (2 sweeps of each case take
+# far less than min_time).
+tiny = {'sizes': [4, 6], 'molecprobs': [0.1], 'betas': [1.0],
+        'min_time': 1.0, 'max_sweeps': 2, 'verbose': False}
+
+
+class Test_Benchmarks(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'bench.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_results_file(self):
+        results = benchlat.run_benchmarks(['array', 'kmc'],
+                                          max_slow_size = 4,
+                                          file_name = self.file_name, **tiny)
+        self.assertEqual(benchlat.read_results(self.file_name), results)
+        self.assertFalse(os.path.exists(self.file_name + '.tmp'))
+        for name in ('date', 'cpu_count', 'python', 'numpy', 'numba',
+                     'commit'):
+            self.assertTrue(name in results['machine'], name)
+        cases = sorted(set((record['engine'], record['size'])
+                           for record in results['records']))
+        # (kmc is one of the slow engines, so not run above size 4.)
+        self.assertEqual(cases, [('array', 4), ('array', 6), ('kmc', 4)])
+        for engine, size in cases:
+            phases = [record['phase'] for record in results['records']
+                      if (record['engine'], record['size']) ==
+                      (engine, size)]
+            self.assertEqual(phases, ['excite', 'react', 'move', 'sweep',
+                                      'run_react'])
+        for record in results['records']:
+            self.assertEqual(record['n_sites'], record['size']**2)
+            self.assertEqual(record['sweeps'], 2 if record['phase'] !=
+                             'run_react' else 3)
+            self.assertTrue(record['sites_per_second'] > 0)
+            self.assertAlmostEqual(record['seconds_per_sweep'] *
+                                   record['sites_per_second'],
+                                   record['n_sites'])
+        self.assertRaises(ValueError, benchlat.run_benchmarks, ['nothing'],
+                          **tiny)
+
+    def test_at_least_one_sweep(self):
+        arguments = (0.1,) + benchlat.base_arguments[1:6] + (1.0,)
+        lattice = benchlat.engines['array'](arguments, 4, 2, seed = 1)
+        sweeps, seconds = benchlat.time_phases(lattice, min_time = 0.0)
+        self.assertEqual(sweeps, 1)
+        self.assertEqual(sorted(seconds), sorted(benchlat.phases))
+
+    def test_compare_finds_regressions(self):
+        results = benchlat.run_benchmarks(['array'], **tiny)
+        baseline = copy.deepcopy(results)
+        self.assertEqual(benchlat.compare(results, baseline), [])
+        # One case was twice as fast before, one only a little faster,
+        # and one is not in the baseline at all.
+        faster, little, missing = baseline['records'][:3]
+        faster['sites_per_second'] *= 2.0
+        little['sites_per_second'] *= 1.05
+        missing['phase'] = 'something else'
+        slower = benchlat.compare(results, baseline, tolerance = 0.1)
+        self.assertEqual(len(slower), 1)
+        key, base_rate, rate, ratio = slower[0]
+        self.assertEqual(key, benchlat.record_key(faster))
+        self.assertAlmostEqual(ratio, 0.5)
+        self.assertEqual(len(benchlat.compare(results, baseline,
+                                              tolerance = 0.01)), 2)
+
+    def test_command_line_exit_status(self):
+        # Exits with 1 against a baseline it is much slower than, and 0
+        # against one it isn't.
+        baseline = benchlat.run_benchmarks(['array'], **tiny)
+        slow_name = os.path.join(self.directory, 'slow.json')
+        fast_name = os.path.join(self.directory, 'fast.json')
+        for record in baseline['records']:
+            record['sites_per_second'] *= 1e-6
+        benchlat.write_results(slow_name, baseline)
+        for record in baseline['records']:
+            record['sites_per_second'] *= 1e12
+        benchlat.write_results(fast_name, baseline)
+        command = [sys.executable, benchlat.__file__.replace('.pyc', '.py'),
+                   '--engines', 'array', '--sizes', '4', '--molecprobs',
+                   '0.1', '--betas', '1.0', '--min-time', '0',
+                   '--max-sweeps', '2', '--out', self.file_name,
+                   '--baseline']
+        with open(os.devnull, 'w') as null:
+            self.assertEqual(subprocess.call(command + [fast_name],
+                                             stdout = null), 1)
+            self.assertEqual(subprocess.call(command + [slow_name],
+                                             stdout = null,
+                                             stderr = null), 0)
+        self.assertTrue(os.path.exists(self.file_name))
+
+
+if __name__ == '__main__':
+    unittest.main()
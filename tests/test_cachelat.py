@@ -0,0 +1,82 @@
+"""Tests of the result store (cachelat). Run from the top directory with
+    python -m unittest discover tests"""
+
+import filecmp
+import os
+import shutil
+import tempfile
+import unittest
+import cachelat
+import jitlat
+import runlat
+
+arguments = (0.1, 0.375, 2.0, 0.5, 0.5, 0.3, 0.1)
+
+
+class Test_Cache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = os.path.join(self.directory, 'cache')
+        self.have_numba = jitlat.have_numba
+
+    def tearDown(self):
+        jitlat.have_numba = self.have_numba
+        shutil.rmtree(self.directory)
+
+    def run_react(self, name, **keywords):
+        """Runs a small run_react with the store, to file name in the
+        temporary directory.
+        Returns the file name."""
+        run = {'steps': 20, 'size': 5, 'sample_int': 10,
+               'backend': 'array', 'output_format': 'binary',
+               'verbose': False, 'seed': 1, 'cache': self.cache,
+               'file_name': os.path.join(self.directory, name)}
+        run.update(keywords)
+        return runlat.run_react(arguments, **run)
+
+    def test_hit_copies_every_file(self):
+        keywords = {'observe_int': 5, 'profile': True,
+                    'converge': {'names': ['free_catalyst'],
+                                 'window': 2}}
+        first = self.run_react('first', **keywords)
+        store = cachelat.Result_Cache(self.cache)
+        self.assertEqual(len(store.entries()), 1)
+        second = self.run_react('second', **keywords)
+        # (A hit is not stored again.)
+        self.assertEqual(len(store.entries()), 1)
+        for suffix in ('', '.obs', '.conv', '.prof'):
+            self.assertTrue(filecmp.cmp(first + suffix, second + suffix,
+                                        shallow = False), suffix)
+
+    def test_key_has_the_files(self):
+        # A run without a profile doesn't stand in for one with it.
+        self.run_react('plain')
+        profiled = self.run_react('profiled', profile = True)
+        self.assertTrue(os.path.exists(profiled + '.prof'))
+        self.assertEqual(len(cachelat.Result_Cache(self.cache).entries()),
+                         2)
+
+    def test_key_has_numba_for_jit(self):
+        run = {'arguments': arguments, 'steps': 20, 'size': 5,
+               'sample_int': 10, 'seed': 1}
+        keys = {}
+        for have_numba in (True, False):
+            jitlat.have_numba = have_numba
+            for backend in ('array', 'jit'):
+                run['backend'] = backend
+                keys[backend, have_numba] = cachelat.key_hash(
+                    cachelat.run_key(run))
+        self.assertEqual(keys['array', True], keys['array', False])
+        self.assertNotEqual(keys['jit', True], keys['jit', False])
+
+    def test_no_seed_is_not_looked_up(self):
+        run = {'arguments': arguments, 'steps': 20, 'size': 5,
+               'sample_int': 10, 'seed': None}
+        store = cachelat.Result_Cache(self.cache)
+        self.assertEqual(store.lookup(run), None)
+        self.assertRaises(ValueError, store.store, run, 'anything')
+
+
+if __name__ == '__main__':
+    unittest.main()
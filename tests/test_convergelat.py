@@ -0,0 +1,86 @@
+"""Tests of the convergence test for stopping runs early (convergelat).
+Run from the top directory with
+    python -m unittest discover tests"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import convergelat
+import runlat
+
+
+def first_converged(monitor, values):
+    """Adds the rows of values to monitor one step at a time.
+    Returns the first step it converged at, or None."""
+    for step, row in enumerate(values):
+        if monitor.add(step, row):
+            return step
+    return None
+
+
+class Test_Convergence(unittest.TestCase):
+
+    def test_zero_signal_does_not_converge(self):
+        # Nothing has happened yet, so there is nothing to converge.
+        monitor = convergelat.Convergence(['product_pos', 'product_neg'],
+                                          window = 5)
+        self.assertEqual(first_converged(monitor, np.zeros((100, 2))),
+                         None)
+        self.assertEqual(monitor.summary()['started'], [False, False])
+
+    def test_plateau_converges(self):
+        monitor = convergelat.Convergence(['product_pos'], window = 5)
+        values = np.minimum(np.arange(100), 30)[:, np.newaxis]
+        # (By the time the last window is all 30 at the latest.)
+        self.assertTrue(30 < first_converged(monitor, values) <= 39)
+
+    def test_noise_converges_and_trend_does_not(self):
+        stream = np.random.RandomState(1)
+        for method in convergelat.methods:
+            monitor = convergelat.Convergence(['a'], window = 20,
+                                              method = method)
+            noise = 10 + stream.normal(size = (200, 1))
+            self.assertTrue(first_converged(monitor, noise) is not None)
+            monitor = convergelat.Convergence(['a'], window = 20,
+                                              method = method)
+            trend = np.arange(200.0)[:, np.newaxis]
+            self.assertEqual(first_converged(monitor, trend), None)
+
+    def test_min_step(self):
+        monitor = convergelat.Convergence(['a'], window = 5,
+                                          min_step = 50)
+        self.assertEqual(first_converged(monitor, np.ones((100, 1))), 50)
+        self.assertRaises(ValueError, convergelat.Convergence, ['a'],
+                          min_step = -1)
+
+
+class Test_Run(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_run_without_product_runs_to_the_end(self):
+        # So little reacts that no product is made in the run, which
+        # must not count as the product counts having converged.
+        file_name = os.path.join(self.directory, 'run')
+        runlat.run_react((0.02, 3.0, 2.0, 0.5, 2.0, 0.01, 1.0),
+                         steps = 250, size = 20, sample_int = 50,
+                         backend = 'array', file_name = file_name,
+                         verbose = False, seed = 1, observe_int = 5,
+                         converge = {'names': ['product_pos',
+                                               'product_neg']})
+        with open(file_name + '.conv') as conv_file:
+            summary = json.load(conv_file)
+        self.assertFalse(summary['converged'])
+        self.assertEqual(summary['mean_last'], [0.0, 0.0])
+        self.assertEqual(summary['step'], 245)
+
+
+if __name__ == '__main__':
+    unittest.main()
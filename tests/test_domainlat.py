@@ -0,0 +1,62 @@
+"""Tests of the domain decomposed lattice (domainlat). Run from the top
+directory with
+    python -m unittest discover tests"""
+
+import unittest
+import numpy as np
+import domainlat
+
+arguments = (0.1, 0.375, 2.0, 0.5, 0.5, 0.3, 0.1)
+
+
+class Test_Index(unittest.TestCase):
+
+    def setUp(self):
+        self.lattices = []
+
+    def tearDown(self):
+        for lattice in self.lattices:
+            lattice.close()
+
+    def make_lattice(self, seed):
+        lattice = domainlat.Domain_Lattice(arguments, 9, seed = seed,
+                                           processes = 3)
+        self.lattices.append(lattice)
+        return lattice
+
+    def test_index_follows_sweeps(self):
+        lattice = self.make_lattice(1)
+        for sweep in xrange(30):
+            for keyword in ('excite', 'react', 'move'):
+                lattice.over_sites(keyword)
+            occupied = set(np.flatnonzero(lattice.occupied_mask()))
+            self.assertEqual(set(lattice.occupied().tolist()), occupied)
+        # Each worker's index has the occupied sites of its strip, and
+        # after its moves (not just after the parent asks) too.
+        lattice.over_sites('move')
+        occupied = np.flatnonzero(lattice.occupied_mask())
+        bounds = lattice.strip_bounds
+        for k, strip in enumerate(lattice.command('occupied')):
+            self.assertEqual(set(strip.tolist()),
+                             set(occupied[(occupied >= bounds[k]) &
+                                          (occupied < bounds[k + 1])]))
+
+    def test_state_round_trip(self):
+        lattice = self.make_lattice(2)
+        for sweep in xrange(5):
+            lattice.over_sites('move')
+        state = lattice.get_state()
+        for sweep in xrange(5):
+            lattice.over_sites('move')
+        resumed = self.make_lattice(3)
+        resumed.set_state(state)
+        for sweep in xrange(5):
+            resumed.over_sites('move')
+        self.assertTrue((resumed.state_codes() ==
+                         lattice.state_codes()).all())
+        self.assertEqual(set(resumed.occupied().tolist()),
+                         set(lattice.occupied().tolist()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""Tests of ensembles of replicas advanced together (ensemblelat). Run
+from the top directory with
+    python -m unittest discover tests"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+import numpy as np
+import arraylat
+import ensemblelat
+import observables
+import trajectory
+
+arguments = (0.1, 0.375, 2.0, 0.5, 0.5, 0.3, 0.1)
+
+
+class Test_Ensemble(unittest.TestCase):
+
+    def test_replicas_are_apart(self):
+        lattice = ensemblelat.Ensemble_Lattice(arguments, 4, replicas = 3,
+                                               seed = 1)
+        table = lattice.neighbour_table
+        self.assertEqual(table.shape[0], 3 * 4**2)
+        replica = np.arange(table.shape[0]) // lattice.replica_sites
+        self.assertTrue((table // lattice.replica_sites ==
+                         replica[:, np.newaxis]).all())
+        # Each replica's table is that of a lattice on its own.
+        self.assertTrue((table[lattice.replica_sites:
+                               2 * lattice.replica_sites] -
+                         lattice.replica_sites ==
+                         arraylat.neighbour_table(4, 2)).all())
+
+    def test_histograms_match_views(self):
+        lattice = ensemblelat.Ensemble_Lattice(arguments, 6, replicas = 3,
+                                               seed = 2)
+        counts = [[np.abs(plane[k]).sum() for plane in
+                   (lattice.catalyst, lattice.htmf, lattice.cinna)]
+                  for k in xrange(3)]
+        for step in xrange(20):
+            lattice.over_sites('move')
+        histograms = lattice.replica_histograms()
+        for k in xrange(3):
+            view = lattice.view(k)
+            self.assertTrue((histograms[k] == view.state_histogram()).all())
+            self.assertTrue((view.state_codes() ==
+                             lattice.state_codes()[k]).all())
+            # Nothing moves from one replica to another.
+            self.assertEqual([np.abs(plane[k]).sum() for plane in
+                              (lattice.catalyst, lattice.htmf,
+                               lattice.cinna)], counts[k])
+        self.assertRaises(ValueError, lattice.view, 3)
+
+    def test_replicas_have_their_own_group_order(self):
+        lattice = ensemblelat.Ensemble_Lattice(arguments, 4, replicas = 3,
+                                               seed = 5)
+        groups = []
+        group_sources = lattice.group_sources
+        def recording_group_sources(direc, s_class):
+            groups.append(3 * direc + s_class)
+            return group_sources(direc, s_class)
+        lattice.group_sources = recording_group_sources
+        lattice.over_sites('move')
+        n_groups = lattice.max_move * 3
+        orders = np.array(groups).T
+        self.assertEqual(orders.shape, (3, n_groups))
+        for order in orders:
+            self.assertEqual(sorted(order), range(n_groups))
+        self.assertFalse((orders == orders[0]).all())
+        occupied = set(np.flatnonzero(lattice.occupied_mask()).tolist())
+        self.assertEqual(set(lattice.occupied().tolist()), occupied)
+
+
+class Test_Run(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_files_of_each_replica(self):
+        file_name = os.path.join(self.directory, 'ensemble')
+        file_names = ensemblelat.run_ensemble(
+            arguments, replicas = 2, steps = 20, size = 5, sample_int = 10,
+            output_format = 'binary', file_name = file_name,
+            verbose = False, seed = 3, observe_int = 10,
+            observe_names = ['free_catalyst', 'complex_pos'])
+        self.assertEqual(file_names, [file_name + '_r00',
+                                      file_name + '_r01'])
+        values = []
+        for k, name in enumerate(file_names):
+            frames = trajectory.Trajectory(name)
+            self.assertEqual(len(frames), 3)
+            self.assertEqual(frames.header['replica'], k)
+            self.assertEqual(frames.header['seed'], 3)
+            values.append(observables.read(name + '.obs'))
+        mean = observables.read(file_name + '_mean.obs')
+        self.assertEqual(list(mean['step']), [0, 10, 20])
+        for name in ('free_catalyst', 'complex_pos'):
+            self.assertTrue(np.allclose(mean[name],
+                                        (values[0][name] +
+                                         values[1][name]) / 2.0))
+
+    def test_few_steps_verbose(self):
+        # (Fewer than 10 steps, so a tenth of them is 0.)
+        file_name = os.path.join(self.directory, 'short')
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            ensemblelat.run_ensemble(arguments, replicas = 2, steps = 5,
+                                     size = 4, sample_int = 5,
+                                     file_name = file_name, seed = 4)
+            printed = sys.stdout.getvalue().split()
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(printed, ['0', '1', '2', '3', '4', file_name])
+
+
+if __name__ == '__main__':
+    unittest.main()
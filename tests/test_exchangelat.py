@@ -0,0 +1,104 @@
+"""Tests of replica exchange over beta (exchangelat). Run from the top
+directory with
+    python -m unittest discover tests"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import arraylat
+import exchangelat
+import observables
+import trajectory
+
+arguments = (0.1, 0.375, 2.0, 0.5, 0.5, 0.3, 0.1)
+
+
+class Always:
+    """Stands in for the exchange's random stream, so every swap is
+    accepted."""
+
+    def uniform(self):
+        return 0.0
+
+
+def total_energy(lattice, codes):
+    """Returns beta * E of the configuration with state codes codes, at
+    the beta of lattice."""
+    return lattice.energy_table[codes].sum()
+
+
+class Test_Delta(unittest.TestCase):
+
+    def test_delta_of_energies(self):
+        lattices = [arraylat.Array_Lattice(
+                        exchangelat.beta_arguments(arguments, beta), 8,
+                        seed = 1, replica = k)
+                    for k, beta in enumerate((0.1, 0.4))]
+        for lattice in lattices:
+            for step in xrange(10):
+                lattice.over_sites('move')
+        codes = [lattice.state_codes() for lattice in lattices]
+        i, j = lattices
+        delta = (total_energy(i, codes[1]) + total_energy(j, codes[0]) -
+                 total_energy(i, codes[0]) - total_energy(j, codes[1]))
+        self.assertAlmostEqual(exchangelat.exchange_delta(
+            observables.state_histogram(i), observables.state_histogram(j),
+            i.energy_table, j.energy_table), delta)
+        self.assertEqual(exchangelat.beta_arguments(arguments, 0.4)[6], 0.4)
+
+
+class Test_Exchange(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'rex')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_swaps_move_configurations(self):
+        rex = exchangelat.Replica_Exchange(arguments, [0.1, 0.2, 0.3],
+                                           steps = 10, size = 6,
+                                           output_format = 'binary',
+                                           file_name = self.file_name,
+                                           seed = 2)
+        try:
+            rex.rng = Always()
+            rex.run_steps(0, 5)
+            before = rex.command('get_configuration')
+            # The even pair, then the odd one.
+            self.assertEqual(rex.exchange(), [(0, 1)])
+            after = rex.command('get_configuration')
+            for k, l in ((0, 1), (1, 0), (2, 2)):
+                for name in before[k]:
+                    self.assertTrue((after[l][name] ==
+                                     before[k][name]).all(), (k, name))
+            self.assertEqual(rex.exchange(), [(1, 2)])
+            self.assertEqual(list(rex.attempts), [1, 1])
+            self.assertEqual(list(rex.acceptance()), [1.0, 1.0])
+        finally:
+            rex.close()
+
+    def test_run_exchange(self):
+        file_names = exchangelat.run_exchange(
+            arguments, [0.1, 0.2], steps = 20, size = 5, sample_int = 10,
+            exchange_int = 5, output_format = 'binary',
+            file_name = self.file_name, verbose = False, seed = 3)
+        self.assertEqual(file_names, [self.file_name + '_beta0.1',
+                                      self.file_name + '_beta0.2'])
+        for k, name in enumerate(file_names):
+            frames = trajectory.Trajectory(name)
+            self.assertEqual(len(frames), 3)
+            self.assertEqual(frames.header['replica'], k)
+            self.assertEqual(frames.header['arguments'][6], (0.1, 0.2)[k])
+        log = exchangelat.read_log(self.file_name + '.rex')
+        self.assertEqual(log.dtype.names, ('step', '0.1-0.2'))
+        self.assertEqual(list(log['step']), [4, 9, 14, 19])
+        self.assertTrue(((log['0.1-0.2'] >= 0) &
+                         (log['0.1-0.2'] <= 1)).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Tests of the lattice of site objects (initializelat)."""
+
+import unittest
+import initializelat
+
+arguments = (0.1, 0.375, 2.0, 0.5, 0.5, 0.3, 0.1)
+
+
+def run_steps(lattice, steps):
+    """Runs steps sweeps of lattice, as runlat.run_react does."""
+    for step in xrange(steps):
+        for kw in ('excite', 'react', 'move'):
+            lattice.over_sites(kw)
+
+
+class Test_Streams(unittest.TestCase):
+
+    def test_lattices_are_independent(self):
+        # A lattice run on its own and one run in turn with another
+        # lattice in the same process give the same result.
+        alone = initializelat.Lattice(arguments, 6, seed = 4)
+        run_steps(alone, 10)
+        lattice = initializelat.Lattice(arguments, 6, seed = 4)
+        other   = initializelat.Lattice(arguments, 6, seed = 5)
+        for step in xrange(10):
+            run_steps(lattice, 1)
+            run_steps(other, 1)
+        self.assertTrue((lattice.state_codes() == alone.state_codes()).all())
+
+    def test_state_round_trip(self):
+        lattice = initializelat.Lattice(arguments, 6, seed = 6)
+        run_steps(lattice, 3)
+        state = lattice.get_state()
+        run_steps(lattice, 5)
+        expected = lattice.state_codes()
+        lattice.set_state(state)
+        run_steps(lattice, 5)
+        self.assertTrue((lattice.state_codes() == expected).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""Tests of the kinetic Monte Carlo engine (kmclat). Run from the top
+directory with
+    python -m unittest discover tests"""
+
+import unittest
+import numpy as np
+import arraylat
+import kmclat
+
+arguments = (0.1, 0.1, 2.0, 0.5, 2.0, 0.5, 1.0)
+
+
+def occupied_set(lattice):
+    """Returns the set of sites in the occupied index of lattice."""
+    return set(lattice.occupied().tolist())
+
+
+class Test_Events(unittest.TestCase):
+
+    def test_index_follows_events(self):
+        # Moves can empty a site that was occupied (a catalyst moving on
+        # to a site with only htmf, say), and the index has to follow.
+        lattice = kmclat.KMC_Lattice(arguments, 9, seed = 1)
+        for sweep in xrange(200):
+            lattice.over_sites('move')
+        self.assertEqual(occupied_set(lattice),
+                         set(np.flatnonzero(lattice.occupied_mask())))
+        self.assertEqual(lattice.n_occupied, len(occupied_set(lattice)))
+
+    def test_rates_follow_events(self):
+        # The rates updated event by event are the same as working them
+        # all out again.
+        lattice = kmclat.KMC_Lattice(arguments, 12, seed = 2)
+        for sweep in xrange(20):
+            lattice.over_sites('move')
+        rates = lattice.site_rates().copy()
+        self.assertTrue(rates.any())
+        lattice.reset_events()
+        self.assertTrue((lattice.site_rates() == rates).all())
+
+    def test_state_round_trip(self):
+        lattice = kmclat.KMC_Lattice(arguments, 10, seed = 3)
+        for sweep in xrange(10):
+            lattice.over_sites('move')
+        state = lattice.get_state()
+        for sweep in xrange(10):
+            lattice.over_sites('move')
+        resumed = kmclat.KMC_Lattice(arguments, 10, seed = 4)
+        resumed.set_state(state)
+        for sweep in xrange(10):
+            resumed.over_sites('move')
+        self.assertEqual(resumed.time, lattice.time)
+        self.assertTrue((resumed.state_codes() ==
+                         lattice.state_codes()).all())
+        self.assertTrue((resumed.excitation == lattice.excitation).all())
+
+
+class Test_Moves(unittest.TestCase):
+
+    # (to, fr, to excitation, from excitation) of the moves tried: a
+    # complex moving into an empty site, a catalyst moving on to htmf
+    # and catalysts with different excitations.
+    moves = (((0, 0, 0, 0), (1, 1, 1, 0), (0, 0), (1, 0)),
+             ((0, 1, 0, 0), (1, 0, 0, 0), (0, 0), (0, 0)),
+             ((1, 0, -1, 0), (1, 1, 0, 0), (0, 0), (1, 1)))
+    n_pairs = 20000
+
+    def sweep_moves(self, to, fr, to_excit, from_excit):
+        """Returns the outcomes of n_pairs move attempts of
+        Array_Lattice.accept_moves, as a list of (to, fr, to_excit,
+        from_excit) tuples."""
+        lattice = arraylat.Array_Lattice(arguments, 200, seed = 5)
+        target = np.arange(0, 2 * self.n_pairs, 2)
+        source = target + 1
+        for sites, code, excit in ((target, to, to_excit),
+                                   (source, fr, from_excit)):
+            for m in xrange(4):
+                lattice.flat_planes[m][sites] = arraylat.state_table[code,
+                                                                     m]
+            lattice.flat_excitation[:, sites] = np.array(excit)[:,
+                                                                np.newaxis]
+        lattice.accept_moves(target, source)
+        to_after = lattice.state_codes().ravel()[target]
+        fr_after = lattice.state_codes().ravel()[source]
+        excitation = lattice.flat_excitation != 0
+        return zip(to_after, fr_after,
+                   zip(*excitation[:, target]), zip(*excitation[:, source]))
+
+    def test_moves_match_sweep(self):
+        # A move event changes something with the chance a move attempt
+        # of the sweeps does, and then has the same outcomes.
+        lattice = kmclat.KMC_Lattice(arguments, 4, seed = 6)
+        for to_state, from_state, to_excit, from_excit in self.moves:
+            to = arraylat.encode_states(*to_state)
+            fr = arraylat.encode_states(*from_state)
+            start = (to, fr, tuple(to_excit), tuple(from_excit))
+            changed = [outcome for outcome in
+                       self.sweep_moves(to, fr, to_excit, from_excit)
+                       if outcome != start]
+            xdiff = ((to_excit[0] != from_excit[0]) +
+                     2 * (to_excit[1] != from_excit[1]))
+            p_change = min(lattice.move_rate[xdiff, to, fr] *
+                           lattice.max_move, 1.0)
+            error = np.sqrt(p_change * (1 - p_change) / self.n_pairs)
+            self.assertTrue(abs(len(changed) / float(self.n_pairs) -
+                                p_change) < 4 * error + 1e-9)
+            events = []
+            for k in xrange(len(changed)):
+                to_after, fr_after, to_ex, from_ex = lattice.attempt_move(
+                    to, fr, to_excit, from_excit)
+                events.append((to_after, fr_after, tuple(to_ex),
+                               tuple(from_ex)))
+            self.assertTrue(start not in events)
+            for outcome in set(changed) | set(events):
+                p_sweep = changed.count(outcome) / float(len(changed))
+                p_event = events.count(outcome) / float(len(events))
+                error = np.sqrt(max(p_sweep, p_event) * 2.0 / len(changed))
+                self.assertTrue(abs(p_sweep - p_event) < 4 * error + 1e-3,
+                                (start, outcome, p_sweep, p_event))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+"""Tests of the movie renderer (movielat). Run from the top directory
+with
+    python -m unittest discover tests"""
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+import numpy as np
+import arraylat
+import movielat
+import trajectory
+
+arguments = (0.1, 0.375, 2.0, 0.5, 0.5, 0.3, 0.1)
+
+
+def read_chunks(file_name):
+    """Returns the chunks of the PNG file file_name as a list of (kind,
+    data), checking the signature and the CRC of each chunk."""
+    with open(file_name, 'rb') as in_file:
+        text = in_file.read()
+    assert text.startswith(movielat.png_signature)
+    position = len(movielat.png_signature)
+    chunks = []
+    while position < len(text):
+        length, = struct.unpack('>I', text[position:position + 4])
+        kind = text[position + 4:position + 8]
+        data = text[position + 8:position + 8 + length]
+        crc, = struct.unpack('>I', text[position + 8 + length:
+                                        position + 12 + length])
+        assert crc == zlib.crc32(kind + data) & 0xffffffff, kind
+        chunks.append((kind, data))
+        position += 12 + length
+    return chunks
+
+
+def decode_image(data, rows, columns):
+    """Returns the image (rows, columns, 3) of the compressed pixel data
+    data (each row with filter type 0)."""
+    raw = np.frombuffer(zlib.decompress(data), dtype = np.uint8)
+    raw = raw.reshape(rows, 1 + 3 * columns)
+    assert (raw[:, 0] == 0).all()
+    return raw[:, 1:].reshape(rows, columns, 3)
+
+
+class Test_Images(unittest.TestCase):
+
+    def test_state_colours(self):
+        palette = movielat.state_colours()
+        self.assertEqual(palette.shape, (arraylat.n_states, 3))
+        self.assertEqual(tuple(palette[arraylat.empty_state]),
+                         movielat.background)
+        catalyst = arraylat.encode_states(1, 0, 0, 0)
+        self.assertEqual(tuple(palette[catalyst]),
+                         movielat.molecule_colours['catalyst'])
+        # Catalyst, +htmf and -cinnamate: the mean of the three.
+        mixed = arraylat.encode_states(1, 1, -1, 0)
+        colours = movielat.molecule_colours
+        mean = np.round(np.mean([colours['catalyst'], colours['htmf_pos'],
+                                 colours['cinna_neg']], axis = 0))
+        self.assertEqual(tuple(palette[mixed]), tuple(mean))
+        palette = movielat.state_colours(dict(colours, catalyst = (0, 0, 0)),
+                                         empty = (1, 2, 3))
+        self.assertEqual(tuple(palette[catalyst]), (0, 0, 0))
+        self.assertEqual(tuple(palette[arraylat.empty_state]), (1, 2, 3))
+
+    def test_frame_image(self):
+        palette = movielat.state_colours()
+        codes = np.arange(24, dtype = np.uint8).reshape(2, 3, 4)
+        image = movielat.frame_image(codes[:, :, 0], palette, scale = 3)
+        self.assertEqual(image.shape, (6, 9, 3))
+        self.assertTrue((image[3:6, 6:9] == palette[codes[1, 2, 0]]).all())
+        # Beyond two axes, one layer of each.
+        image = movielat.frame_image(codes, palette, layer = 2)
+        self.assertTrue((image == palette[codes[:, :, 2]]).all())
+        # One dimension is one row.
+        image = movielat.frame_image(codes[0, 0], palette, scale = 2)
+        self.assertEqual(image.shape, (2, 8, 3))
+
+
+class Test_Movie(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'run')
+        lattice = arraylat.Array_Lattice(arguments, 5, seed = 1)
+        self.frames = []
+        with trajectory.Binary_Writer(self.file_name, arguments, 40, 5,
+                                      10) as out_file:
+            for frame in xrange(5):
+                for keyword in ('excite', 'react', 'move'):
+                    lattice.over_sites(keyword)
+                out_file.write_frame(lattice)
+                self.frames.append(lattice.state_codes().copy())
+        self.palette = movielat.state_colours()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_png_files(self):
+        names = movielat.render_movie(self.file_name, scale = 2, every = 2,
+                                      processes = 2)
+        self.assertEqual(names, [self.file_name + '_%05i.png' % k
+                                 for k in (0, 2, 4)])
+        for k, name in zip((0, 2, 4), names):
+            chunks = read_chunks(name)
+            self.assertEqual([kind for kind, data in chunks],
+                             ['IHDR', 'IDAT', 'IEND'])
+            self.assertEqual(struct.unpack('>II', chunks[0][1][:8]),
+                             (10, 10))
+            self.assertTrue((decode_image(chunks[1][1], 10, 10) ==
+                             movielat.frame_image(self.frames[k],
+                                                  self.palette, 2)).all())
+
+    def test_apng(self):
+        name = movielat.render_movie(self.file_name, out_format = 'apng',
+                                     scale = 3, processes = 2)
+        self.assertEqual(name, self.file_name + '.png')
+        chunks = read_chunks(name)
+        kinds = [kind for kind, data in chunks]
+        self.assertEqual(kinds[:2], ['IHDR', 'acTL'])
+        self.assertEqual(kinds[-1], 'IEND')
+        self.assertEqual(struct.unpack('>II', chunks[1][1]), (5, 0))
+        # Frame controls and frame data are numbered 0, 1, 2, ... in
+        # the order they come, and there is one fcTL for each frame.
+        sequence = [struct.unpack('>I', data[:4])[0]
+                    for kind, data in chunks if kind in ('fcTL', 'fdAT')]
+        self.assertEqual(sequence, range(len(sequence)))
+        self.assertEqual(kinds.count('fcTL'), 5)
+        self.assertEqual(kinds.count('IDAT'), 1)
+        images = [data for kind, data in chunks if kind == 'IDAT'] + \
+                 [data[4:] for kind, data in chunks if kind == 'fdAT']
+        self.assertEqual(len(images), 5)
+        for data, frame in zip(images, self.frames):
+            self.assertTrue((decode_image(data, 15, 15) ==
+                             movielat.frame_image(frame, self.palette,
+                                                  3)).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
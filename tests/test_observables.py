@@ -0,0 +1,65 @@
+"""Tests of the observables recorded during runlat.run_react."""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import arraylat
+import observables
+import runlat
+
+arguments = (0.1, 0.375, 2.0, 0.5, 0.5, 0.3, 0.1)
+
+
+class Test_Observables(unittest.TestCase):
+
+    def test_counts_match_state_codes(self):
+        lattice = arraylat.Array_Lattice(arguments, 10, seed = 9)
+        codes = arraylat.decode_states(lattice.state_codes()).reshape(-1, 4)
+        values = dict(zip(['free_catalyst', 'product_pos'],
+                          observables.compute(lattice, ['free_catalyst',
+                                                        'product_pos'])))
+        alone = ((codes[:, 0] == 1) & (codes[:, 1:] == 0).all(axis = 1))
+        self.assertEqual(values['free_catalyst'], alone.sum())
+        self.assertEqual(values['product_pos'], (codes[:, 3] == 1).sum())
+
+    def test_run_react_writes_names(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_name = runlat.run_react(
+                arguments, steps = 30, size = 8, sample_int = 10,
+                backend = 'array', output_format = 'binary',
+                file_name = os.path.join(directory, 'run'),
+                verbose = False, seed = 1, observe_int = 10,
+                observe_names = ['ee', 'complex_pos'])
+            values = observables.read(file_name + '.obs')
+            self.assertEqual(values.dtype.names,
+                             ('step', 'ee', 'complex_pos'))
+            self.assertEqual(list(values['step']), [0, 10, 20, 30])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_energy_needs_energy_table(self):
+        lattice = arraylat.Array_Lattice(arguments, 8, seed = 2)
+        self.assertAlmostEqual(observables.compute(lattice, ['energy'])[0],
+                               lattice.energy().sum(), places = 4)
+        # The object lattice has no energies, which is found out before
+        # the run writes anything.
+        directory = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(directory, 'run')
+            for keywords in ({'observe_names': ['energy']},
+                             {'converge': {'names': ['energy']}}):
+                self.assertRaises(ValueError, runlat.run_react, arguments,
+                                  steps = 4, size = 4, sample_int = 2,
+                                  backend = 'object', file_name = file_name,
+                                  verbose = False, seed = 1,
+                                  observe_int = 2, **keywords)
+                self.assertEqual(os.listdir(directory), [])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""Tests of runlat.run_react: checkpoints and resuming."""
+
+import filecmp
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import checkpointlat
+import runlat
+import trajectory
+
+arguments = (0.1, 0.375, 2.0, 0.5, 0.5, 0.3, 0.1)
+
+
+class Stop_Run(Exception):
+    pass
+
+
+class Test_Resume(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.write_codes = trajectory.Binary_Writer.write_codes
+
+    def tearDown(self):
+        trajectory.Binary_Writer.write_codes = self.write_codes
+        shutil.rmtree(self.directory)
+
+    def stop_after(self, frames):
+        """Makes the binary writer stop the run when it is asked for
+        frame number frames (counting from 0) from now."""
+        write_codes = self.write_codes
+        count = [0]
+        def stopping_write_codes(writer, codes):
+            if count[0] == frames:
+                raise Stop_Run
+            count[0] += 1
+            write_codes(writer, codes)
+        trajectory.Binary_Writer.write_codes = stopping_write_codes
+
+    def test_resume_is_identical(self):
+        for backend in ('object', 'array'):
+            run = dict(steps = 120, size = 8, sample_int = 5,
+                       backend = backend, output_format = 'binary',
+                       verbose = False, seed = 8)
+            reference = runlat.run_react(
+                arguments, file_name = os.path.join(self.directory, 'ref'),
+                **run)
+            file_name = os.path.join(self.directory, 'stopped')
+            checkpoint_file = file_name + '.chk'
+            self.stop_after(12)
+            self.assertRaises(Stop_Run, runlat.run_react, arguments,
+                              file_name = file_name, checkpoint_int = 20,
+                              **run)
+            first_step = checkpointlat.load_checkpoint(
+                checkpoint_file)['step']
+            # Resumed without checkpoint_int, it still writes them.
+            self.stop_after(10)
+            self.assertRaises(Stop_Run, runlat.run_react,
+                              resume = checkpoint_file, verbose = False)
+            self.assertTrue(checkpointlat.load_checkpoint(
+                checkpoint_file)['step'] > first_step)
+            trajectory.Binary_Writer.write_codes = self.write_codes
+            runlat.run_react(resume = checkpoint_file, verbose = False)
+            self.assertTrue(filecmp.cmp(reference, file_name,
+                                        shallow = False))
+            self.assertFalse(os.path.exists(checkpoint_file))
+
+
+class Test_Command_Line(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_command(self, argums):
+        """Runs runlat.py with the strings argums in the temporary
+        directory.
+        Returns the header of the text trajectory it wrote."""
+        script = os.path.abspath(runlat.__file__.replace('.pyc', '.py'))
+        with open(os.devnull, 'w') as null:
+            subprocess.check_call([sys.executable, script] + argums,
+                                  cwd = self.directory, stdout = null)
+        names = os.listdir(self.directory)
+        self.assertEqual(len(names), 1)
+        file_name = os.path.join(self.directory, names[0])
+        header = trajectory.read_text_header(file_name)
+        os.remove(file_name)
+        return header
+
+    def test_argument_forms(self):
+        parameters = [repr(arg) for arg in arguments]
+        for argums, steps in ((['20', '4', '10'] + parameters, 20),
+                              (['20', '4', '10', '2'] + parameters, 20),
+                              # (The default run, of 2000 steps.)
+                              (parameters, 2000)):
+            header = self.run_command(argums)
+            self.assertEqual(header['steps'], steps)
+            self.assertEqual(header['arguments'], list(arguments))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+"""Tests of the spatial statistics of lattice snapshots (spatiallat). Run
+from the top directory with
+    python -m unittest discover tests"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import arraylat
+import runlat
+import spatiallat
+import trajectory
+
+arguments = (0.1, 0.375, 2.0, 0.5, 0.5, 0.3, 0.1)
+# Edge lengths of the small lattices of each dimension (odd and even).
+sizes = {1: 11, 2: 6, 3: 5}
+
+
+def random_codes(n_frames, size, dimension, seed):
+    """Returns n_frames frames of random state codes of a lattice, with
+    about half of the sites empty."""
+    random = np.random.RandomState(seed)
+    shape = (n_frames,) + (size,) * dimension
+    codes = random.randint(arraylat.n_states, size = shape)
+    codes[random.uniform(size = shape) < 0.5] = arraylat.empty_state
+    return codes.astype(np.uint8)
+
+
+def site_neighbours(site, shape):
+    """Returns the coordinates of the nearest neighbours of the site with
+    coordinates site on a periodic lattice of shape."""
+    neighbours = []
+    for axis in xrange(len(shape)):
+        for step in (-1, 1):
+            neighbour = list(site)
+            neighbour[axis] = (neighbour[axis] + step) % shape[axis]
+            neighbours.append(tuple(neighbour))
+    return neighbours
+
+
+def direct_labels(mask):
+    """Labels the clusters of the one frame mask by walking from site to
+    site, with the smallest flat index of each cluster as its label.
+    Returns the array of labels (-1 where mask is False)."""
+    labels = -np.ones(mask.shape, dtype = int)
+    for flat in xrange(mask.size):
+        start = np.unravel_index(flat, mask.shape)
+        if not mask[start] or labels[start] >= 0:
+            continue
+        labels[start] = flat
+        todo = [start]
+        while todo:
+            for neighbour in site_neighbours(todo.pop(), mask.shape):
+                if mask[neighbour] and labels[neighbour] < 0:
+                    labels[neighbour] = flat
+                    todo.append(neighbour)
+    return labels
+
+
+def direct_correlation(a, b, max_r):
+    """Returns g(r) for r = 1 to max_r of the one frame arrays a and b,
+    averaging a(x) b(x + d) over every site x and every offset d whose
+    periodic length rounds to r."""
+    shape = a.shape
+    sums = np.zeros(max_r)
+    counts = np.zeros(max_r)
+    for offset in np.ndindex(*shape):
+        length = np.sqrt(sum(min(d, size - d)**2
+                             for d, size in zip(offset, shape)))
+        r = int(np.rint(length))
+        if not 1 <= r <= max_r:
+            continue
+        total = 0.0
+        for site in np.ndindex(*shape):
+            moved = tuple((x + d) % size
+                          for x, d, size in zip(site, offset, shape))
+            total += a[site] * b[moved]
+        sums[r - 1] += total / a.size
+        counts[r - 1] += 1
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        return sums / counts / (a.mean() * b.mean())
+
+
+class Test_Frames(unittest.TestCase):
+
+    pairs = [('catalyst', 'htmf'), ('htmf_pos', 'cinna_neg'),
+             ('reactant', 'reactant')]
+    max_r = 3
+
+    def test_labels_match_direct(self):
+        for dimension, size in sorted(sizes.items()):
+            codes = random_codes(3, size, dimension, seed = dimension)
+            mask = spatiallat.species_mask(codes, 'reactant')
+            labels = spatiallat.label_clusters(mask, dimension)
+            # (The labels are flat indices into the whole batch.)
+            for k in xrange(3):
+                expected = direct_labels(mask[k])
+                expected[mask[k]] += k * size**dimension
+                self.assertTrue((labels[k] == expected).all(), dimension)
+
+    def test_correlations_match_direct(self):
+        for dimension, size in sorted(sizes.items()):
+            codes = random_codes(2, size, dimension, seed = 10 + dimension)
+            values, sizes_found = spatiallat.analyse_frames(
+                codes, dimension, self.pairs, self.max_r,
+                cluster_species = 'reactant')
+            self.assertEqual(values.shape, (2, len(self.pairs) *
+                                            self.max_r + 4))
+            for k in xrange(2):
+                expected = []
+                for name_a, name_b in self.pairs:
+                    expected.extend(direct_correlation(
+                        spatiallat.species_mask(codes[k], name_a),
+                        spatiallat.species_mask(codes[k], name_b),
+                        self.max_r))
+                labels = direct_labels(spatiallat.species_mask(codes[k],
+                                                               'reactant'))
+                cluster_sizes = np.bincount(labels[labels >= 0])
+                cluster_sizes = cluster_sizes[cluster_sizes > 0]
+                expected.extend(spatiallat.cluster_statistics(
+                    cluster_sizes))
+                self.assertTrue(np.allclose(values[k], expected,
+                                            equal_nan = True),
+                                (dimension, values[k], expected))
+                self.assertEqual(sorted(sizes_found[k]),
+                                 sorted(cluster_sizes))
+
+
+class Test_Trajectory(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_step_of_converged_frame(self):
+        # Converges at step 9 (two windows of records at 0, 3, 6 and 9),
+        # which is written as an extra frame after the one of step 0.
+        file_name = runlat.run_react(
+            arguments, steps = 100, size = 8, sample_int = 10,
+            backend = 'array', output_format = 'binary',
+            file_name = os.path.join(self.directory, 'run'),
+            verbose = False, seed = 1, observe_int = 3,
+            converge = {'names': ['free_catalyst'], 'window': 2,
+                        'tolerance': 1000.0})
+        self.assertEqual(len(trajectory.Trajectory(file_name)), 2)
+        header, values = spatiallat.read(
+            spatiallat.analyse_trajectory(file_name))
+        self.assertEqual(list(values['frame']), [0, 1])
+        self.assertEqual(list(values['step']), [0, 9])
+        # A summary that is not of this run is not used.
+        self.assertEqual(trajectory.frame_steps(file_name, 3, 10),
+                         [0, 10, 20])
+
+    def test_chunks_match_one_pass(self):
+        codes = random_codes(7, 6, 2, seed = 20)
+        file_name = os.path.join(self.directory, 'frames')
+        with trajectory.Binary_Writer(file_name, arguments, 70, 6,
+                                      10) as out_file:
+            for frame in codes:
+                out_file.write_codes(frame)
+        pairs = Test_Frames.pairs
+        expected, sizes_found = spatiallat.analyse_frames(
+            codes[::2], 2, pairs, 3, 'reactant')
+        header, values = spatiallat.read(spatiallat.analyse_trajectory(
+            file_name, pairs = pairs, max_r = 3,
+            cluster_species = 'reactant', chunk = 3, every = 2))
+        self.assertEqual(header['pairs'], [list(pair) for pair in pairs])
+        self.assertEqual(list(values['frame']), [0, 2, 4, 6])
+        self.assertEqual(list(values['step']), [0, 20, 40, 60])
+        names = spatiallat.column_names(pairs, 3)
+        self.assertTrue(np.allclose([list(row) for row in values[names]],
+                                    expected, equal_nan = True))
+        # The distribution of the sizes of all the clusters.
+        counts = np.bincount(np.concatenate(sizes_found))
+        written = np.loadtxt(file_name + '.spatial_sizes', dtype = int)
+        self.assertEqual(written.tolist(),
+                         [[size, counts[size]]
+                          for size in np.flatnonzero(counts)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""Tests of sweeplat.run_sweep. Run from the top directory with
+    python -m unittest discover tests"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import sweeplat
+
+arguments = (0.1, 0.375, 2.0, 0.5, 0.5, 0.3, 0.1)
+
+
+class Test_Sweep(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_runs_every_point(self):
+        runs = sweeplat.run_sweep([arguments, arguments[:-1] + (0.2,)],
+                                  steps = 4, size = 4, sample_int = 2,
+                                  replicas = 2, processes = 2,
+                                  out_dir = self.directory,
+                                  prefix = 'sweep', seed = 1)
+        self.assertEqual(len(runs), 4)
+        self.assertEqual(sorted(run['replica'] for run in runs),
+                         [0, 0, 1, 1])
+        for run in runs:
+            self.assertTrue(os.path.exists(run['file_name']))
+        self.assertEqual(
+            sweeplat.read_index(os.path.join(self.directory,
+                                             'sweep_index.json')), runs)
+
+    def test_domain_backend_is_refused(self):
+        # Its workers can't be forked from the pool's daemonic processes.
+        self.assertFalse('domain' in sweeplat.sweep_backends)
+        self.assertRaises(ValueError, sweeplat.run_sweep, [arguments],
+                          steps = 4, size = 4, sample_int = 2,
+                          backend = 'domain', out_dir = self.directory)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,267 @@
+"""Tests of the trajectory writers and readers (trajectory). Run from the
+top directory with
+    python -m unittest discover tests"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import arraylat
+import trajectory
+
+arguments = (0.1, 0.375, 2.0, 0.5, 0.5, 0.3, 0.1)
+
+
+def sample_codes(size, n_frames, seed):
+    """Returns the state codes of n_frames samples of an Array_Lattice,
+    a sweep apart, as a list of arrays."""
+    lattice = arraylat.Array_Lattice(arguments, size, seed = seed)
+    frames = []
+    for frame in xrange(n_frames):
+        for keyword in ('excite', 'react', 'move'):
+            lattice.over_sites(keyword)
+        frames.append(lattice.state_codes().copy())
+    return frames
+
+
+class Test_Binary(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'binary')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_frames_round_trip(self):
+        frames = sample_codes(6, 7, seed = 1)
+        with trajectory.Binary_Writer(self.file_name, arguments, 70, 6, 10,
+                                      seed = 1) as out_file:
+            for codes in frames:
+                out_file.write_codes(codes)
+        read = trajectory.open_trajectory(self.file_name)
+        self.assertTrue(isinstance(read, trajectory.Trajectory))
+        self.assertEqual(read.header['data_offset'] %
+                         trajectory.header_align, 0)
+        self.assertEqual(read.header['seed'], 1)
+        self.assertEqual(read.header['arguments'], list(arguments))
+        self.assertEqual(len(read), len(frames))
+        for k in (3, 0, 6, -1):
+            self.assertTrue((read[k] == frames[k]).all())
+        for codes, frame in zip(read, frames):
+            self.assertTrue((codes == frame).all())
+
+    def test_incomplete_frame_is_ignored(self):
+        frames = sample_codes(5, 3, seed = 2)
+        with trajectory.Binary_Writer(self.file_name, arguments, 30, 5,
+                                      10) as out_file:
+            for codes in frames:
+                out_file.write_codes(codes)
+            # As though the run was stopped part way through a frame.
+            out_file.out_file.write(frames[0].tostring()[:7])
+        self.assertEqual(len(trajectory.Trajectory(self.file_name)), 3)
+
+    def test_offset_continues_the_file(self):
+        frames = sample_codes(5, 4, seed = 3)
+        with trajectory.Binary_Writer(self.file_name, arguments, 40, 5,
+                                      10) as out_file:
+            out_file.write_codes(frames[0])
+            offset = out_file.tell()
+            # Written after the checkpoint, so thrown away on restart.
+            out_file.write_codes(frames[3])
+        with trajectory.Binary_Writer(self.file_name, arguments, 40, 5, 10,
+                                      offset = offset) as out_file:
+            for codes in frames[1:]:
+                out_file.write_codes(codes)
+        read = trajectory.Trajectory(self.file_name)
+        self.assertEqual(len(read), 4)
+        for codes, frame in zip(read, frames):
+            self.assertTrue((codes == frame).all())
+
+
+class Test_Text(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'text')
+        self.text_block_size = trajectory.text_block_size
+
+    def tearDown(self):
+        trajectory.text_block_size = self.text_block_size
+        shutil.rmtree(self.directory)
+
+    def write_text(self, size, n_frames, dimension = 2, stop = False):
+        """Writes n_frames samples of an Array_Lattice, a sweep apart,
+        with Text_Writer. If stop is True, the file is left with half a
+        frame after them, as by a run that was stopped.
+        Returns the state codes of the frames, as a list of arrays."""
+        lattice = arraylat.Array_Lattice(arguments, size, dimension,
+                                         seed = 4)
+        frames = []
+        out_file = trajectory.Text_Writer(self.file_name, arguments,
+                                          10 * n_frames, size, 10,
+                                          seed = 4, replica = 2)
+        for frame in xrange(n_frames):
+            for keyword in ('excite', 'react', 'move'):
+                lattice.over_sites(keyword)
+            out_file.write_frame(lattice)
+            frames.append(lattice.state_codes().copy())
+        if stop:
+            out_file.out_file.write(',{{0,0,0,1},{1,')
+            out_file.out_file.close()
+        out_file.close()
+        return frames
+
+    def assert_frames(self, read, frames):
+        self.assertEqual(len(read), len(frames))
+        for codes, frame in zip(read, frames):
+            self.assertTrue((codes == frame).all())
+        for k in (2, 0, -1):
+            self.assertTrue((read[k] == frames[k]).all())
+
+    def test_frames_round_trip(self):
+        frames = self.write_text(5, 6)
+        read = trajectory.open_trajectory(self.file_name)
+        self.assertTrue(isinstance(read, trajectory.Text_Trajectory))
+        self.assertEqual(read.header['size'], 5)
+        self.assertEqual(read.header['steps'], 60)
+        self.assertEqual(read.header['seed'], 4)
+        self.assertEqual(read.header['replica'], 2)
+        self.assertEqual(read.header['arguments'], list(arguments))
+        self.assertEqual(read.header['dimension'], 2)
+        self.assert_frames(read, frames)
+
+    def test_frames_split_between_blocks(self):
+        # Blocks much smaller than a frame, and of an odd size so the
+        # frame starts and ends are split between them too.
+        frames = self.write_text(4, 5)
+        trajectory.text_block_size = 7
+        self.assert_frames(trajectory.Text_Trajectory(self.file_name),
+                           frames)
+
+    def test_dimension_from_frame(self):
+        frames = self.write_text(3, 4, dimension = 3)
+        read = trajectory.Text_Trajectory(self.file_name)
+        self.assertEqual(read.header['dimension'], 3)
+        self.assert_frames(read, frames)
+
+    def test_incomplete_frame_is_ignored(self):
+        frames = self.write_text(4, 3, stop = True)
+        self.assert_frames(trajectory.Text_Trajectory(self.file_name),
+                           frames)
+
+    def test_index_is_kept_until_the_file_changes(self):
+        self.write_text(4, 3)
+        index_name = self.file_name + '.idx'
+        offsets = trajectory.Text_Trajectory(self.file_name).offsets
+        self.assertTrue(os.path.exists(index_name))
+        # An index for the file as it is now is used as it is.
+        with open(index_name, 'w') as index_file:
+            index_file.write('{"file_size": %i, "offsets": [1, 2]}' %
+                             os.path.getsize(self.file_name))
+        self.assertEqual(trajectory.Text_Trajectory(self.file_name).offsets,
+                         [1, 2])
+        # Once the file has changed it is made again.
+        self.write_text(4, 4)
+        read = trajectory.Text_Trajectory(self.file_name)
+        self.assertEqual(len(read), 4)
+        self.assertEqual(read.offsets[:3], offsets)
+
+    def test_convert_text(self):
+        frames = self.write_text(5, 4)
+        binary_name = trajectory.convert_text(self.file_name)
+        read = trajectory.open_trajectory(binary_name)
+        self.assertTrue(isinstance(read, trajectory.Trajectory))
+        header = trajectory.Text_Trajectory(self.file_name).header
+        for name in header:
+            self.assertEqual(read.header[name], header[name], name)
+        self.assertEqual(read.header['converted_from'], 'text')
+        self.assert_frames(read, frames)
+
+
+class Test_Delta(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'delta')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def changing_codes(self, n_frames, seed):
+        """Returns n_frames arrays of state codes of a 6 x 6 lattice,
+        each with 2 sites changed from the one before (few enough that
+        they are written as deltas)."""
+        random = np.random.RandomState(seed)
+        codes = random.randint(arraylat.n_states, size = (6, 6))
+        frames = []
+        for frame in xrange(n_frames):
+            codes = codes.astype(np.uint8)
+            frames.append(codes)
+            codes = codes.copy()
+            sites = random.choice(codes.size, 2, replace = False)
+            codes.flat[sites] = (codes.flat[sites] + 1) % arraylat.n_states
+        return frames
+
+    def write_delta(self, frames, **metadata):
+        """Writes the state codes frames with Delta_Writer, with a
+        keyframe every 4 frames.
+        Returns None"""
+        with trajectory.Delta_Writer(self.file_name, arguments,
+                                     10 * len(frames), frames[0].shape[0],
+                                     10, keyframe_int = 4,
+                                     **metadata) as out_file:
+            for codes in frames:
+                out_file.write_codes(codes)
+
+    def test_frames_round_trip(self):
+        frames = self.changing_codes(11, seed = 5)
+        self.write_delta(frames, seed = 5)
+        read = trajectory.open_trajectory(self.file_name)
+        self.assertTrue(isinstance(read, trajectory.Delta_Trajectory))
+        self.assertEqual(read.header['seed'], 5)
+        self.assertEqual(read.header['keyframe_int'], 4)
+        self.assertEqual(read.keyframes, [0] * 4 + [4] * 4 + [8] * 3)
+        self.assertEqual(len(read), len(frames))
+        for codes, frame in zip(read, frames):
+            self.assertTrue((codes == frame).all())
+        # Going back, forward past a keyframe, and to the same frame.
+        for k in (10, 6, 7, 2, 9, 9, -11):
+            self.assertTrue((read[k] == frames[k]).all(), k)
+        self.assertRaises(IndexError, read.__getitem__, 11)
+
+    def test_large_change_is_a_keyframe(self):
+        frames = self.changing_codes(3, seed = 6)
+        # Emptying the lattice changes nearly every site, so frame 1 (and
+        # frame 2, which changes them back) is written as a keyframe.
+        frames[1] = np.full_like(frames[0], arraylat.empty_state)
+        self.write_delta(frames)
+        read = trajectory.Delta_Trajectory(self.file_name)
+        self.assertEqual(read.keyframes, [0, 1, 2])
+        for codes, frame in zip(read, frames):
+            self.assertTrue((codes == frame).all())
+
+    def test_offset_continues_the_deltas(self):
+        frames = self.changing_codes(9, seed = 7)
+        with trajectory.Delta_Writer(self.file_name, arguments, 90, 6, 10,
+                                     keyframe_int = 4) as out_file:
+            for codes in frames[:3]:
+                out_file.write_codes(codes)
+            offset = out_file.tell()
+            # Written after the checkpoint, so thrown away on restart.
+            out_file.write_codes(frames[8])
+        with trajectory.Delta_Writer(self.file_name, arguments, 90, 6, 10,
+                                     offset = offset) as out_file:
+            self.assertEqual(out_file.n_frames, 3)
+            for codes in frames[3:]:
+                out_file.write_codes(codes)
+        read = trajectory.Delta_Trajectory(self.file_name)
+        self.assertEqual(read.keyframes, [0] * 4 + [4] * 4 + [8])
+        self.assertEqual(len(read), len(frames))
+        for codes, frame in zip(read, frames):
+            self.assertTrue((codes == frame).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,707 @@
+"""Writers and a reader for the output of runlat.run_react.
+
+There are three output formats:
+'text' is the original brace-delimited format that can be read in
+Mathematica (a header, then ,{{c,h,n,p},{...}} for each frame).
+'binary' stores each frame as one uint8 state code per site
+(see arraylat.encode_states) after a JSON header with the run parameters.
+The frames are all the same size, so any frame can be read without
+reading the ones before it, and the whole file can be memory-mapped.
+
+'delta' stores a keyframe (the state codes of every site, as in
+'binary') every keyframe_int frames, and in between only the sites that
+changed since the frame before (their flat indices and new state codes).
+At the densities of most runs few sites change between samples, so this
+is much smaller than 'binary' and frames can be sampled far more often.
+Delta_Trajectory rebuilds any frame from the keyframe before it.
+
+Text files (including old lat_react_out files) can be read a frame at a
+time with Text_Trajectory, which keeps an index of where each frame
+starts (in file_name + '.idx') so any frame can be read without the
+ones before it, and converted to binary with convert_text. Neither ever
+holds more than a frame and a block of the file in memory.
+frame_steps gives the step each frame was sampled at."""
+
+import ast
+import json
+import os
+import re
+import struct
+import numpy as np
+import arraylat
+
+# First bytes of every binary trajectory file, and of every delta one.
+magic       = 'LATTRAJ1'
+delta_magic = 'LATDELT1'
+# The frames start at a multiple of this many bytes.
+header_align = 64
+
+
+class Text_Writer:
+    """Writes samples of a lattice in the brace-delimited text format.
+    The header is written when it is created, and the final brace when
+    it is closed."""
+
+    def __init__(self, file_name, arguments, steps, size, sample_int,
+                 offset = None, **metadata):
+        """Opens file_name and writes the header.
+        If seed is in metadata it is added at the end of the human
+        readable part of the header (and replica if it is not 0).
+        Other metadata is accepted for the same call signature as
+        Binary_Writer, but is not written.
+        If offset is given, the existing file is cut to offset bytes
+        (from tell) and written after that, instead of starting over.
+        Syntax: Text_Writer(file_name, arguments, steps, size, sample_int,
+        offset)
+        Returns None."""
+        self.file_name = file_name
+        if offset is not None:
+            self.out_file = reopen(file_name, offset)
+            return
+        self.out_file  = open(file_name, 'w')
+        # Header for the output file. First human readable format then
+        # in machine readable format.
+        seed = ''
+        if metadata.get('seed') is not None:
+            seed = ',"seed:%i"' % metadata['seed']
+            if metadata.get('replica'):
+                seed += ',"replica:%i"' % metadata['replica']
+        header  = '{{"size:%(size)i","steps:%(steps)i","sample_int:%(samp_int)i"\
+            ,"args:%(argus)s"%(seed)s},\n{%(size)i,%(steps)i,%(samp_int)i}\
+            \n' % {'size': size, 'steps': steps, \
+                    'samp_int': sample_int, 'argus': arguments, 'seed': seed}
+        self.out_file.write(header)
+
+    def write_frame(self, lattice):
+        """Writes the current occupancy of lattice as one frame.
+        Returns None"""
+        # This is is a numpy array
+        a_sample = lattice.over_sites('sample')
+        # This comma separates the previous entry and then starts the
+        # next. This formatting is done so that it can be easily read
+        # in Mathematica, but the braces are matched so other programs
+        # should be able to read it as well.
+        self.out_file.write(',{{')
+        # Because a_sample is an np array, the tofile will output the
+        # file to out_file separated by sep
+        a_sample.tofile(self.out_file, sep = '},{')
+        self.out_file.write('}}')
+
+    def tell(self):
+        """Returns the number of bytes written so far (where to continue
+        from after a restart)."""
+        self.out_file.flush()
+        return self.out_file.tell()
+
+    def close(self):
+        """Writes the final brace and closes the file.
+        Returns None"""
+        if not self.out_file.closed:
+            # Final brace matches the open brace remaining.
+            self.out_file.write('}')
+            self.out_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Binary_Writer:
+    """Writes samples of a lattice as frames of uint8 state codes
+    after a JSON header (see read_header)."""
+
+    # First bytes of the file.
+    file_magic = magic
+
+    def __init__(self, file_name, arguments, steps, size, sample_int,
+                 offset = None, **metadata):
+        """Opens file_name and writes the header.
+        The header has the run parameters, and anything else given as
+        keyword arguments (for example dimension or backend), which must
+        be JSON serializable.
+        If offset is given, the existing file is cut to offset bytes
+        (from tell) and written after that, instead of starting over.
+        Syntax: Binary_Writer(file_name, arguments, steps, size, sample_int,
+        offset, **metadata)
+        Returns None."""
+        if offset is not None:
+            self.file_name = file_name
+            self.header    = read_header(file_name, self.file_magic)
+            self.out_file  = reopen(file_name, offset)
+            return
+        dimension = metadata.get('dimension', 2)
+        header = dict(metadata)
+        header.update({'arguments':   [float(arg) for arg in arguments],
+                       'steps':       steps,
+                       'size':        size,
+                       'sample_int':  sample_int,
+                       'dimension':   dimension,
+                       'shape':       [size] * dimension,
+                       'dtype':       'uint8',
+                       'state_code':  '27 * catalyst + 9 * (htmf + 1) + ' +
+                                      '3 * (cinna + 1) + (product + 1)'})
+        self.file_name = file_name
+        self.header    = write_header(file_name, header, self.file_magic)
+        self.out_file  = open(file_name, 'ab')
+
+    def write_frame(self, lattice):
+        """Writes the current state codes of lattice as one frame.
+        Returns None"""
+        self.write_codes(lattice.state_codes())
+
+    def write_codes(self, codes):
+        """Writes the array of state codes codes (the shape of the
+        lattice) as one frame.
+        Returns None"""
+        codes = np.ascontiguousarray(codes, dtype = np.uint8)
+        self.out_file.write(codes.tostring())
+
+    def tell(self):
+        """Returns the number of bytes written so far (where to continue
+        from after a restart)."""
+        self.out_file.flush()
+        return self.out_file.tell()
+
+    def close(self):
+        """Closes the file.
+        Returns None"""
+        self.out_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def reopen(file_name, offset):
+    """Opens the existing file_name for writing, cut to offset bytes.
+    Anything written after offset (by a run that was stopped) is thrown
+    away so the file continues as though it had never stopped.
+    Returns the open file."""
+    out_file = open(file_name, 'r+b')
+    out_file.truncate(offset)
+    out_file.seek(offset)
+    return out_file
+
+
+def write_header(file_name, header, file_magic = magic):
+    """Creates file_name with the binary trajectory header:
+    the magic string (file_magic), a newline, the length of the JSON
+    header as 8 digits and a newline, then the JSON header padded with
+    spaces so the frames start at a multiple of header_align bytes.
+    The offset of the first frame is put in the header as data_offset.
+    Returns the header (a dict)."""
+    header = dict(header)
+    # Two passes, since data_offset is in the header itself.
+    header['data_offset'] = 0
+    for attempt in xrange(2):
+        text = json.dumps(header, sort_keys = True)
+        prefix_len = len(file_magic) + 1 + 8 + 1
+        data_offset = prefix_len + len(text) + 1
+        data_offset += -data_offset % header_align
+        header['data_offset'] = data_offset
+    text = json.dumps(header, sort_keys = True)
+    text = text.ljust(data_offset - prefix_len - 1) + '\n'
+    with open(file_name, 'wb') as out_file:
+        out_file.write('%s\n%08i\n%s' % (file_magic, len(text), text))
+    return header
+
+
+def read_header(file_name, file_magic = magic):
+    """Reads the JSON header of a binary trajectory file (or of another
+    file with the same header and file_magic).
+    Returns the header (a dict)."""
+    with open(file_name, 'rb') as in_file:
+        if in_file.readline().strip() != file_magic:
+            raise IOError('%s is not a binary trajectory file' % file_name)
+        header_len = int(in_file.readline())
+        return json.loads(in_file.read(header_len))
+
+
+class Trajectory:
+    """Random access to the frames of a binary trajectory file.
+    The frames are memory-mapped, so opening even a very large file is
+    quick and only the frames that are used are read.
+    trajectory[k] is the array of state codes of frame k
+    (use arraylat.decode_states to get the occupancies),
+    len(trajectory) is the number of frames, and header has the
+    run parameters."""
+
+    def __init__(self, file_name):
+        """Opens the binary trajectory file_name.
+        Syntax: Trajectory(file_name)
+        Returns None"""
+        self.file_name = file_name
+        self.header    = read_header(file_name)
+        self.shape     = tuple(self.header['shape'])
+        frame_size = int(np.prod(self.shape))
+        data_offset = self.header['data_offset']
+        with open(file_name, 'rb') as in_file:
+            in_file.seek(0, 2)
+            data_len = in_file.tell() - data_offset
+        # The number of frames is taken from the length of the file,
+        # so that a file from a run that did not finish can still be
+        # read (an incomplete last frame is ignored).
+        self.n_frames = data_len // frame_size
+        if self.n_frames:
+            self.frames = np.memmap(file_name, dtype = np.uint8, mode = 'r',
+                                    offset = data_offset,
+                                    shape = (self.n_frames,) + self.shape)
+        else:
+            self.frames = np.zeros((0,) + self.shape, dtype = np.uint8)
+
+    def __len__(self):
+        return self.n_frames
+
+    def __getitem__(self, k):
+        return self.frames[k]
+
+    def __iter__(self):
+        for k in xrange(self.n_frames):
+            yield self.frames[k]
+
+
+# Frames between keyframes of delta trajectories, unless given.
+keyframe_int = 100
+# Each record of a delta trajectory starts with its kind (keyframe or
+# delta) and the number of sites in it.
+record_start = struct.Struct('<cI')
+keyframe_kind = 'K'
+delta_kind    = 'D'
+
+
+def index_dtype(n_sites):
+    """Returns the numpy dtype of the site indices of a delta trajectory
+    of n_sites sites (little-endian, as small as will do)."""
+    if n_sites <= 1 << 16:
+        return np.dtype('<u2')
+    return np.dtype('<u4')
+
+
+class Delta_Writer(Binary_Writer):
+    """Writes samples of a lattice as keyframes of uint8 state codes
+    every keyframe_int frames, and in between as the sites that changed
+    since the frame before, after the same JSON header as Binary_Writer
+    (with keyframe_int and index_dtype added).
+    Each record is record_start (the kind, 'K' or 'D', and the number of
+    sites n), then for a keyframe the n state codes, or for a delta the
+    n flat site indices (index_dtype) followed by their n new state
+    codes. A delta that would be as big as a keyframe is written as a
+    keyframe instead."""
+
+    file_magic = delta_magic
+
+    def __init__(self, file_name, arguments, steps, size, sample_int,
+                 offset = None, **metadata):
+        """Same as Binary_Writer. keyframe_int can be given in metadata
+        (the module's keyframe_int if not).
+        If offset is given, the frame before it is rebuilt from the file
+        so the deltas carry on from it.
+        Syntax: Delta_Writer(file_name, arguments, steps, size, sample_int,
+        offset, **metadata)
+        Returns None."""
+        if offset is None:
+            n_sites = size**metadata.get('dimension', 2)
+            metadata.setdefault('keyframe_int', keyframe_int)
+            metadata['index_dtype'] = index_dtype(n_sites).str
+        Binary_Writer.__init__(self, file_name, arguments, steps, size,
+                               sample_int, offset, **metadata)
+        self.keyframe_int = self.header['keyframe_int']
+        self.index_dtype  = np.dtype(self.header['index_dtype'])
+        # The number of frames written, and the codes of the last one.
+        self.n_frames = 0
+        self.previous = None
+        if offset is not None:
+            self.out_file.flush()
+            frames = Delta_Trajectory(file_name)
+            self.n_frames = len(frames)
+            if self.n_frames:
+                self.previous = frames[-1].ravel()
+
+    def write_codes(self, codes):
+        """Writes the array of state codes codes (the shape of the
+        lattice) as one frame: a keyframe or the changes since the frame
+        before.
+        Returns None"""
+        codes = np.ascontiguousarray(codes, dtype = np.uint8).ravel()
+        if self.previous is not None and \
+                self.n_frames % self.keyframe_int != 0:
+            changed = np.flatnonzero(codes != self.previous)
+            if changed.size * (self.index_dtype.itemsize + 1) < codes.size:
+                self.out_file.write(
+                    record_start.pack(delta_kind, changed.size) +
+                    changed.astype(self.index_dtype).tostring() +
+                    codes[changed].tostring())
+                self.previous = codes
+                self.n_frames += 1
+                return
+        self.out_file.write(record_start.pack(keyframe_kind, codes.size) +
+                            codes.tostring())
+        self.previous = codes
+        self.n_frames += 1
+
+
+class Delta_Trajectory:
+    """Random access to the frames of a delta trajectory file (see
+    Delta_Writer). Opening it reads just the start of each record, to
+    find the frames and their keyframes; trajectory[k] then rebuilds
+    frame k from the keyframe before it (or from the last frame rebuilt,
+    if that is on the way, so reading the frames in order applies each
+    delta once).
+    Frames are arrays of state codes the shape of the lattice, the same
+    as Trajectory gives. len(trajectory) is the number of complete
+    frames, and header has the run parameters."""
+
+    def __init__(self, file_name):
+        """Opens the delta trajectory file_name.
+        Syntax: Delta_Trajectory(file_name)
+        Returns None"""
+        self.file_name   = file_name
+        self.header      = read_header(file_name, delta_magic)
+        self.shape       = tuple(self.header['shape'])
+        self.index_dtype = np.dtype(self.header['index_dtype'])
+        n_sites = int(np.prod(self.shape))
+        data_offset = self.header['data_offset']
+        if os.path.getsize(file_name) > data_offset:
+            self.data = np.memmap(file_name, dtype = np.uint8, mode = 'r',
+                                  offset = data_offset)
+        else:
+            self.data = np.zeros(0, dtype = np.uint8)
+        # Where each record starts, its number of sites, and the frame
+        # number of the keyframe each frame is built from. An incomplete
+        # last record is ignored.
+        self.offsets   = []
+        self.counts    = []
+        self.keyframes = []
+        position = 0
+        while position + record_start.size <= self.data.size:
+            kind, count = record_start.unpack_from(self.data, position)
+            if kind == keyframe_kind:
+                if count != n_sites:
+                    raise IOError('keyframe %i of %s has %i sites, not %i' %
+                                  (len(self.offsets), file_name, count,
+                                   n_sites))
+                end = position + record_start.size + count
+                key = len(self.offsets)
+            elif kind == delta_kind and self.keyframes:
+                end = (position + record_start.size +
+                       count * (self.index_dtype.itemsize + 1))
+                key = self.keyframes[-1]
+            else:
+                raise IOError('bad record at byte %i of %s' %
+                              (data_offset + position, file_name))
+            if end > self.data.size:
+                break
+            self.offsets.append(position + record_start.size)
+            self.counts.append(count)
+            self.keyframes.append(key)
+            position = end
+        self.n_frames = len(self.offsets)
+        # The last frame rebuilt, and its number.
+        self.current   = None
+        self.current_k = None
+
+    def apply(self, k, codes):
+        """Sets the changed sites of delta frame k in the flat array of
+        state codes codes.
+        Returns None"""
+        start, count = self.offsets[k], self.counts[k]
+        end = start + count * self.index_dtype.itemsize
+        indices = np.frombuffer(self.data[start:end],
+                                dtype = self.index_dtype)
+        codes[indices] = self.data[end:end + count]
+
+    def __len__(self):
+        return self.n_frames
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += self.n_frames
+        if not 0 <= k < self.n_frames:
+            raise IndexError('frame %i of %i' % (k, self.n_frames))
+        key = self.keyframes[k]
+        if self.current_k is not None and key <= self.current_k <= k:
+            first = self.current_k + 1
+        else:
+            start = self.offsets[key]
+            self.current = np.array(self.data[start:start +
+                                              self.counts[key]])
+            first = key + 1
+        for j in xrange(first, k + 1):
+            self.apply(j, self.current)
+        self.current_k = k
+        return self.current.reshape(self.shape).copy()
+
+    def __iter__(self):
+        for k in xrange(self.n_frames):
+            yield self[k]
+
+
+# Bytes read at a time from text files.
+text_block_size = 1 << 20
+# Each frame of a text file starts with this (and ends with '}}').
+text_frame_start = ',{{'
+text_frame_end   = '}}'
+# Fields of the first header line of a text file, "name:value".
+text_field = re.compile(r'"(\w+):([^"]*)"')
+
+
+def read_text_header(file_name):
+    """Reads the header of a text trajectory file (the two lines before
+    the first frame) into a dict with size, steps, sample_int,
+    arguments (a list of floats), and seed and replica if they are
+    there (they are not in older files).
+    Returns the header (a dict)."""
+    with open(file_name, 'rb') as in_file:
+        first = in_file.readline()
+    if not first.startswith('{{"size:'):
+        raise IOError('%s is not a text trajectory file' % file_name)
+    fields = dict(text_field.findall(first))
+    header = {'size':       int(fields['size']),
+              'steps':      int(fields['steps']),
+              'sample_int': int(fields['sample_int']),
+              # A tuple of floats, or a list of strings from the
+              # command line.
+              'arguments':  [float(arg) for arg in
+                             ast.literal_eval(fields['args'])]}
+    for name in ('seed', 'replica'):
+        if name in fields:
+            header[name] = int(fields[name])
+    return header
+
+
+def parse_text_frame(text, n_sites):
+    """Returns the state codes of the n_sites sites of the text of one
+    frame (from ',{{' to '}}', with or without the quotes numpy puts
+    around each site), as a flat uint8 array."""
+    body = text[text.index(text_frame_start) + len(text_frame_start):
+                text.rindex(text_frame_end)]
+    body = body.replace("'", '').replace('},{', ',')
+    values = np.fromstring(body, dtype = int, sep = ',')
+    if values.size != 4 * n_sites:
+        raise IOError('frame has %i values, expected %i' %
+                      (values.size, 4 * n_sites))
+    return arraylat.encode_states(*values.reshape(-1, 4).T)
+
+
+def index_text(file_name):
+    """Finds where each complete frame of the text trajectory file_name
+    starts, reading it a block at a time.
+    Returns the list of byte offsets."""
+    offsets = []
+    with open(file_name, 'rb') as in_file:
+        # The end of the last block is kept, so a frame start or end
+        # split between two blocks is still found.
+        carry    = ''
+        position = 0
+        # Whether the last frame found has ended yet.
+        ended = True
+        while True:
+            block = in_file.read(text_block_size)
+            if not block:
+                break
+            text  = carry + block
+            start = position - len(carry)
+            k = 0
+            while True:
+                if ended:
+                    k = text.find(text_frame_start, k)
+                    if k < 0:
+                        break
+                    offsets.append(start + k)
+                    k += len(text_frame_start)
+                    ended = False
+                else:
+                    k = text.find(text_frame_end, k)
+                    if k < 0:
+                        break
+                    k += len(text_frame_end)
+                    ended = True
+            position += len(block)
+            carry = text[-2:]
+    # A frame that did not end is from a run that was stopped.
+    if not ended:
+        offsets.pop()
+    return offsets
+
+
+class Text_Trajectory:
+    """Frame by frame access to a text trajectory file, without reading
+    all of it: iterating over it reads the frames in order, and
+    trajectory[k] reads frame k using the index of frame offsets (made
+    with index_text the first time and saved in file_name + '.idx').
+    Frames are arrays of state codes the shape of the lattice, the same
+    as Trajectory gives (use arraylat.decode_states to get the
+    occupancies). len(trajectory) is the number of complete frames, and
+    header has the run parameters."""
+
+    def __init__(self, file_name, dimension = None):
+        """Opens the text trajectory file_name. The dimension of the
+        lattice is not in the header, so unless it is given it is worked
+        out from the number of sites in the first frame.
+        Syntax: Text_Trajectory(file_name, dimension)
+        Returns None"""
+        self.file_name = file_name
+        self.header    = read_text_header(file_name)
+        self.offsets   = self.read_index()
+        size = self.header['size']
+        if dimension is None:
+            dimension = 2
+            if self.offsets and size > 1:
+                # Each site has 4 values, and a comma before each one
+                # (counting the one that starts the frame).
+                n_sites = self.read_text(0).count(',') // 4
+                dimension = int(round(np.log(n_sites) / np.log(size)))
+        self.header['dimension'] = dimension
+        self.shape   = (size,) * dimension
+        self.n_sites = size**dimension
+        self.n_frames = len(self.offsets)
+
+    def read_index(self):
+        """Returns the frame offsets, from the index file if it is there
+        and is for this file as it is now, or else from index_text
+        (which is then saved as the index file)."""
+        index_name = self.file_name + '.idx'
+        file_size  = os.path.getsize(self.file_name)
+        if os.path.exists(index_name):
+            with open(index_name) as index_file:
+                index = json.load(index_file)
+            if index.get('file_size') == file_size:
+                return index['offsets']
+        offsets = index_text(self.file_name)
+        try:
+            with open(index_name, 'w') as index_file:
+                json.dump({'file_size': file_size, 'offsets': offsets},
+                          index_file)
+        except IOError:
+            # (The index is only a shortcut, so it is fine if the
+            # directory can't be written to.)
+            pass
+        return offsets
+
+    def read_text(self, k):
+        """Returns the text of frame k, read from its offset."""
+        with open(self.file_name, 'rb') as in_file:
+            in_file.seek(self.offsets[k])
+            text = ''
+            while True:
+                block = in_file.read(text_block_size)
+                if not block:
+                    raise IOError('frame %i of %s has no end' %
+                                  (k, self.file_name))
+                # (The end can be split between two blocks.)
+                searched = max(len(text) - 1, 0)
+                text += block
+                end = text.find(text_frame_end, searched)
+                if end >= 0:
+                    return text[:end + len(text_frame_end)]
+
+    def __len__(self):
+        return self.n_frames
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += self.n_frames
+        if not 0 <= k < self.n_frames:
+            raise IndexError('frame %i of %i' % (k, self.n_frames))
+        return parse_text_frame(self.read_text(k),
+                                self.n_sites).reshape(self.shape)
+
+    def __iter__(self):
+        """Reads the frames in order, a block of the file at a time."""
+        with open(self.file_name, 'rb') as in_file:
+            in_file.seek(self.offsets[0] if self.offsets else 0)
+            text = ''
+            for k in xrange(self.n_frames):
+                end = text.find(text_frame_end)
+                while end < 0:
+                    block = in_file.read(text_block_size)
+                    if not block:
+                        raise IOError('frame %i of %s has no end' %
+                                      (k, self.file_name))
+                    searched = max(len(text) - 1, 0)
+                    text += block
+                    end = text.find(text_frame_end, searched)
+                end += len(text_frame_end)
+                yield parse_text_frame(text[:end],
+                                       self.n_sites).reshape(self.shape)
+                text = text[end:]
+
+
+def open_trajectory(file_name):
+    """Returns a Trajectory if file_name is a binary trajectory, a
+    Delta_Trajectory if it is a delta one, or else a Text_Trajectory
+    (they all give frames the same way)."""
+    with open(file_name, 'rb') as in_file:
+        start = in_file.read(len(magic))
+    if start == magic:
+        return Trajectory(file_name)
+    if start == delta_magic:
+        return Delta_Trajectory(file_name)
+    return Text_Trajectory(file_name)
+
+
+def frame_steps(file_name, n_frames, sample_int):
+    """Returns the step of each of the n_frames frames of the trajectory
+    file_name, as a list: k * sample_int for frame k, except for a run
+    that runlat.run_react stopped once it had converged (see
+    convergelat) between two samples, whose last frame is of the step
+    it converged at. That step is read from the summary of the test,
+    file_name + '.conv'."""
+    steps = [k * sample_int for k in xrange(n_frames)]
+    try:
+        with open(file_name + '.conv') as in_file:
+            summary = json.load(in_file)
+    except (IOError, ValueError):
+        return steps
+    step = summary.get('step')
+    # (Only if the summary is of this run: its last frame is the one
+    # after the sample before step.)
+    if summary.get('converged') and step is not None and \
+            step % sample_int != 0 and step // sample_int + 2 == n_frames:
+        steps[-1] = step
+    return steps
+
+
+def convert_text(text_name, binary_name = None, dimension = None):
+    """Converts the text trajectory text_name to a binary one,
+    binary_name (by default text_name + '.bin'), a frame at a time.
+    The binary header has the run parameters of the text header, and
+    converted_from = text_name.
+    Syntax: convert_text(text_name, binary_name, dimension)
+    Returns the name of the binary file."""
+    if binary_name is None:
+        binary_name = text_name + '.bin'
+    frames = Text_Trajectory(text_name, dimension)
+    header = frames.header
+    metadata = {'dimension':      header['dimension'],
+                'converted_from': os.path.basename(text_name)}
+    for name in ('seed', 'replica'):
+        if name in header:
+            metadata[name] = header[name]
+    with Binary_Writer(binary_name, header['arguments'], header['steps'],
+                       header['size'], header['sample_int'],
+                       **metadata) as out_file:
+        for codes in frames:
+            out_file.write_codes(codes)
+    return binary_name
+
+
+# Writer classes for each output format of runlat.run_react.
+writers = {'text':   Text_Writer,
+           'binary': Binary_Writer,
+           'delta':  Delta_Writer}
+
+
+if __name__ == "__main__":
+    import sys
+    # Converts text trajectory files to binary.
+    if len(sys.argv) < 2:
+        print "usage: %s text_file [text_file ...]" % \
+            os.path.basename(sys.argv[0])
+        sys.exit(1)
+    for text_name in sys.argv[1:]:
+        print convert_text(text_name)